@@ -2,21 +2,39 @@ import gevent
 import gevent.event
 import gevent.util
 import gevent.lock
+import gevent.pool
+import gevent.queue
 import gevent.monkey
 
 gevent.monkey.patch_all()
 import geventwebsocket
+import gipc
 
+import array
 import bdb
+import bisect
+import calendar
+import collections
+import csv
+import gzip
+import hashlib
+import heapq
 import importlib
+import itertools
+import io
 import json
+import math
+import operator
 import os
+import pickle
 import struct
 import sys
 import tempfile
 import time
+import zipfile
 from typing import Dict
 import urllib
+import uuid
 import webbrowser
 import pathlib
 
@@ -38,7 +56,145 @@ from ait.core import (
 )
 from ait.core.server.plugin import Plugin
 import copy
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+class CoalescingQueue(object):
+    """CoalescingQueue
+    A gevent aware FIFO queue of keyed items.  An item appended while
+    another item with the same key is still pending is merged into the
+    pending item instead of being queued separately, so the length of a
+    CoalescingQueue is bounded by the number of distinct keys rather than
+    by the number of items appended.
+
+    A CoalescingQueue may also limit how often items of the same key are
+    removed.  Items whose key was popped less than interval(key) seconds
+    ago are held (and continue to coalesce) until their interval elapses.
+    """
+
+    def __init__(self, key, merge, interval=None):
+        """Creates a new, empty CoalescingQueue.  The key function maps an
+        item to its key and merge(pending, item) returns the item that
+        replaces a pending item.  The optional interval function maps a
+        key to the minimum number of seconds between items of that key
+        (or None for no limit).
+        """
+        self._items = collections.OrderedDict()
+        self._key = key
+        self._merge = merge
+        self._interval = interval
+        self._ready = {}
+        self.coalesced = 0
+        self.notEmpty = gevent.event.Event()
+
+    def __contains__(self, key):
+        """True if an item with the given key is pending."""
+        return key in self._items
+
+    def __iter__(self):
+        return iter(list(self._items.values()))
+
+    def __len__(self):
+        return len(self._items)
+
+    @property
+    def interval(self):
+        """The function mapping a key to its minimum number of seconds
+        between items, or None if items are never held.
+        """
+        return self._interval
+
+    @interval.setter
+    def interval(self, interval):
+        self._interval = interval
+        self._ready.clear()
+        self.notEmpty.set()
+
+    def append(self, item):
+        """Adds item to the right side of this CoalescingQueue or merges it
+        into the pending item with the same key.
+        """
+        key = self._key(item)
+        pending = self._items.get(key)
+
+        if pending is None:
+            self._items[key] = item
+            self.notEmpty.set()
+        else:
+            self._items[key] = self._merge(pending, item)
+            self.coalesced += 1
+
+    def clear(self):
+        """Removes all pending items."""
+        self._items.clear()
+        self.notEmpty.clear()
+
+    def _next(self, now):
+        """Returns (key, None) for the oldest pending item that may be
+        removed now, or (None, delay) where delay is the number of seconds
+        until one may be (None if no item is pending).
+        """
+        delay = None
+
+        for key in self._items:
+            ready = self._ready.get(key)
+            if ready is None or ready <= now:
+                return key, None
+            if delay is None or ready - now < delay:
+                delay = ready - now
+
+        return None, delay
+
+    def popleft(self, block=True, timeout=None):
+        """Removes and returns the oldest pending item that is not being
+        held.  Raises IndexError if no item is available (within timeout
+        seconds, if blocking).
+        """
+        timer = None
+        empty = IndexError("pop from an empty queue")
+        now = time.monotonic()
+        key, delay = self._next(now)
+
+        if key is None:
+            if block is False:
+                raise empty
+
+            try:
+                if timeout is not None:
+                    timer = gevent.Timeout(timeout, empty)
+                    timer.start()
+
+                while key is None:
+                    self.notEmpty.clear()
+                    self.notEmpty.wait(delay)
+                    now = time.monotonic()
+                    key, delay = self._next(now)
+            finally:
+                if timer is not None:
+                    timer.cancel()
+
+        item = self._items.pop(key)
+
+        if self._interval is not None:
+            interval = self._interval(key)
+            if interval:
+                self._ready[key] = now + interval
+            else:
+                self._ready.pop(key, None)
+
+        return item
 
 
 class Session(object):
@@ -48,40 +204,80 @@ class Session(object):
     Python context.
     """
 
-    def __init__(self, store=None, maxlen=100):
+    def __init__(self, store=None, maxlen=100, coalesce=False, sid=None):
         """Creates a new Session, capable of storing up to maxlen items of
-        each event, message, and telemetry type.
+        each event, message, and telemetry type.  sid optionally gives the
+        Session identifier (e.g. to re-create an expired Session).
+
+        If coalesce is True, pending telemetry deltas for the same packet
+        are merged (last value per field wins) rather than queued, so a
+        slow client never loses field updates and at most one delta per
+        packet is queued.
         """
         self.events = api.GeventDeque(maxlen=maxlen)
         self.messages = api.GeventDeque(maxlen=maxlen)
         self.telemetry = api.GeventDeque(maxlen=maxlen)
-        self.deltas = api.GeventDeque(maxlen=maxlen)
+
+        if coalesce:
+            self.deltas = self._coalescing_deltas()
+        else:
+            self.deltas = api.GeventDeque(maxlen=maxlen)
+
+        self.dropped = 0
+        self.rate = None
+        self.rates = {}
+        self.subscriptions = None
         self.tlm_counters = {}
+        self._id = sid if sid is not None else str(id(self))
         self._maxlen = maxlen
         self._store = store
         self._numConnections = 0
+        self._lastActive = time.monotonic()
 
     def __enter__(self):
         """Begins a Session context / connection."""
         self._numConnections += 1
+        self._lastActive = time.monotonic()
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
         """Ends a Session context / connection.
-        If no more active connections exist, the Session is deleted
-        from its SessionStore.
+        Sessions without active connections are aged out of their
+        SessionStore by SessionStore.reap().
         """
         assert self._numConnections > 0
         self._numConnections -= 1
-
-        # FIXME: Age sessions out of existence instead?
-        # if self._numConnections is 0 and self._store is not None:
-        #     self._store.remove(self)
+        self._lastActive = time.monotonic()
 
     @property
     def id(self):
         """A unique identifier for this Session."""
-        return str(id(self))
+        return self._id
+
+    @property
+    def active(self):
+        """True if this Session has one or more active connections."""
+        return self._numConnections > 0
+
+    def idle(self, now=None):
+        """Returns the number of seconds this Session has been without an
+        active connection, or zero if it is active.
+        """
+        if self.active:
+            return 0
+        if now is None:
+            now = time.monotonic()
+        return now - self._lastActive
+
+    @property
+    def queued(self):
+        """The number of items queued for delivery to this Session."""
+        return (
+            len(self.events)
+            + len(self.messages)  # noqa: W503
+            + len(self.telemetry)  # noqa: W503
+            + len(self.deltas)  # noqa: W503
+        )
 
     def update_counter(self, pkt_name):
         if pkt_name not in self.tlm_counters:
@@ -93,29 +289,427 @@ class Session(object):
 
         return self.tlm_counters[pkt_name]
 
+    def subscribe(self, packets):
+        """Limits the telemetry delivered to this Session.
 
-packet_defns: Dict[int, tlm.PacketDefinition] = {}
+        packets may be None (all packets), a list of packet names, or a
+        dictionary mapping packet names to a non-empty list of field names
+        (or None for all fields of that packet).  Raises ValueError for
+        any other value, leaving the current subscriptions unchanged.
+        """
 
+        def is_names(value):
+            return (
+                isinstance(value, list)
+                and len(value) > 0  # noqa: W503
+                and all(isinstance(name, str) for name in value)  # noqa: W503
+            )
 
-def get_packet_defn(uid):
-    """
-    Returns packet defn from tlm dict matching uid.
-    Logs warning and returns None if no defn matching uid is found.
+        if packets is None:
+            self.subscriptions = None
+        elif isinstance(packets, dict):
+            for name, fields in packets.items():
+                if not isinstance(name, str) or not (
+                    fields is None or is_names(fields)
+                ):
+                    raise ValueError(
+                        "Invalid subscription for packet {}: {}".format(name, fields)
+                    )
+            self.subscriptions = {
+                name: frozenset(fields) if fields is not None else None
+                for name, fields in packets.items()
+            }
+        elif isinstance(packets, list) and all(
+            isinstance(name, str) for name in packets
+        ):
+            self.subscriptions = {name: None for name in packets}
+        else:
+            raise ValueError("Invalid packet subscription: {}".format(packets))
+
+    def subscribed(self, pkt_name):
+        """True if this Session is subscribed to the given packet."""
+        return self.subscriptions is None or pkt_name in self.subscriptions
+
+    def _coalescing_deltas(self):
+        """Returns a CoalescingQueue for this Session's telemetry deltas."""
+        return CoalescingQueue(
+            key=lambda item: item[0].packet,
+            merge=lambda pending, item: (
+                TelemetryDelta.merge(pending[0], item[0]),
+                pending[1],
+            ),
+        )
+
+    def _coalescing_telemetry(self):
+        """Returns a CoalescingQueue for this Session's raw telemetry
+        packets, in which the latest packet of each type wins.
+        """
+        return CoalescingQueue(
+            key=lambda item: item[0],
+            merge=lambda pending, item: (item[0], item[1], pending[2]),
+        )
+
+    def interval(self, pkt_name):
+        """Returns the minimum number of seconds between telemetry updates
+        of the given packet for this Session, or None if unlimited.
+        """
+        rate = self.rates.get(pkt_name, self.rate)
+        return 1.0 / rate if rate else None
+
+    def set_rate(self, rate=None, rates=None):
+        """Limits the rate of telemetry delivered to this Session.
+
+        rate is the maximum number of updates per second for each packet
+        and rates optionally maps packet names to their own maximum rate.
+        A rate of None (or zero) is unlimited.  Rate limited updates are
+        held and coalesced until the packet's interval elapses, so the
+        client always receives the latest values.  Raises ValueError for
+        negative or non-numeric rates.
+        """
+        rates = dict(rates) if rates else {}
+
+        for value in [rate] + list(rates.values()):
+            if value is not None and (
+                isinstance(value, bool)
+                or not isinstance(value, (int, float))  # noqa: W503
+                or value < 0  # noqa: W503
+            ):
+                raise ValueError("Invalid telemetry rate: {}".format(value))
+
+        self.rate = rate or None
+        self.rates = rates
+
+        if not self.rate and not any(self.rates.values()):
+            for queue in (self.deltas, self.telemetry):
+                if isinstance(queue, CoalescingQueue):
+                    queue.interval = None
+            return
+
+        if not isinstance(self.deltas, CoalescingQueue):
+            queue = self._coalescing_deltas()
+            self.deltas = self._requeue(self.deltas, queue)
+
+        if not isinstance(self.telemetry, CoalescingQueue):
+            queue = self._coalescing_telemetry()
+            self.telemetry = self._requeue(self.telemetry, queue)
+
+        self.deltas.interval = self.interval
+        self.telemetry.interval = self._telemetry_interval
+
+    def _telemetry_interval(self, uid):
+        pkt_defn = get_packet_defn(uid)
+        return self.interval(pkt_defn.name) if pkt_defn is not None else None
+
+    @staticmethod
+    def _requeue(queue, coalescing):
+        """Moves the items pending in queue to the given CoalescingQueue
+        and returns it.  A None item is left in queue to wake a
+        connection blocked on it, which then resumes on the new queue.
+        """
+        while len(queue) > 0:
+            coalescing.append(queue.popleft())
+        queue.append(None)
+        return coalescing
+
+    def add_delta(self, frame):
+        """Queues the given TelemetryDelta for delivery to this Session and
+        returns its packet counter, or None if nothing was queued because
+        none of the subscribed fields changed.
+
+        A delta merged into a pending delta for the same packet keeps the
+        pending delta's counter, so clients still see consecutive
+        counters.  In non-coalescing mode, deltas discarded because the
+        queue is full are counted as dropped.
+        """
+        if self.subscriptions is not None:
+            fields = self.subscriptions.get(frame.packet)
+            if fields is not None:
+                frame = frame.select(fields)
+                if not frame.delta and not frame.dntoeus:
+                    return None
+
+        if isinstance(self.deltas, CoalescingQueue) and frame.packet in self.deltas:
+            counter = self.tlm_counters[frame.packet]
+        else:
+            if len(self.deltas) == self._maxlen:
+                self.dropped += 1
+            counter = self.update_counter(frame.packet)
+
+        self.deltas.append((frame, counter))
+        return counter
+
+    @property
+    def coalesced(self):
+        """The number of telemetry deltas merged into pending deltas."""
+        return getattr(self.deltas, "coalesced", 0)
+
+    def stats(self):
+        """Returns a dictionary of Session statistics."""
+        return {
+            "id": self.id,
+            "active": self.active,
+            "queued": self.queued,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "rate": self.rate,
+            "rates": self.rates,
+        }
+
+
+class TelemetryDelta(object):
+    """TelemetryDelta
+    A TelemetryDelta is a single packet delta shared, read-only, by all
+    Sessions.  The JSON message for the delta is encoded at most once,
+    regardless of the number of Sessions it is delivered to.  Per-Session
+    data (i.e. the packet counter) is appended to the shared encoding
+    when the message is sent.
     """
-    global packet_defns
 
-    if uid in packet_defns:
-        return packet_defns[uid]
+    __slots__ = ["uid", "packet", "delta", "dntoeus", "_head", "_body", "_views"]
+
+    def __init__(self, uid, packet, delta, dntoeus):
+        """Creates a new TelemetryDelta for the packet with the given
+        uid and name, changed raw field values (delta) and DN to EU
+        values (dntoeus).
+        """
+        self.uid = uid
+        self.packet = packet
+        self.delta = delta
+        self.dntoeus = dntoeus
+        self._head = None
+        self._body = None
+        self._views = None
+
+    @property
+    def head(self):
+        """The shared JSON encoding of this delta, up to (but excluding)
+        the Session specific packet counter value.
+        """
+        if self._head is None:
+            encoded = json.dumps(
+                {"packet": self.packet, "data": self.delta, "dntoeus": self.dntoeus}
+            )
+            self._head = encoded[:-1] + ', "counter": '
+        return self._head
+
+    def message(self, counter):
+        """Returns the JSON message for this delta and the given Session
+        packet counter.
+        """
+        return self.head + str(counter) + "}"
+
+    @property
+    def body(self):
+        """The shared binary encoding of this delta (see
+        TLM_BINARY_PROTOCOL), excluding the binary frame header.
+        """
+        if self._body is None:
+            pkt_defn = get_packet_defn(self.uid)
+            _, indices = get_packet_schema(pkt_defn)
+            chunks = []
+            for values in (self.delta, self.dntoeus):
+                chunks.append(struct.pack(">H", len(values)))
+                for name, value in values.items():
+                    chunks.append(struct.pack(">H", indices[name]))
+                    pack_binary_value(value, chunks)
+            self._body = b"".join(chunks)
+        return self._body
+
+    def binary_message(self, counter):
+        """Returns the binary message for this delta and the given
+        Session packet counter.
+        """
+        return TLM_BINARY_HEADER.pack(TLM_BINARY_DELTA, self.uid, counter) + self.body
+
+    def select(self, fields):
+        """Returns a TelemetryDelta limited to the given frozenset of field
+        names.  Selections are cached, so Sessions subscribed to the same
+        fields share a single encoding.
+        """
+        if self._views is None:
+            self._views = {}
+
+        view = self._views.get(fields)
+        if view is None:
+            view = TelemetryDelta(
+                self.uid,
+                self.packet,
+                {k: v for k, v in self.delta.items() if k in fields},
+                {k: v for k, v in self.dntoeus.items() if k in fields},
+            )
+            self._views[fields] = view
+
+        return view
 
+    @staticmethod
+    def merge(older, newer):
+        """Returns a new TelemetryDelta combining the older and newer
+        deltas of the same packet, with newer field values taking
+        precedence.
+        """
+        delta = dict(older.delta)
+        delta.update(newer.delta)
+        dntoeus = dict(older.dntoeus)
+        dntoeus.update(newer.dntoeus)
+        return TelemetryDelta(newer.uid, newer.packet, delta, dntoeus)
+
+
+# Binary /tlm/realtime framing.  Clients opt in by requesting the
+# TLM_BINARY_PROTOCOL WebSocket subprotocol or with ?format=binary.
+# Each frame is (big endian):
+#
+#   U8 frame type (TLM_BINARY_DELTA), U32 packet uid, U32 counter,
+#   U16 count, count * (U16 field index, value)    <- raw values
+#   U16 count, count * (U16 field index, value)    <- DN to EU values
+#
+# Field indices refer to the packet's field list served by /tlm/schema.
+# Values are a U8 tag followed by the tag specific payload.  Keep-alive
+# probes (a zero byte followed by a U32 zero) never start with a frame
+# type.
+TLM_BINARY_PROTOCOL = "ait.tlm.binary.v1"
+TLM_BINARY_DELTA = 1
+TLM_BINARY_HEADER = struct.Struct(">BII")
+
+TLM_BINARY_NULL = 0
+TLM_BINARY_FALSE = 1
+TLM_BINARY_TRUE = 2
+TLM_BINARY_INT32 = 3
+TLM_BINARY_FLOAT64 = 4
+TLM_BINARY_STRING = 5
+TLM_BINARY_ARRAY = 6
+
+
+def pack_binary_value(value, chunks):
+    """Appends the tagged binary encoding of the given telemetry value to
+    the list of byte strings chunks.
+    """
+    if value is None:
+        chunks.append(struct.pack(">B", TLM_BINARY_NULL))
+    elif value is True or value is False:
+        tag = TLM_BINARY_TRUE if value else TLM_BINARY_FALSE
+        chunks.append(struct.pack(">B", tag))
+    elif isinstance(value, int) and -(2**31) <= value < 2**31:
+        chunks.append(struct.pack(">Bi", TLM_BINARY_INT32, value))
+    elif isinstance(value, (int, float)):
+        chunks.append(struct.pack(">Bd", TLM_BINARY_FLOAT64, value))
+    elif isinstance(value, (list, tuple)):
+        chunks.append(struct.pack(">BH", TLM_BINARY_ARRAY, len(value)))
+        for item in value:
+            pack_binary_value(item, chunks)
     else:
-        tlmdict = ait.core.tlm.getDefaultDict()
-        for _k, v in tlmdict.items():
-            if v.uid == uid:
-                packet_defns[uid] = v
-                return v
+        if isinstance(value, (bytes, bytearray)):
+            value = value.decode("utf-8", "replace")
+        elif isinstance(value, datetime):
+            value = value.isoformat()
+        encoded = str(value).encode("utf-8")
+        chunks.append(struct.pack(">BI", TLM_BINARY_STRING, len(encoded)))
+        chunks.append(encoded)
+
+
+packet_schemas: Dict[tlm.PacketDefinition, tuple] = {}
+
+
+def get_packet_schema(pkt_defn):
+    """
+    Returns a (names, indices) pair for the given packet definition, where
+    names lists the packet's fields followed by its derivations and
+    indices maps each name to its position in that list.
+    """
+    schema = packet_schemas.get(pkt_defn)
+
+    if schema is None:
+        names = [f.name for f in pkt_defn.fields]
+        names += [f.name for f in pkt_defn.derivations]
+        schema = (names, {name: i for i, name in enumerate(names)})
+        packet_schemas[pkt_defn] = schema
+
+    return schema
+
+
+class PacketIndex(object):
+    """PacketIndex
+    A PacketIndex maps packet uids to the PacketDefinitions of the default
+    telemetry dictionary.  The index is rebuilt whenever the dictionary
+    object changes (i.e. is reloaded), which is checked at most every
+    check_interval seconds.  Lookups of unknown uids never rescan the
+    dictionary.  They are counted per uid and logged at most once every
+    warn_interval seconds per uid.
+    """
+
+    def __init__(self, check_interval=1.0, warn_interval=60.0):
+        """Creates a new, empty PacketIndex."""
+        self.check_interval = check_interval
+        self.warn_interval = warn_interval
+        self.defns = {}
+        self.unknown = collections.Counter()
+        self.rebuilds = 0
+        self._dict = None
+        self._checked = None
+        self._warned = {}
+
+    def rebuild(self, tlmdict=None):
+        """Rebuilds this PacketIndex from the given telemetry dictionary
+        (or the default dictionary) and discards the packet decoders and
+        schemas compiled for the previous dictionary.
+        """
+        if tlmdict is None:
+            tlmdict = tlm.getDefaultDict()
+
+        self.defns = {defn.uid: defn for defn in tlmdict.values()}
+        self.unknown.clear()
+        self.rebuilds += 1
+        self._dict = tlmdict
+        self._checked = time.monotonic()
+        self._warned.clear()
+
+        packet_decoders.clear()
+        packet_packers.clear()
+        packet_schemas.clear()
+        packet_history.clear()
+
+    def get(self, uid):
+        """Returns the PacketDefinition for uid or None if not found."""
+        now = time.monotonic()
+
+        if self._checked is None or now - self._checked >= self.check_interval:
+            self._checked = now
+            tlmdict = tlm.getDefaultDict()
+            if tlmdict is not self._dict:
+                self.rebuild(tlmdict)
+
+        defn = self.defns.get(uid)
+
+        if defn is None:
+            self.unknown[uid] += 1
+            warned = self._warned.get(uid)
+            if warned is None or now - warned >= self.warn_interval:
+                self._warned[uid] = now
+                log.warn(
+                    "No packet defn matching UID {} ({} packet(s) seen)".format(
+                        uid, self.unknown[uid]
+                    )
+                )
+
+        return defn
+
+    def stats(self):
+        """Returns a dictionary of PacketIndex statistics."""
+        return {
+            "definitions": len(self.defns),
+            "rebuilds": self.rebuilds,
+            "unknown": {str(uid): count for uid, count in self.unknown.items()},
+        }
+
+
+packet_defns = PacketIndex()
+
 
-        log.warn("No packet defn matching UID {}".format(uid))
-        return None
+def get_packet_defn(uid):
+    """
+    Returns packet defn from tlm dict matching uid.
+    Logs warning and returns None if no defn matching uid is found.
+    """
+    return packet_defns.get(uid)
 
 
 class SessionStore(dict):
@@ -130,21 +724,55 @@ class SessionStore(dict):
         """Creates a new SessionStore."""
         dict.__init__(self, *args, **kwargs)
 
+        # Sessions without active connections for idle_timeout seconds are
+        # reaped.  When max_queued is set, the least recently active idle
+        # Sessions are also evicted while the total number of items queued
+        # across all Sessions exceeds it.
+        self.idle_timeout = 600.0
+        self.max_queued = None
+
+        # When True, new Sessions coalesce pending telemetry deltas.
+        self.coalesce = False
+        self.reaped = 0
+        self.evicted = 0
+        self.unknown = 0
+        self._reaper = None
+
+        # Ids of the last max_expired reaped or evicted Sessions, which
+        # current() may re-create.
+        self.max_expired = 10000
+        self._expired = collections.OrderedDict()
+
     def add_telemetry(self, uid, packet):
-        """Adds a telemetry packet to all Sessions in the store."""
+        """Adds a telemetry packet to all Sessions in the store.  Packets
+        with an unknown uid are counted and otherwise ignored.
+        """
+        pkt_defn = get_packet_defn(uid)
+        if pkt_defn is None:
+            self.unknown += 1
+            return
+
         item = (uid, packet)
         SessionStore.History.telemetry.append(item)
 
-        pkt_defn = get_packet_defn(uid)
         pkt_name = pkt_defn.name
         delta, dntoeus = get_packet_delta(pkt_defn, packet)
         dntoeus = replace_datetimes(dntoeus)
+        packet_history.add(pkt_defn, packet_states.get(pkt_name))
+
+        # The delta is encoded once (on first send) and shared by all
+        # Sessions.  Only the packet counter differs between Sessions.
+        frame = TelemetryDelta(uid, pkt_name, delta, dntoeus)
 
         for session in self.values():
-            counter = session.update_counter(pkt_name)
-            item = (pkt_name, delta, dntoeus, counter)
-            session.deltas.append(item)
-            item = (uid, packet, session.tlm_counters[pkt_name])
+            if not session.subscribed(pkt_name):
+                continue
+
+            counter = session.add_delta(frame)
+            if counter is None:
+                continue
+
+            item = (uid, packet, counter)
             session.telemetry.append(item)
 
     def add_message(self, msg):
@@ -163,15 +791,25 @@ class SessionStore(dict):
     def current(self):
         """Returns the current Session for this HTTP connection or raise an
         HTTP 401 Unauthorized error.
+
+        A client whose Session was reaped (e.g. a browser tab left idle
+        past idle_timeout) is given a new, empty Session with the same
+        Session Id, rather than being locked out until it reloads.  Only
+        Session Ids this store issued are re-created.
         """
-        session = self.get(bottle.request.get_cookie("sid"))
+        sid = bottle.request.get_cookie("sid")
+        session = self.get(sid)
         if session is None:
-            raise bottle.HTTPError(401, "Invalid Session Id")
+            if self._expired.pop(sid, None) is None:
+                raise bottle.HTTPError(401, "Invalid Session Id")
+            session = Session(self, coalesce=self.coalesce, sid=sid)
+            self[sid] = session
+            log.info("Re-created expired GUI session {}".format(sid))
         return session
 
     def create(self):
         """Creates and returns a new Session for this HTTP connection."""
-        session = Session(self)
+        session = Session(self, coalesce=self.coalesce)
         self[session.id] = session
         bottle.response.set_cookie("sid", session.id)
         return session
@@ -180,25 +818,113 @@ class SessionStore(dict):
         """Removes the given Session from this SessionStore."""
         del self[session.id]
 
+    def reap(self, now=None):
+        """Removes idle Sessions from this SessionStore.
+        Returns the number of Sessions removed.
+        """
+        if now is None:
+            now = time.monotonic()
+
+        removed = 0
+        idle = []
+
+        timeout = self.idle_timeout
+
+        for session in list(self.values()):
+            if session.active:
+                continue
+            if timeout is not None and session.idle(now) >= timeout:
+                self._expire(session)
+                self.reaped += 1
+                removed += 1
+            else:
+                idle.append(session)
+
+        if self.max_queued is not None:
+            queued = sum(session.queued for session in self.values())
+            idle.sort(key=lambda session: session.idle(now), reverse=True)
+
+            for session in idle:
+                if queued <= self.max_queued:
+                    break
+                queued -= session.queued
+                self._expire(session)
+                self.evicted += 1
+                removed += 1
+
+        if removed:
+            log.info("Removed {} idle GUI session(s)".format(removed))
+
+        return removed
+
+    def _expire(self, session):
+        self.pop(session.id, None)
+        self._expired[session.id] = True
+        while len(self._expired) > self.max_expired:
+            self._expired.popitem(last=False)
+
+    def start_reaper(self, interval=30):
+        """Starts a background greenlet that reaps idle Sessions every
+        interval seconds and returns it.
+        """
+
+        def reaper():
+            while True:
+                gevent.sleep(interval)
+                self.reap()
+
+        if self._reaper is None or self._reaper.dead:
+            self._reaper = gevent.spawn(reaper)
+
+        return self._reaper
+
+    def stats(self):
+        """Returns a dictionary of SessionStore statistics."""
+        return {
+            "count": len(self),
+            "active": sum(1 for session in self.values() if session.active),
+            "queued": sum(session.queued for session in self.values()),
+            "reaped": self.reaped,
+            "evicted": self.evicted,
+            "unknown": self.unknown,
+            "sessions": [session.stats() for session in self.values()],
+        }
+
 
 class Playback(object):
     """Playback
     A Playback manages the state for the playback component.
     playback.dbconn: connection to database
-    playback.query: time query map of {timestamp: list of (uid, data)} from database
+    playback.query: PlaybackBuffer of the packets queried from the database
     playback.on: True if gui is currently in playback mode.
         Real-time telemetry will not be sent to the frontend during this.
     playback.enabled: True if historical data playback is enabled. This will be False
         if a database connection cannot be made or if data playback is disabled for
         some other reason.
+    playback.range_ttl: Seconds the time ranges of packets in the database are
+        cached for (see ranges()).
+    playback.concurrency: Maximum number of concurrent database queries.
+    playback.chunk_size: Maximum number of points fetched from the database at
+        a time (see chunks()).
+    playback.clock: The PlaybackClock replaying the current query, if any.
+    playback.cache: PlaybackCache of recently streamed queries (see stream()).
     """
 
     def __init__(self):
         """Creates a new Playback"""
         self.enabled = False
-        self.query = {}
+        self.query = PlaybackBuffer()
         self.on = False
         self.dbconn = None
+        self.range_ttl = 60.0
+        self.concurrency = 8
+        self.chunk_size = 10000
+        self.clock = None
+        self.cache = PlaybackCache()
+
+        self._ranges = None
+        self._ranges_time = None
+        self._ranges_lock = gevent.lock.BoundedSemaphore()
 
         self._db_connect()
 
@@ -246,9 +972,582 @@ class Playback(object):
 
     def reset(self):
         """Reset fields"""
+        if self.clock is not None:
+            self.clock.stop()
+            self.clock = None
+
         self.query.clear()
         self.on = False
 
+    def _point(self, query):
+        """Returns the first point returned by query, or None."""
+        return next(iter(self.dbconn.query(query).get_points()), None)
+
+    def range(self, packet_name):
+        """Returns the [packet_name, start_time, end_time] time range of the
+        given packet in the database, with the start time rounded down and
+        the end time rounded up to the nearest second, or None if there
+        are no points.  Only the first and last points are fetched.
+        """
+        first = self._point('SELECT * FROM "{}" LIMIT 1'.format(packet_name))
+        last = self._point(
+            'SELECT * FROM "{}" ORDER BY time DESC LIMIT 1'.format(packet_name)
+        )
+
+        if first is None or last is None:
+            return None
+
+        start_time = first["time"].split(".")[0].rstrip("Z") + "Z"
+        end_time = last["time"].split(".")[0].rstrip("Z")
+        end_time = datetime.strptime(end_time, "%Y-%m-%dT%H:%M:%S")
+        end_time += timedelta(seconds=1)
+
+        return [packet_name, start_time, end_time.strftime("%Y-%m-%dT%H:%M:%SZ")]
+
+    def newest(self, packet_name):
+        """Returns the POSIX time of the newest point of the given packet
+        in the database, or None if there are no points.
+        """
+        last = self._point(
+            'SELECT * FROM "{}" ORDER BY time DESC LIMIT 1'.format(packet_name)
+        )
+        return None if last is None else playback_time(last["time"])
+
+    def chunks(self, packet_name, start_time, end_time, pool=None):
+        """Yields the points of the given packet from start_time to
+        end_time (inclusive), in time order, as lists of at most chunk_size
+        points.  Each chunk is queried from the time of the last point of
+        the previous chunk, skipping the points at that time already
+        yielded, so that points sharing a time are neither lost nor
+        repeated.  The next chunk is fetched while the current one is
+        consumed (in the given gevent Pool, if any), so at most two chunks
+        are held at a time.
+        """
+        spawn = gevent.spawn if pool is None else pool.spawn
+        query = "SELECT * FROM \"{}\" WHERE time >= '{}' AND time <= '{}' "
+        query += "ORDER BY time LIMIT {} OFFSET {}"
+
+        def fetch(after, skip):
+            text = query.format(packet_name, after, end_time, self.chunk_size, skip)
+            return list(self.dbconn.query(text).get_points())
+
+        after, skip = start_time, 0
+        pending = spawn(fetch, after, skip)
+
+        try:
+            while pending is not None:
+                points = pending.get()
+                pending = None
+
+                if len(points) == self.chunk_size:
+                    last = points[-1]["time"]
+                    ties = 0
+                    for point in reversed(points):
+                        if point["time"] != last:
+                            break
+                        ties += 1
+
+                    skip = skip + ties if last == after else ties
+                    after = last
+                    pending = spawn(fetch, after, skip)
+
+                if points:
+                    yield points
+        finally:
+            if pending is not None:
+                pending.kill()
+
+    def stream(self, packet_name, start, end, pool=None):
+        """Yields the (time, uid, data) of the given packet from start to
+        end (inclusive POSIX times), in time order.  The parts of a query
+        overlapping cached queries are served from the cache, and only the
+        remaining gaps are queried from the database, a chunk at a time
+        (see chunks(), which is given pool).  Packets are cached as they
+        are yielded, unless they exceed the cache's budget or the query
+        ends at or after the newest point in the database (see newest()),
+        which may still be followed by points being written.
+        """
+        packets = (packet_name,)
+        key = (packets, start, end)
+        stop = math.nextafter(end, math.inf)
+
+        buffer = self.cache.get(key)
+        if buffer is not None:
+            yield from buffer.packets(start, stop)
+            return
+
+        # The (start, stop, cached PlaybackBuffer or None) of each part of
+        # the query, in time order.
+        parts = []
+        cursor = start
+
+        for cached_start, cached_end, cached in self.cache.overlapping(
+            packets, start, end
+        ):
+            cached_stop = min(math.nextafter(cached_end, math.inf), stop)
+            if cached_start > cursor:
+                parts.append((cursor, cached_start, None))
+            if cached_stop > max(cached_start, cursor):
+                parts.append((max(cached_start, cursor), cached_stop, cached))
+                cursor = cached_stop
+
+        if cursor < stop:
+            parts.append((cursor, stop, None))
+
+        if any(cached is not None for _, _, cached in parts):
+            self.cache.partial += 1
+
+        buffer = PlaybackBuffer()
+        for part_start, part_stop, cached in parts:
+            if cached is not None:
+                packets = cached.packets(part_start, part_stop)
+            else:
+                packets = self._query(packet_name, part_start, part_stop, pool)
+
+            for packet in packets:
+                if buffer is not None:
+                    buffer.append(*packet)
+                    if buffer.nbytes > self.cache.budget:
+                        buffer = None
+                yield packet
+
+        if buffer is not None:
+            newest = self.newest(packet_name)
+            if newest is not None and end < newest:
+                buffer.index()
+                self.cache.put(key, buffer)
+
+    def _query(self, packet_name, start, stop, pool=None):
+        # Yields the (time, uid, data) of the given packet in the database
+        # from start up to (but excluding) stop.
+        pkt_defn = tlm.getDefaultDict()[packet_name]
+        packer = get_packet_packer(pkt_defn)
+        timestamps = playback_timestamp(start), playback_timestamp(stop)
+
+        for points in self.chunks(packet_name, *timestamps, pool=pool):
+            for point, data in zip(points, packer.pack(points)):
+                timestamp = playback_time(point["time"])
+                if start <= timestamp < stop:
+                    yield timestamp, pkt_defn.uid, data
+
+    def merge(self, packet_names, start, end):
+        """Returns an iterator of the (time, uid, data) of the given
+        packets from start to end (inclusive POSIX times), merged into time
+        order.  Packets are streamed (see stream()), so only the chunks
+        being merged are held, with at most concurrency chunks queried at a
+        time.  Packets received at the same time are kept in packet_names
+        order.
+        """
+        pool = gevent.pool.Pool(self.concurrency)
+        return heapq.merge(
+            *[self.stream(name, start, end, pool) for name in packet_names],
+            key=operator.itemgetter(0),
+        )
+
+    def ranges(self):
+        """Returns the time range (see range()) of each packet in the
+        database.  Ranges are fetched concurrently and cached for range_ttl
+        seconds.
+        """
+        with self._ranges_lock:
+            now = time.monotonic()
+            if self._ranges_time is None or now - self._ranges_time >= self.range_ttl:
+                names = [
+                    packet["name"]
+                    for packet in self.dbconn.query("SHOW MEASUREMENTS").get_points()
+                ]
+                pool = gevent.pool.Pool(self.concurrency)
+                ranges = pool.map(self.range, names)
+
+                self._ranges = [r for r in ranges if r is not None]
+                self._ranges_time = time.monotonic()
+
+            return self._ranges
+
+
+def playback_time(timestamp):
+    """Returns the POSIX time of a datastore or playback timestamp, e.g.
+    "2019-07-15T18:10:00.5Z".
+    """
+    seconds = datetime.strptime(timestamp[:19], "%Y-%m-%dT%H:%M:%S")
+    fraction = timestamp[19:].rstrip("Z")
+    return calendar.timegm(seconds.timetuple()) + (float(fraction or 0))
+
+
+def playback_timestamp(posix_time):
+    """Returns the datastore timestamp of a POSIX time (see
+    playback_time()).
+    """
+    value = datetime.fromtimestamp(posix_time, timezone.utc)
+    return value.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+class PlaybackBuffer(object):
+    """PlaybackBuffer
+    A PlaybackBuffer holds the packets of a playback query as sorted
+    arrays of packet times, uids and offsets into a single bytearray of
+    packet data, so packets at or near any time are found with a binary
+    search.  Every keyframe_interval packets, a keyframe records the index
+    of the latest packet of each uid, so the full telemetry state at any
+    instant (see snapshot()) is rebuilt from the nearest keyframe rather
+    than from the start of the buffer.
+    """
+
+    def __init__(self, keyframe_interval=1000):
+        """Creates a new, empty PlaybackBuffer."""
+        self.keyframe_interval = keyframe_interval
+        self.clear()
+
+    def __len__(self):
+        return len(self.times)
+
+    def clear(self):
+        """Removes all packets."""
+        self.times = array.array("d")
+        self.uids = array.array("q")
+        self.offsets = array.array("Q", [0])
+        self.data = bytearray()
+        self.keyframes = []
+        self._indexed = True
+
+    def append(self, timestamp, uid, data):
+        """Appends a packet received at the given POSIX time."""
+        if self.times and timestamp < self.times[-1]:
+            self._indexed = False
+
+        self.times.append(timestamp)
+        self.uids.append(uid)
+        self.data += data
+        self.offsets.append(len(self.data))
+        self._keyframe(len(self.times) - 1)
+
+    @property
+    def nbytes(self):
+        """The number of bytes used by packet times, uids and data."""
+        arrays = (self.times, self.uids, self.offsets)
+        return len(self.data) + sum(a.itemsize * len(a) for a in arrays)
+
+    def extend(self, other, start, stop):
+        """Appends the packets of other, another PlaybackBuffer, received
+        at or after start and before stop.
+        """
+        indices = other.between(start, stop)
+        if not indices:
+            return
+
+        lo, hi = indices.start, indices.stop
+        if self.times and other.times[lo] < self.times[-1]:
+            self._indexed = False
+
+        first = len(self.times)
+        base = len(self.data) - other.offsets[lo]
+
+        self.times.extend(other.times[lo:hi])
+        self.uids.extend(other.uids[lo:hi])
+        self.data += other.data[other.offsets[lo] : other.offsets[hi]]
+        self.offsets.extend(o + base for o in other.offsets[lo + 1 : hi + 1])
+
+        for index in range(first, len(self.times)):
+            self._keyframe(index)
+
+    def _keyframe(self, index):
+        """Adds a keyframe for index, if one is due."""
+        if not self._indexed or index % self.keyframe_interval != 0:
+            return
+
+        if self.keyframes:
+            latest = self._latest(
+                dict(self.keyframes[-1]), index - self.keyframe_interval + 1, index
+            )
+        else:
+            latest = {}
+
+        latest[self.uids[index]] = index
+        self.keyframes.append(latest)
+
+    def _latest(self, latest, start, stop):
+        """Updates latest, a dictionary of {uid: index}, with packets start
+        to stop (exclusive) and returns it.
+        """
+        for index in range(start, stop):
+            latest[self.uids[index]] = index
+        return latest
+
+    def index(self):
+        """Sorts packets by time and rebuilds keyframes, if packets were
+        appended out of order.
+        """
+        if self._indexed:
+            return
+
+        order = sorted(range(len(self.times)), key=self.times.__getitem__)
+        packets = [(self.times[i], self.uids[i], self.packet(i)[1]) for i in order]
+
+        self.clear()
+        for packet in packets:
+            self.append(*packet)
+
+    def packets(self, start, stop):
+        """Yields the (time, uid, data) of packets received at or after
+        start and before stop, in time order.
+        """
+        for index in self.between(start, stop):
+            yield (self.times[index],) + self.packet(index)
+
+    def packet(self, index):
+        """Returns the (uid, data) of the given packet."""
+        start, stop = self.offsets[index], self.offsets[index + 1]
+        return self.uids[index], bytes(self.data[start:stop])
+
+    def between(self, start, stop):
+        """Returns the range of indices of packets received at or after
+        start and before stop.
+        """
+        self.index()
+        lo = bisect.bisect_left(self.times, start)
+        return range(lo, bisect.bisect_left(self.times, stop, lo))
+
+    def nearest(self, timestamp):
+        """Returns the index of the packet received nearest timestamp, or
+        None if there are no packets.
+        """
+        self.index()
+        if not self.times:
+            return None
+
+        index = bisect.bisect_left(self.times, timestamp)
+        if index == len(self.times):
+            return index - 1
+        if index > 0 and timestamp - self.times[index - 1] <= (
+            self.times[index] - timestamp
+        ):
+            return index - 1
+        return index
+
+    def snapshot(self, index):
+        """Returns the indices, in time order, of the latest packet of each
+        uid up to and including the given packet.
+        """
+        self.index()
+        keyframe = index // self.keyframe_interval
+        latest = self._latest(
+            dict(self.keyframes[keyframe]),
+            keyframe * self.keyframe_interval + 1,
+            index + 1,
+        )
+        return sorted(latest.values())
+
+
+class PlaybackCache(object):
+    """PlaybackCache
+    A PlaybackCache is a least recently used cache of the PlaybackBuffers
+    loaded for playback queries, keyed by (packet names, start, end) POSIX
+    times and limited to budget bytes in total.
+    """
+
+    def __init__(self, budget=64 * 1024 * 1024):
+        """Creates a new, empty PlaybackCache."""
+        self.budget = budget
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.partial = 0
+        self._buffers = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._buffers)
+
+    def get(self, key):
+        """Returns the cached PlaybackBuffer for key, or None."""
+        buffer = self._buffers.get(key)
+
+        if buffer is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._buffers.move_to_end(key)
+
+        return buffer
+
+    def overlapping(self, packets, start, end):
+        """Returns the (start, end, PlaybackBuffer) of cached queries of
+        the given packets that overlap start to end, ordered by start.
+        """
+        overlaps = []
+
+        for key, buffer in list(self._buffers.items()):
+            if key[0] == packets and key[1] <= end and key[2] >= start:
+                overlaps.append((key[1], key[2], buffer))
+                self._buffers.move_to_end(key)
+
+        return sorted(overlaps, key=lambda overlap: overlap[:2])
+
+    def put(self, key, buffer):
+        """Caches buffer for key, evicting the least recently used buffers
+        to stay within budget.  Buffers larger than budget are not cached.
+        """
+        if key in self._buffers:
+            self.nbytes -= self._buffers.pop(key).nbytes
+
+        if buffer.nbytes > self.budget:
+            return
+
+        self._buffers[key] = buffer
+        self.nbytes += buffer.nbytes
+
+        while self.nbytes > self.budget:
+            _, evicted = self._buffers.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+
+    def clear(self):
+        """Removes all cached buffers."""
+        self._buffers.clear()
+        self.nbytes = 0
+
+    def stats(self):
+        """Returns a dictionary of PlaybackCache statistics."""
+        return {
+            "entries": len(self),
+            "bytes": self.nbytes,
+            "budget": self.budget,
+            "hits": self.hits,
+            "misses": self.misses,
+            "partial": self.partial,
+        }
+
+
+class PlaybackClock(object):
+    """PlaybackClock
+    A PlaybackClock replays the packets of a PlaybackBuffer, in time order,
+    through Sessions.add_telemetry() from its own greenlet.  Packets are
+    sent when they are due on a playback timeline that runs at speed times
+    real time, so playback does not depend on (or round trip to) a browser
+    timer.  The clock starts paused at the first packet.
+    """
+
+    MinSpeed = 0.1
+    MaxSpeed = 100.0
+
+    def __init__(self, buffer, speed=1.0):
+        """Creates a new PlaybackClock for the given PlaybackBuffer."""
+        buffer.index()
+
+        self.buffer = buffer
+        self.times = buffer.times
+        self.position = 0
+        self.paused = True
+        self.speed = 1.0
+
+        self._time = self.times[0] if self.times else None
+        self._wall = time.monotonic()
+        self._changed = gevent.event.Event()
+        self._greenlet = None
+
+        self.set_speed(speed)
+
+    @property
+    def finished(self):
+        """True once every packet has been sent."""
+        return self.position >= len(self.times)
+
+    @property
+    def time(self):
+        """The current POSIX time on the playback timeline."""
+        if self.paused or self._time is None:
+            return self._time
+        return self._time + (time.monotonic() - self._wall) * self.speed
+
+    def _anchor(self):
+        """Re-anchors the playback timeline at the current time."""
+        self._time = self.time
+        self._wall = time.monotonic()
+        self._changed.set()
+
+    def set_speed(self, speed):
+        """Sets the playback speed, a multiple of real time, or raises a
+        ValueError if speed is not between MinSpeed and MaxSpeed.
+        """
+        speed = float(speed)
+        if not self.MinSpeed <= speed <= self.MaxSpeed:
+            raise ValueError(
+                "speed must be between {} and {}".format(self.MinSpeed, self.MaxSpeed)
+            )
+
+        self._anchor()
+        self.speed = speed
+
+    def play(self):
+        """Starts or resumes playback."""
+        self._anchor()
+        self.paused = False
+
+        if self._greenlet is None or self._greenlet.dead:
+            self._greenlet = gevent.spawn(self._run)
+
+    def pause(self):
+        """Pauses playback."""
+        self._anchor()
+        self.paused = True
+
+    def seek(self, timestamp):
+        """Moves the playback timeline to the packet received nearest the
+        given POSIX time and immediately sends the latest packet of each
+        uid up to it, so displays show the full state at that instant.
+        """
+        index = self.buffer.nearest(timestamp)
+        if index is None:
+            return
+
+        for snapshot in self.buffer.snapshot(index):
+            Sessions.add_telemetry(*self.buffer.packet(snapshot))
+
+        self.position = index + 1
+        self._time = self.times[index]
+        self._wall = time.monotonic()
+        self._changed.set()
+
+        if not self.paused and (self._greenlet is None or self._greenlet.dead):
+            self._greenlet = gevent.spawn(self._run)
+
+    def stop(self):
+        """Stops playback for good."""
+        self.pause()
+        if self._greenlet is not None:
+            self._greenlet.kill()
+
+    def _run(self):
+        while not self.finished:
+            self._changed.clear()
+
+            if self.paused:
+                self._changed.wait()
+                continue
+
+            delay = (self.times[self.position] - self.time) / self.speed
+            if delay > 0:
+                self._changed.wait(delay)
+                continue
+
+            Sessions.add_telemetry(*self.buffer.packet(self.position))
+            self.position += 1
+
+        self.pause()
+
+    def stats(self):
+        """Returns a dictionary of the state of this PlaybackClock."""
+        if self.finished:
+            state = "finished"
+        else:
+            state = "paused" if self.paused else "playing"
+
+        return {
+            "state": state,
+            "speed": self.speed,
+            "time": self.time,
+            "position": self.position,
+            "count": len(self.times),
+        }
+
 
 Sessions = SessionStore()
 playback = Playback()
@@ -353,7 +1652,42 @@ class AITGUIPlugin(Plugin):
 
         bottle.TEMPLATE_PATH.append(HTMLRoot.user)
 
-        gevent.spawn(self.init)
+        packet_defns.rebuild()
+
+        playback.range_ttl = float(getattr(self, "playback_range_ttl", 60))
+        TelemetryQuery.processes = int(
+            getattr(self, "tlm_query_processes", TelemetryQuery.processes)
+        )
+        query_jobs.concurrency = int(getattr(self, "tlm_query_jobs", 2))
+        query_jobs.cache_size = int(getattr(self, "tlm_query_cache", 16))
+        playback.chunk_size = int(getattr(self, "playback_chunk_size", 10000))
+        playback.cache.budget = int(
+            getattr(self, "playback_cache_bytes", 64 * 1024 * 1024)
+        )
+        command_writer.policy = getattr(self, "cmd_hist_sync", "batch")
+        if command_writer.policy not in CommandHistoryWriter.Policies:
+            raise ValueError(
+                "cmd_hist_sync must be one of {}".format(
+                    ", ".join(CommandHistoryWriter.Policies)
+                )
+            )
+        command_writer.delay = float(getattr(self, "cmd_hist_delay", 0))
+        Greenlets.append(command_writer.start())
+
+        packet_history.size = int(getattr(self, "tlm_history_size", 1200))
+        max_age = getattr(self, "tlm_history_age", None)
+        packet_history.max_age = float(max_age) if max_age else None
+
+        Sessions.coalesce = bool(getattr(self, "tlm_coalesce", False))
+        idle_timeout = getattr(self, "session_idle_timeout", 600)
+        Sessions.idle_timeout = float(idle_timeout) if idle_timeout else None
+        max_queued = getattr(self, "session_queue_budget", None)
+        Sessions.max_queued = int(max_queued) if max_queued is not None else None
+        Greenlets.append(
+            Sessions.start_reaper(float(getattr(self, "session_reap_interval", 30)))
+        )
+
+        gevent.spawn(self.init)
 
     def process(self, input_data, topic=None):
         # msg is going to be a tuple from the ait_packet_handler
@@ -460,6 +1794,7 @@ class AITGUIPlugin(Plugin):
         for s in Servers:
             s.stop()
 
+        command_writer.stop()
         gevent.killall(Greenlets)
 
     def start_browser(self, url, name=None):
@@ -518,8 +1853,7 @@ class AITGUIPlugin(Plugin):
                 self.publish(encoded)
                 status = True
 
-                with pcap.open(CMD_API.CMD_HIST_FILE, "a") as output:
-                    output.write(str(cmdobj))
+                command_writer.write(str(cmdobj))
             except IOError as e:
                 log.error(e.message)
 
@@ -536,6 +1870,74 @@ def __set_response_to_json():
     bottle.response.cache_control = "no-cache"
 
 
+class CachedResponse(object):
+    """CachedResponse
+    A CachedResponse holds the JSON encoding of a (large, rarely changing)
+    object, e.g. a dictionary, along with its gzip compressed variant and
+    an ETag derived from its content.  The encoding is rebuilt only when
+    the object returned by source() is no longer the one encoded, e.g.
+    after the dictionary is reloaded.
+    """
+
+    def __init__(self, source, encode=lambda obj: obj.toJSON()):
+        """Creates a new CachedResponse for the object returned by source()
+        and encoded as JSON via json.dumps(encode(obj)).
+        """
+        self._source = source
+        self._encode = encode
+        self._obj = None
+        self.body = None
+        self.gzipped = None
+        self.etag = None
+
+    def update(self):
+        """Re-encodes the source object if it has changed."""
+        obj = self._source()
+
+        if self.body is None or obj is not self._obj:
+            body = json.dumps(self._encode(obj), default=str).encode("utf-8")
+            self.gzipped = gzip.compress(body)
+            self.etag = '"{}"'.format(hashlib.sha1(body).hexdigest())
+            self.body = body
+            self._obj = obj
+
+    def respond(self):
+        """Returns the cached body for this HTTP request, a gzip compressed
+        body if the client accepts one, or an empty 304 Not Modified
+        response if the client's copy (If-None-Match) is current.
+        """
+        self.update()
+
+        bottle.response.content_type = "application/json"
+        bottle.response.set_header("Cache-Control", "no-cache")
+        bottle.response.set_header("ETag", self.etag)
+        bottle.response.set_header("Vary", "Accept-Encoding")
+
+        match = bottle.request.get_header("If-None-Match", "")
+        if self.etag in match.split(",") or match.strip() == "*":
+            bottle.response.status = 304
+            return b""
+
+        if "gzip" in bottle.request.get_header("Accept-Encoding", ""):
+            bottle.response.set_header("Content-Encoding", "gzip")
+            return self.gzipped
+
+        return self.body
+
+
+# Cached responses for the dictionary endpoints, rebuilt whenever the
+# underlying dictionary is (re)loaded.
+Dictionaries = {
+    "cmd": CachedResponse(lambda: cmd.getDefaultDict()),
+    "evr": CachedResponse(lambda: evr.getDefaultDict()),
+    "leapseconds": CachedResponse(
+        lambda: dmc.LeapSeconds.leapseconds, encode=lambda obj: obj
+    ),
+    "limits": CachedResponse(lambda: limits.getDefaultDict()),
+    "tlm": CachedResponse(lambda: tlm.getDefaultDict()),
+}
+
+
 @App.route("/")
 def handle_root():
     """Return index page"""
@@ -574,7 +1976,7 @@ def handle_events_post():
 @App.route("/evr/dict", method="GET")
 def handle_evr_get():
     """Return JSON EVR dictionary"""
-    return json.dumps(evr.getDefaultDict().toJSON())
+    return Dictionaries["evr"].respond()
 
 
 @App.route("/messages", method="POST")
@@ -635,7 +2037,7 @@ def handle_tlm_get():
            }
        }
     """
-    return json.dumps(tlm.getDefaultDict().toJSON())
+    return Dictionaries["tlm"].respond()
 
 
 @App.route("/cmd/dict", method="GET")
@@ -672,7 +2074,243 @@ def handle_cmd_get():
            ...
        }
     """
-    return json.dumps(cmd.getDefaultDict().toJSON())
+    return Dictionaries["cmd"].respond()
+
+
+class CommandHistory(object):
+    """CommandHistory
+    A CommandHistory indexes the command history pcap file (see
+    CmdAPI.CMD_HIST_FILE) in memory: the time and command of each record,
+    in the order sent, and the distinct commands sent, in the order first
+    sent.  The file is read once, then, whenever its size changes, only
+    the records appended since.  It is read again from the start if it is
+    replaced or truncated.
+    """
+
+    def __init__(self):
+        """Creates a new, empty CommandHistory."""
+        self.clear()
+
+    def __len__(self):
+        return len(self.commands)
+
+    def clear(self, filename=None):
+        """Discards all records, e.g. to index the given file instead."""
+        self.filename = filename
+        self.inode = None
+        self.offset = 0
+        self.times = []
+        self.commands = []
+        self.distinct = {}
+
+    def add(self, timestamp, command):
+        """Adds a record of command sent at the given time."""
+        # Repeated commands share one string.
+        command = self.distinct.setdefault(command, command)
+        self.times.append(str(timestamp))
+        self.commands.append(command)
+
+    def refresh(self, filename):
+        """Reads the records appended to the given command history file
+        since the last refresh.  Returns False if the file cannot be read.
+        """
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            # Keep commands added before the file is first written.
+            if (filename, None) != (self.filename, self.inode):
+                self.clear(filename)
+            return False
+
+        replaced = (filename, stat.st_ino) != (self.filename, self.inode)
+        if replaced or stat.st_size < self.offset:
+            self.clear(filename)
+            self.inode = stat.st_ino
+
+        if stat.st_size == self.offset:
+            return True
+
+        try:
+            file = open(filename, "rb")
+        except OSError:
+            return False
+
+        with file:
+            stream = pcap.PCapStream(file, "rb")
+            if stream.header.magic_number is None:
+                return True
+            if self.offset:
+                file.seek(self.offset)
+
+            while True:
+                self.offset = file.tell()
+                header, data = stream.read()
+
+                # A record still being written is read next time.
+                if data is None or len(data) < header.incl_len:
+                    break
+                self.add(header.timestamp, data.decode("utf-8"))
+
+        return True
+
+    def page(self, limit=None, before=None):
+        """Returns the (id, time, command) of up to limit (default: all)
+        records, newest first, sent before the record with the given id
+        (default: all).  Ids are the positions of records in the file.
+        """
+        end = len(self) if before is None else max(0, min(before, len(self)))
+        start = 0 if limit is None else max(end - limit, 0)
+        ids = range(end - 1, start - 1, -1)
+        return [(n, self.times[n], self.commands[n]) for n in ids]
+
+
+command_history = CommandHistory()
+
+
+class CommandHistoryWriter(object):
+    """CommandHistoryWriter
+    A CommandHistoryWriter appends sent commands to the command history
+    pcap file (see CmdAPI.CMD_HIST_FILE) from its own greenlet, so sending
+    a command does not wait on the file.  Commands are queued, added to
+    command_history right away, and written in batches to a file kept
+    open between batches.  A batch is every command queued by the time
+    the greenlet runs, or delay seconds after the first one.
+
+    The durability policy sets when written commands are synced to disk:
+    "always" (after each command), "batch" (after each batch) or "none"
+    (left to the operating system).  Syncs run in gevent's threadpool.  If
+    writing fails, the commands stay queued and are retried retry seconds
+    later.
+    """
+
+    Policies = ("always", "batch", "none")
+
+    def __init__(self, policy="batch", delay=0):
+        """Creates a new CommandHistoryWriter.  Its greenlet is started by
+        start() or the first write().
+        """
+        self.policy = policy
+        self.delay = delay
+        self.retry = 1.0
+        self.written = 0
+        self.batches = 0
+        self._queue = gevent.queue.Queue()
+        self._file = None
+        self._stream = None
+        self._greenlet = None
+
+    def start(self):
+        """Starts (if needed) and returns the writer greenlet."""
+        if self._greenlet is None:
+            self._greenlet = gevent.spawn(self._run)
+        return self._greenlet
+
+    def write(self, command):
+        """Queues command, sent now, to be written to the command history."""
+        header = pcap.PCapPacketHeader(orig_len=len(command))
+
+        command_history.refresh(CMD_API.CMD_HIST_FILE)
+        command_history.add(header.timestamp, command)
+
+        self._queue.put((header, command))
+        self.start()
+
+    def stop(self):
+        """Stops the writer greenlet, writes any commands still queued and
+        closes the command history file.
+        """
+        if self._greenlet is not None:
+            self._greenlet.kill()
+            self._greenlet = None
+
+        if not self._queue.empty():
+            self._write_queued()
+        self.close()
+
+    def _run(self):
+        while True:
+            self._queue.peek()
+            if self.delay:
+                gevent.sleep(self.delay)
+            if not self._write_queued():
+                gevent.sleep(self.retry)
+
+    def _write_queued(self):
+        """Writes the queued commands; returns False if writing failed.
+        Commands stay queued until written, to be written by a later call
+        (or stop()) if this one fails.
+        """
+        try:
+            self._flush()
+        except OSError as e:
+            log.error("Unable to write command history: {}".format(e))
+            self.close()
+            return False
+        return True
+
+    def _flush(self):
+        filename = CMD_API.CMD_HIST_FILE
+
+        if self._file is None or self._file.name != filename:
+            self.close()
+            self._file = open(filename, "ab")
+
+        # A new file's pcap header is written with the first command.
+        if self._stream is None:
+            self._stream = pcap.PCapStream(self._file, "ab")
+
+        while not self._queue.empty():
+            # The file's size, not tell(), includes others' appends.
+            offset = os.fstat(self._file.fileno()).st_size
+            header, command = self._queue.peek()
+            self._stream.write(command, header)
+            self._queue.get_nowait()
+            self.written += 1
+
+            self._index(filename, offset)
+            if self.policy == "always":
+                self._sync()
+
+        if self.policy == "batch":
+            self._sync()
+        self.batches += 1
+
+    def _index(self, filename, offset):
+        # The command written at offset is already in command_history, so
+        # it skips over it, unless others wrote to the file too.  Then the
+        # file is read again and the commands still queued are re-added.
+        if command_history.filename == filename and command_history.offset == offset:
+            stat = os.fstat(self._file.fileno())
+            command_history.offset = stat.st_size
+            command_history.inode = stat.st_ino
+        else:
+            command_history.clear()
+            command_history.refresh(filename)
+            for header, command in list(self._queue.queue):
+                command_history.add(header.timestamp, command)
+
+    def _sync(self):
+        # Sync in a thread, so other greenlets run while the disk syncs.
+        fd = self._file.fileno()
+        gevent.get_hub().threadpool.apply(os.fsync, (fd,))
+
+    def close(self):
+        """Closes the command history file, if open."""
+        if self._file is not None:
+            self._file.close()
+        self._file = None
+        self._stream = None
+
+    def stats(self):
+        """Returns a dictionary of CommandHistoryWriter statistics."""
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "batches": self.batches,
+        }
+
+
+command_writer = CommandHistoryWriter()
 
 
 @App.route("/cmd/hist.json", method="GET")
@@ -685,38 +2323,49 @@ def handle_cmd_hist_get():
            "SEQ_START 3423"
        ]
     If you set the **detailed** query string flag the JSON
-    returned will include timestamp information.
+    returned will include timestamp information, newest first.
     **Example Detailed Response**
     .. sourcecode: json
         [
             {
+                "id": 1,
                 "timestamp": "2017-08-01 15:41:13.117805",
                 "command": "NO_OP"
             },
             {
+                "id": 0,
                 "timestamp": "2017-08-01 15:40:23.339886",
                 "command": "NO_OP"
             }
         ]
+    Detailed responses are paginated:
+
+    :query limit: Maximum number of commands returned (default: all)
+    :query before: Return commands sent before the one with this id, e.g.
+        the last id of the previous page
     """
-    cmds = []
+    query = bottle.request.query
 
     try:
-        with pcap.open(CMD_API.CMD_HIST_FILE, "r") as stream:
-            if "detailed" in bottle.request.query:
-                cmds = [
-                    {
-                        "timestamp": str(header.timestamp),
-                        "command": cmdname.decode("utf-8"),
-                    }
-                    for (header, cmdname) in stream
-                ]
-                return json.dumps(list(reversed(cmds)))
-            else:
-                cmds = [cmdname.decode("utf-8") for (header, cmdname) in stream]
-                return json.dumps(list(set(cmds)))
-    except IOError:
-        pass
+        limit = int(query.get("limit")) if query.get("limit") else None
+        before = int(query.get("before")) if query.get("before") else None
+    except ValueError:
+        limit = 0
+
+    if limit is not None and limit < 1:
+        bottle.abort(400, "Invalid limit or before: must be positive integers.")
+
+    __set_response_to_json()
+    command_history.refresh(CMD_API.CMD_HIST_FILE)
+
+    if "detailed" in query:
+        cmds = [
+            {"id": id, "timestamp": timestamp, "command": command}
+            for id, timestamp, command in command_history.page(limit, before)
+        ]
+        return json.dumps(cmds)
+    else:
+        return json.dumps(list(command_history.distinct))
 
 
 @App.route("/cmd/validate", method="POST")
@@ -756,277 +2405,2211 @@ def handle_log_get():
 
 @App.route("/tlm/realtime/openmct")
 def handle_openmct_realtime_tlm():
-    """Return telemetry packets in realtime to client"""
-    session = Sessions.create()
-    pad = bytearray(1)
+    """Return telemetry packets in realtime to client
+
+    Clients may limit the maximum number of packets per second they
+    receive of each type with the query string ``rate`` (e.g. ``rate=4``)
+    and of specific types with ``rates`` (e.g.
+    ``rates=ExamplePacket1:1,ExamplePacket2:10``).  Only the latest
+    packet of a rate limited type is sent when its interval elapses.
+    """
     wsock = bottle.request.environ.get("wsgi.websocket")
 
     if not wsock:
         bottle.abort(400, "Expected WebSocket request.")
 
-    try:
-        while not wsock.closed:
+    session = Sessions.create()
+    pad = bytearray(1)
+
+    # The Session exists only for the lifetime of this WebSocket, so it is
+    # kept active (never reaped) while open and removed once closed.
+    with session:
+        try:
+            set_rate_from_query(session)
+
+            while not wsock.closed:
+                try:
+                    item = session.telemetry.popleft(timeout=30)
+                    if item is None:
+                        continue
+
+                    uid, data, _ = item
+                    pkt_defn = get_packet_defn(uid)
+                    if pkt_defn is None:
+                        continue
+
+                    wsock.send(
+                        json.dumps(
+                            {
+                                "packet": pkt_defn.name,
+                                "data": ait.core.tlm.Packet(
+                                    pkt_defn, data=data
+                                ).toJSON(),
+                            }
+                        )
+                    )
+
+                except IndexError:
+                    # If no telemetry has been received by the GUI
+                    # server after timeout seconds, "probe" the client
+                    # websocket connection to make sure it's still
+                    # active and if so, keep it alive.  This is
+                    # accomplished by sending a packet with an ID of
+                    # zero and no packet data.  Packet ID zero with no
+                    # data is ignored by AIT GUI client-side
+                    # Javascript code.
+
+                    if not wsock.closed:
+                        wsock.send(pad + struct.pack(">I", 0))
+        except geventwebsocket.WebSocketError:
+            pass
+        finally:
+            Sessions.pop(session.id, None)
+
+
+class PacketDecoder(object):
+    """PacketDecoder
+    A PacketDecoder compiles a PacketDefinition once into a small set of
+    precompiled struct.Struct unpack plans so that all raw field values of
+    a packet can be decoded in a single call, instead of one
+    ait.core.tlm.Packet attribute lookup per field.
+
+    Fields that share bytes (e.g. bit masked fields) are placed in
+    separate unpack layers, as are fields of differing byte order.
+    Complex types (times, commands, EVRs, user defined types) are decoded
+    individually via their FieldDefinition.  Definitions that cannot be
+    compiled (conditional ``when`` fields, packet history, or arrays of
+    non-primitive types) fall back to the generic ait.core.tlm.Packet path.
+    """
+
+    def __init__(self, defn, compile=True):
+        """Creates a new PacketDecoder for the given PacketDefinition.
+        If compile is False, the generic ait.core.tlm.Packet path is
+        always used.
+        """
+        self.defn = defn
+        self._structs = None
+        self._plan = None
+
+        # A full ait.core.tlm.Packet is still required to compute DN to EU
+        # values, enumerations, complex types, and derivations.
+        self.needs_packet = bool(defn.derivations or defn.history) or any(
+            f.dntoeu is not None
+            or f.enum is not None  # noqa: W503
+            or f.type.name in dtype.ComplexTypeMap.keys()  # noqa: W503
+            for f in defn.fields
+        )
+
+        if compile:
             try:
-                uid, data = session.telemetry.popleft(timeout=30)
-                pkt_defn = get_packet_defn(uid)
-
-                wsock.send(
-                    json.dumps(
-                        {
-                            "packet": pkt_defn.name,
-                            "data": ait.core.tlm.Packet(pkt_defn, data=data).toJSON(),
-                        }
+                self._compile()
+            except (TypeError, ValueError, struct.error) as e:
+                log.warn(
+                    "Unable to compile decoder for packet {}: {}".format(defn.name, e)
+                )
+                self._structs = None
+                self._plan = None
+
+    @property
+    def compiled(self):
+        """True if this decoder uses a precompiled unpack plan."""
+        return self._plan is not None
+
+    @staticmethod
+    def _struct_code(ftype):
+        """Returns a (byteorder, code, count) triple for the given field
+        type or None if the type cannot be unpacked with struct directly.
+        """
+        count = None
+
+        if isinstance(ftype, dtype.ArrayType):
+            count = ftype.nelems
+            ftype = ftype.type
+
+        if type(ftype) is not dtype.PrimitiveType or ftype.format is None:
+            return None
+
+        fmt = ftype.format
+        order = fmt[0] if fmt[0] in "<>" else None
+        code = fmt.lstrip("<>")
+
+        if count is not None:
+            if ftype.string:
+                return None
+            code = "{}{}".format(count, code)
+
+        return order, code, count
+
+    def _compile(self):
+        defn = self.defn
+
+        if defn.history or any(f.when is not None for f in defn.fields):
+            return
+
+        # Each layer is a non-overlapping set of slots sharing a byte order.
+        # A slot is keyed by (start, code) so that fields decoding the same
+        # bytes the same way (e.g. masked bit fields) share one value.
+        layers = []
+        assignments = []
+        count_of = {}
+
+        for field in defn.fields:
+            spec = self._struct_code(field.type)
+
+            if spec is None:
+                if isinstance(field.type, dtype.ArrayType):
+                    return
+                assignments.append((field, None, None, None))
+                continue
+
+            order, code, count = spec
+            span = field.slice()
+            start, stop = span.start, span.stop
+            placed = None
+
+            for index, layer in enumerate(layers):
+                if order is not None and layer["order"] not in (None, order):
+                    continue
+
+                slots = layer["slots"]
+                if (start, code) in slots:
+                    placed = index
+                    break
+
+                overlaps = any(
+                    start < s_stop and s_start < stop
+                    for (s_start, _), s_stop in slots.items()
+                )
+                if not overlaps:
+                    slots[(start, code)] = stop
+                    layer["order"] = layer["order"] or order
+                    placed = index
+                    break
+
+            if placed is None:
+                layers.append({"order": order, "slots": {(start, code): stop}})
+                placed = len(layers) - 1
+
+            count_of[(start, code)] = 1 if count is None else count
+            assignments.append((field, placed, (start, code), count))
+
+        structs = []
+        positions = []
+
+        for layer in layers:
+            fmt = [layer["order"] or ">"]
+            offset = 0
+            index = 0
+            position = {}
+
+            for (start, code), stop in sorted(layer["slots"].items()):
+                if start > offset:
+                    fmt.append("{}x".format(start - offset))
+                fmt.append(code)
+                position[(start, code)] = index
+                index += count_of[(start, code)]
+                offset = stop
+
+            structs.append(struct.Struct("".join(fmt)))
+            positions.append(position)
+
+        plan = []
+        for field, layer, slot, count in assignments:
+            if layer is None:
+                plan.append((field.name, None, None, None, None, 0, field.decode))
+            else:
+                plan.append(
+                    (
+                        field.name,
+                        layer,
+                        positions[layer][slot],
+                        count,
+                        field.mask,
+                        field.shift,
+                        None,
                     )
                 )
 
-            except IndexError:
-                # If no telemetry has been received by the GUI
-                # server after timeout seconds, "probe" the client
-                # websocket connection to make sure it's still
-                # active and if so, keep it alive.  This is
-                # accomplished by sending a packet with an ID of
-                # zero and no packet data.  Packet ID zero with no
-                # data is ignored by AIT GUI client-side
-                # Javascript code.
-
-                if not wsock.closed:
-                    wsock.send(pad + struct.pack(">I", 0))
-    except geventwebsocket.WebSocketError:
-        pass
+        self._structs = structs
+        self._plan = plan
+
+    def _decode(self, data):
+        values = [s.unpack_from(data) for s in self._structs]
+        raw = {}
+
+        for name, layer, index, count, mask, shift, decode in self._plan:
+            if decode is not None:
+                raw[name] = decode(data, raw=True)
+                continue
+
+            if count is None:
+                value = values[layer][index]
+                if mask is not None:
+                    value &= mask
+                if shift > 0:
+                    value >>= shift
+            else:
+                value = list(values[layer][index : index + count])
+                if mask is not None:
+                    value = [v & mask for v in value]
+                if shift > 0:
+                    value = [v >> shift for v in value]
+
+            raw[name] = value
+
+        return raw
+
+    def decode(self, data, packet=None):
+        """Returns a dictionary of raw (undecorated) field values, keyed
+        by field name, for the given binary packet data.  The optional
+        ait.core.tlm.Packet is used when falling back to the generic
+        decoding path.
+        """
+        if self._plan is not None:
+            try:
+                return self._decode(data)
+            except struct.error:
+                pass
+
+        if packet is None:
+            packet = ait.core.tlm.Packet(self.defn, data=data)
+
+        return {f.name: getattr(packet.raw, f.name) for f in self.defn.fields}
+
+
+packet_decoders: Dict[tlm.PacketDefinition, PacketDecoder] = {}
+
+
+def get_packet_decoder(pkt_defn):
+    """
+    Returns the (cached) PacketDecoder for the given packet definition,
+    compiling it on first use.
+    """
+    decoder = packet_decoders.get(pkt_defn)
+
+    if decoder is None:
+        decoder = PacketDecoder(pkt_defn)
+        packet_decoders[pkt_defn] = decoder
+
+    return decoder
+
+
+class PacketPacker(object):
+    """PacketPacker
+    A PacketPacker compiles a PacketDefinition once into struct.Struct
+    pack plans, so that packets can be rebuilt in bulk from their raw
+    field values, e.g. points queried from the playback datastore.
+    Consecutive fields sharing a byte order are packed by a single
+    struct.Struct; a packet definition whose fields all share a byte
+    order (or are byte order independent) is packed by exactly one.
+    """
+
+    def __init__(self, defn):
+        """Creates a new PacketPacker for the given PacketDefinition."""
+        self.defn = defn
+        self._runs = []
+        self._buffer = bytearray()
+
+        runs = []
+        for field in defn.fields:
+            fmt = field.type.format
+            order = fmt[0] if fmt[0] in "<>!=@" else None
+            code = fmt.lstrip("<>!=@")
+
+            # Only single bytes and strings may be packed in any byte order.
+            if order == "@" or (order is None and code[-1] not in "bBcs?"):
+                order = "="
+
+            if runs and order in (None, runs[-1][0]):
+                runs[-1][1].append(code)
+                runs[-1][2].append(field.name)
+            elif runs and runs[-1][0] is None:
+                runs[-1] = (order, runs[-1][1] + [code], runs[-1][2] + [field.name])
+            else:
+                runs.append((order, [code], [field.name]))
+
+        for order, codes, names in runs:
+            packer = struct.Struct((order or ">") + "".join(codes))
+            if len(names) == 1:
+                values = lambda row, name=names[0]: (row[name],)  # noqa: E731
+            else:
+                values = operator.itemgetter(*names)
+            self._runs.append((packer, values))
+
+        self.size = sum(packer.size for packer, _ in self._runs)
+
+    def pack(self, rows):
+        """Returns the packed bytes of each row, a dictionary of raw field
+        values keyed by field name.  Rows are packed into a single
+        preallocated buffer that is reused across calls.
+        """
+        size = self.size
+        total = size * len(rows)
+
+        if size == 0:
+            return [b""] * len(rows)
+
+        if len(self._buffer) < total:
+            self._buffer = bytearray(total)
+
+        buffer = self._buffer
+        offset = 0
+        for row in rows:
+            for packer, values in self._runs:
+                packer.pack_into(buffer, offset, *values(row))
+                offset += packer.size
+
+        data = bytes(memoryview(buffer)[:total])
+        return [data[start : start + size] for start in range(0, total, size)]
+
+
+packet_packers: Dict[tlm.PacketDefinition, PacketPacker] = {}
+
+
+def get_packet_packer(pkt_defn):
+    """
+    Returns the (cached) PacketPacker for the given packet definition,
+    compiling it on first use.
+    """
+    packer = packet_packers.get(pkt_defn)
+
+    if packer is None:
+        packer = PacketPacker(pkt_defn)
+        packet_packers[pkt_defn] = packer
+
+    return packer
+
+
+class PacketVersions(object):
+    """PacketVersions
+    PacketVersions tracks a monotonically increasing version for the state
+    of each packet type in packet_states, and caches the JSON encoding of
+    each packet's state at its current version.  This lets /tlm/latest
+    return only the packet states changed since a client's last snapshot,
+    without re-encoding (or mutating) unchanged states.
+    """
+
+    def __init__(self):
+        """Creates a new PacketVersions at version zero."""
+        self.version = 0
+        self._versions = {}
+        self._encoded = {}
+
+    def __getitem__(self, pkt_name):
+        return self._versions[pkt_name]
+
+    def update(self, pkt_name):
+        """Marks the state of the given packet as changed."""
+        self.version += 1
+        self._versions[pkt_name] = self.version
+
+    def changed(self, since=0, packets=None):
+        """Returns the names of packets (limited to the given names, if
+        any) whose state changed after version since.
+        """
+        names = self._versions if packets is None else packets
+        return [
+            name
+            for name in names
+            if name in self._versions and self._versions[name] > since
+        ]
+
+    def encode(self, pkt_name, state):
+        """Returns the JSON encoding of the given packet state, reusing
+        the cached encoding if the state has not changed since.
+        """
+        version = self._versions.get(pkt_name)
+        cached = self._encoded.get(pkt_name)
+
+        if cached is None or cached[0] != version:
+            cached = (version, json.dumps(state, default=json_default))
+            self._encoded[pkt_name] = cached
+
+        return cached[1]
 
 
 packet_states = {}
+packet_versions = PacketVersions()
+
+
+def get_packet_delta(pkt_defn, packet):
+    """
+    Keeps track of last packets recieved of all types recieved
+    and returns only fields that have changed since last packet.
+
+    Params:
+        pkt_defn:  Packet definition
+        packet:    Binary packet data
+    Returns:
+        delta:     JSON of packet fields that have changed
+    """
+    decoder = get_packet_decoder(pkt_defn)
+    ait_pkt = None
+
+    if decoder.needs_packet or not decoder.compiled:
+        ait_pkt = ait.core.tlm.Packet(pkt_defn, data=packet)
+
+    raw_values = decoder.decode(packet, ait_pkt)
+
+    # first packet of this type
+    if pkt_defn.name not in packet_states:
+        packet_states[pkt_defn.name] = {}
+
+        # get raw fields
+        raw_fields = raw_values
+        packet_states[pkt_defn.name]["raw"] = raw_fields
+        delta = dict(raw_fields)
+
+        # get converted fields / complex fields
+        packet_states[pkt_defn.name]["dntoeu"] = {}
+        dntoeus = {}
+        for f in pkt_defn.fields:
+            if (
+                f.dntoeu is not None
+                or f.enum is not None  # noqa: W503
+                or f.type.name in dtype.ComplexTypeMap.keys()  # noqa: W503
+            ):
+                try:
+                    val = getattr(ait_pkt, f.name)
+                except ValueError:
+                    if isinstance(f.type, dtype.CmdType):
+                        val = "Unidentified Cmd"
+                    else:
+                        val = raw_values[f.name]
+
+                if isinstance(val, cmd.CmdDefn) or isinstance(val, evr.EVRDefn):
+                    val = val.name
+
+                dntoeus[f.name] = val
+                packet_states[pkt_defn.name]["dntoeu"][f.name] = val
+
+        # get derivations
+        packet_states[pkt_defn.name]["raw"].update(
+            {f.name: getattr(ait_pkt.raw, f.name) for f in pkt_defn.derivations}
+        )
+        delta.update(
+            {f.name: getattr(ait_pkt.raw, f.name) for f in pkt_defn.derivations}
+        )
+
+    # previous packets of this type received
+    else:
+        delta, dntoeus = {}, {}
+
+        for field in pkt_defn.fields:
+            new_raw = raw_values[field.name]
+            last_raw = packet_states[pkt_defn.name]["raw"][field.name]
+
+            # A field update needs sent when the raw value has changed or if a
+            # DN to EU is defined on the field. DN to EUs can take multiple
+            # telemetry points as input or may rely on other means to determine
+            # a value. We can't be sure that they won't change so we should
+            # always calculate them.
+            if new_raw != last_raw or field.dntoeu is not None:
+                delta[field.name] = new_raw
+                packet_states[pkt_defn.name]["raw"][field.name] = new_raw
+
+                if (
+                    field.dntoeu is not None
+                    or field.enum is not None  # noqa: W503
+                    or field.type.name in dtype.ComplexTypeMap.keys()  # noqa: W503
+                ):
+                    try:
+                        dntoeu_val = getattr(ait_pkt, field.name)
+                    except ValueError:
+                        if isinstance(field.type, dtype.CmdType):
+                            dntoeu_val = "Unidentified Cmd"
+                        else:
+                            dntoeu_val = raw_values[field.name]
+
+                    if isinstance(dntoeu_val, cmd.CmdDefn) or isinstance(
+                        dntoeu_val, evr.EVRDefn
+                    ):
+                        dntoeu_val = dntoeu_val.name
+
+                    dntoeus[field.name] = dntoeu_val
+                    packet_states[pkt_defn.name]["dntoeu"][field.name] = dntoeu_val
+
+        for field in pkt_defn.derivations:
+            new_value = getattr(ait_pkt.raw, field.name)
+            last_value = packet_states[pkt_defn.name]["raw"][field.name]
+
+            if new_value != last_value:
+                delta[field.name] = new_value
+                packet_states[pkt_defn.name]["raw"][field.name] = new_value
+
+    if delta or dntoeus:
+        packet_versions.update(pkt_defn.name)
+
+    return delta, dntoeus
+
+
+def json_default(obj):
+    """Encodes objects json.dumps() cannot, e.g. datetimes as ISO
+    formatted strings.
+    """
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    return str(obj)
+
+
+def replace_datetimes(delta):
+    """Replace datetime objects with ISO formatted
+    strings for JSON serialization"""
+    for key, val in delta.items():
+        if type(val) is datetime:
+            delta[key] = val.isoformat()
+
+    return delta
+
+
+class HistoryBuffer(object):
+    """HistoryBuffer
+    A HistoryBuffer is a fixed size, columnar ring buffer of the values of
+    a single packet type: arrival times plus one typed NumPy column per
+    numeric raw field and one float64 column per numeric DN to EU value.
+    Samples are appended in arrival order, so times are sorted and time
+    ranges are located with a binary search.
+    """
+
+    def __init__(self, size, raw, dntoeu):
+        """Creates a new HistoryBuffer holding up to size samples of the
+        raw fields given as a {name: numpy.dtype} dictionary and the DN to
+        EU values of the given list of field names.
+        """
+        self.size = size
+        self.count = 0
+        self.time = numpy.empty(size, dtype=numpy.float64)
+        self.raw = {name: numpy.zeros(size, kind) for name, kind in raw.items()}
+        self.dntoeu = {name: numpy.zeros(size, numpy.float64) for name in dntoeu}
+        self._next = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, timestamp, raw, dntoeu):
+        """Appends a sample of the given raw and DN to EU values."""
+        i = self._next
+        self.time[i] = timestamp
+
+        for columns, values in ((self.raw, raw), (self.dntoeu, dntoeu)):
+            for name, column in columns.items():
+                value = values.get(name)
+                try:
+                    column[i] = value
+                except (TypeError, ValueError, OverflowError):
+                    column[i] = numpy.nan if column.dtype.kind == "f" else 0
+
+        self._next = (i + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+
+    def _start(self):
+        """The index of the oldest sample."""
+        return self._next if self.count == self.size else 0
+
+    def _search(self, timestamp):
+        """Returns the number of samples at or before timestamp."""
+        start = self._start()
+        older = self.time[start : self.count if start == 0 else self.size]
+        newer = self.time[:start]
+
+        if len(newer) and timestamp >= newer[0]:
+            return len(older) + int(numpy.searchsorted(newer, timestamp, "right"))
+        return int(numpy.searchsorted(older, timestamp, "right"))
+
+    def _take(self, column, lo, hi):
+        """Returns samples lo (inclusive) to hi (exclusive), oldest first,
+        of the given column.
+        """
+        start = self._start()
+        a, b = start + lo, start + hi
+
+        if b <= self.size:
+            return column[a:b]
+        if a >= self.size:
+            return column[a - self.size : b - self.size]
+        return numpy.concatenate((column[a:], column[: b - self.size]))
+
+    def slice(self, since=None, until=None, fields=None):
+        """Returns (time, raw, dntoeu) column slices of the samples after
+        since and at or before until, limited to the given field names.
+        """
+        lo = 0 if since is None else self._search(since)
+        hi = self.count if until is None else self._search(until)
+        hi = max(lo, hi)
+
+        def columns(values):
+            return {
+                name: self._take(column, lo, hi)
+                for name, column in values.items()
+                if fields is None or name in fields
+            }
+
+        return (
+            self._take(self.time, lo, hi),
+            columns(self.raw),
+            columns(self.dntoeu),
+        )
+
+
+class PacketHistory(object):
+    """PacketHistory
+    A PacketHistory keeps a HistoryBuffer of recent values for each packet
+    type, so clients (e.g. plots) can backfill data that arrived before
+    they connected.  History is limited to size samples per packet and,
+    optionally, to samples received in the last max_age seconds.  History
+    requires NumPy and is disabled if it is not installed.
+    """
+
+    NumericCodes = "bBhHiIqQfd"
+
+    def __init__(self, size=1200, max_age=None):
+        """Creates a new, empty PacketHistory."""
+        self.size = size
+        self.max_age = max_age
+        self.buffers = {}
+
+    @property
+    def enabled(self):
+        """True if history is being kept."""
+        return numpy is not None and self.size > 0
+
+    def clear(self):
+        """Discards all history."""
+        self.buffers.clear()
+
+    def columns(self, pkt_defn):
+        """Returns the ({name: numpy.dtype}, [name]) raw and DN to EU
+        columns kept for the given packet definition.
+        """
+        raw, dntoeu = {}, []
+
+        for field in pkt_defn.fields:
+            struct_code = PacketDecoder._struct_code(field.type)
+            if struct_code is not None:
+                _, code, count = struct_code
+                if count is None and code in self.NumericCodes:
+                    raw[field.name] = numpy.dtype(code)
+            if field.dntoeu is not None:
+                dntoeu.append(field.name)
+
+        for field in pkt_defn.derivations:
+            raw[field.name] = numpy.dtype(numpy.float64)
+
+        return raw, dntoeu
+
+    def add(self, pkt_defn, state, timestamp=None):
+        """Records the given packet state (see packet_states)."""
+        if not self.enabled or state is None:
+            return
+
+        buffer = self.buffers.get(pkt_defn.name)
+        if buffer is None:
+            raw, dntoeu = self.columns(pkt_defn)
+            buffer = HistoryBuffer(self.size, raw, dntoeu)
+            self.buffers[pkt_defn.name] = buffer
+
+        if timestamp is None:
+            timestamp = time.time()
+
+        buffer.append(timestamp, state["raw"], state["dntoeu"])
+
+    def get(
+        self, pkt_name, fields=None, since=None, until=None, points=None, method=None
+    ):
+        """Returns a JSON serializable dictionary of the history of the
+        given packet, or None if there is none.  Times are POSIX
+        timestamps and missing values are None.
+
+        If points is given, each field is decimated to about that many
+        samples with the given method (see Downsamplers).
+        """
+        buffer = self.buffers.get(pkt_name)
+        if buffer is None:
+            return None
+
+        if self.max_age is not None:
+            oldest = time.time() - self.max_age
+            since = oldest if since is None else max(since, oldest)
+
+        times, raw, dntoeu = buffer.slice(since, until, fields)
+
+        if points is not None and len(times) > points:
+            downsample = Downsamplers[method or "minmax"]
+            columns = list(raw.values()) + list(dntoeu.values())
+            index = [numpy.empty(0, dtype=int)]
+            index += [downsample(times, column, points) for column in columns]
+            index = numpy.unique(numpy.concatenate(index))
+
+            times = times[index]
+            raw = {name: column[index] for name, column in raw.items()}
+            dntoeu = {name: column[index] for name, column in dntoeu.items()}
+
+        return {
+            "packet": pkt_name,
+            "time": times.tolist(),
+            "raw": {name: column_to_list(col) for name, col in raw.items()},
+            "dntoeu": {name: column_to_list(col) for name, col in dntoeu.items()},
+        }
+
+
+def downsample_minmax(times, values, points):
+    """Returns the sorted indices of the minimum and maximum of values in
+    each of points / 2 buckets of (about) equally many samples, so peaks
+    are kept however many samples there are.  NaNs are ignored.
+    """
+    valid = numpy.flatnonzero(~numpy.isnan(values.astype(numpy.float64)))
+    count = len(valid)
+    buckets = max(points // 2, 1)
+
+    if count <= points:
+        return valid
+
+    # Pad the values to a (buckets, width) array, so the extrema of every
+    # bucket are found at once.
+    width = -(-count // buckets)
+    values = values[valid].astype(numpy.float64)
+    padding = buckets * width - count
+    lows = numpy.append(values, numpy.full(padding, numpy.inf))
+    highs = numpy.append(values, numpy.full(padding, -numpy.inf))
+    offsets = numpy.arange(buckets) * width
+
+    lows = offsets + numpy.argmin(lows.reshape(buckets, width), axis=1)
+    highs = offsets + numpy.argmax(highs.reshape(buckets, width), axis=1)
+    index = numpy.unique(numpy.concatenate((lows, highs)))
+
+    return valid[index[index < count]]
+
+
+def downsample_lttb(times, values, points):
+    """Returns the sorted indices of points samples chosen by the
+    Largest-Triangle-Three-Buckets algorithm, which keeps the visual shape
+    of a series.  Each bucket's sample is the one forming the largest
+    triangle with the previously chosen sample and the average of the
+    next bucket.  NaNs are ignored.
+    """
+    valid = numpy.flatnonzero(~numpy.isnan(values.astype(numpy.float64)))
+    count = len(valid)
+
+    if count <= max(points, 2):
+        return valid
+    if points < 3:
+        return valid[[0, -1]]
+
+    x = times[valid].astype(numpy.float64)
+    y = values[valid].astype(numpy.float64)
+
+    # The first and last samples are always kept; the rest are divided
+    # into points - 2 buckets.
+    edges = numpy.linspace(1, count - 1, points - 1).astype(int)
+    index = numpy.empty(points, dtype=int)
+    index[0], index[-1] = 0, count - 1
+
+    for n in range(points - 2):
+        lo, hi = edges[n], edges[n + 1]
+        if n + 2 < len(edges):
+            next_x = x[hi : edges[n + 2]].mean()
+            next_y = y[hi : edges[n + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+
+        prev = index[n]
+        area = numpy.abs(
+            (x[prev] - next_x) * (y[lo:hi] - y[prev])
+            - (x[prev] - x[lo:hi]) * (next_y - y[prev])  # noqa: W503
+        )
+        index[n + 1] = lo + int(numpy.argmax(area))
+
+    return valid[index]
+
+
+Downsamplers = {"minmax": downsample_minmax, "lttb": downsample_lttb}
+
+
+def column_to_list(column):
+    """Returns the given NumPy column as a list, with NaNs as None."""
+    if column.dtype.kind == "f":
+        missing = numpy.isnan(column)
+        if missing.any():
+            return numpy.where(missing, None, column).tolist()
+    return column.tolist()
+
+
+packet_history = PacketHistory()
+
+
+@App.route("/tlm/history", method="GET")
+def handle_tlm_history_get():
+    """Return recent values of a telemetry packet's numeric fields
+
+    :query packet: The packet name (required).
+    :query fields: Comma separated field names (default: all fields).
+    :query since: Only return samples received after this POSIX time.
+    :query until: Only return samples received at or before this time.
+    :query points: Decimate each field to about this many samples, e.g.
+        the width of a plot in pixels (default: all samples).
+    :query method: How samples are decimated: ``minmax``, the minimum and
+        maximum of each bucket of samples (default), or ``lttb``,
+        Largest-Triangle-Three-Buckets.
+
+    **Example Response**:
+    .. sourcecode: json
+       {
+           "packet": "ExamplePacket1",
+           "time": [1597276800.25, 1597276801.25],
+           "raw": {"Voltage_A": [12, 13]},
+           "dntoeu": {"Voltage_A": [1.2, 1.3]}
+       }
+    """
+    if not packet_history.enabled:
+        bottle.abort(501, "Telemetry history is disabled (requires numpy).")
+
+    query = bottle.request.query
+    fields = query.get("fields")
+    fields = set(fields.split(",")) if fields else None
+
+    if not query.get("packet"):
+        bottle.abort(400, "A packet name is required.")
+
+    try:
+        since = float(query.get("since")) if query.get("since") else None
+        until = float(query.get("until")) if query.get("until") else None
+    except ValueError:
+        bottle.abort(400, "Invalid time: since and until must be POSIX times.")
+
+    try:
+        points = int(query.get("points")) if query.get("points") else None
+    except ValueError:
+        points = 0
+
+    if points is not None and points < 2:
+        bottle.abort(400, "Invalid points: must be an integer of at least 2.")
+
+    method = query.get("method") or "minmax"
+    if method not in Downsamplers:
+        bottle.abort(400, "Invalid method: must be one of minmax or lttb.")
+
+    history = packet_history.get(
+        query.get("packet"), fields, since, until, points, method
+    )
+    if history is None:
+        bottle.abort(404, "No history for packet {}".format(query.get("packet")))
+
+    __set_response_to_json()
+    return json.dumps(history)
+
+
+@App.route("/tlm/schema", method="GET")
+def handle_tlm_schema_get():
+    """Return the field index schema used by binary realtime telemetry
+
+    Field indices in binary **/tlm/realtime** frames refer to positions
+    in each packet's ``fields`` list (fields followed by derivations).
+
+    **Example Response**:
+    .. sourcecode: json
+       {
+           ExamplePacket1: {
+               uid: 1,
+               fields: ["Voltage_A", "Voltage_B", "Voltage_C"]
+           },
+           ...
+       }
+    """
+    __set_response_to_json()
+    schema = {}
+    for name, pkt_defn in tlm.getDefaultDict().items():
+        names, _ = get_packet_schema(pkt_defn)
+        schema[name] = {"uid": pkt_defn.uid, "fields": names}
+    return json.dumps(schema)
+
+
+def _app_protocol(path):
+    """Returns the WebSocket subprotocol the server may accept for path."""
+    if path == "/tlm/realtime":
+        return TLM_BINARY_PROTOCOL
+    return None
+
+
+App.app_protocol = _app_protocol
+
+
+def set_rate_from_query(session):
+    """Applies the ``rate`` and ``rates`` query string parameters of this
+    HTTP request to session, or raises an HTTP 400 Bad Request error.
+
+    ``rate`` is the maximum number of updates per second for each packet
+    and ``rates`` gives per packet maxima, e.g.
+    ``rates=ExamplePacket1:2,ExamplePacket2:10``.
+    """
+    rate = bottle.request.query.get("rate")
+    rates = bottle.request.query.get("rates")
+
+    if not rate and not rates:
+        return
+
+    try:
+        limits = {}
+        for item in rates.split(",") if rates else []:
+            name, value = item.split(":")
+            limits[name] = float(value)
+
+        session.set_rate(float(rate) if rate else None, limits)
+    except ValueError as e:
+        bottle.abort(400, "Invalid telemetry rate: {}".format(e))
+
+
+def receive_subscriptions(wsock, session):
+    """Applies subscription and rate messages received on the given
+    WebSocket to session until the WebSocket is closed.
+    """
+    try:
+        while not wsock.closed:
+            message = wsock.receive()
+            if message is None:
+                break
+
+            try:
+                request = json.loads(message)
+                if "subscribe" in request:
+                    session.subscribe(request["subscribe"])
+                if "rate" in request or "rates" in request:
+                    session.set_rate(request.get("rate"), request.get("rates"))
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                log.warn("Invalid telemetry subscription message: {}".format(e))
+    except geventwebsocket.WebSocketError:
+        pass
+
+
+@App.route("/tlm/realtime")
+def handle_tlm_realtime():
+    """Return telemetry packets in realtime to client
+
+    Messages are JSON by default.  Clients may instead request compact
+    binary frames (see TLM_BINARY_PROTOCOL) by offering the
+    ``ait.tlm.binary.v1`` WebSocket subprotocol or with the query
+    string ``format=binary``.
+
+    Clients may limit the packets (and fields) they receive by sending a
+    subscription message at any time, e.g.:
+
+    .. sourcecode: json
+       {"subscribe": ["ExamplePacket1", "ExamplePacket2"]}
+       {"subscribe": {"ExamplePacket1": ["Voltage_A"], "ExamplePacket2": null}}
+       {"subscribe": null}
+
+    An initial packet subscription may also be given with the query
+    string ``packets=ExamplePacket1,ExamplePacket2``.
+
+    Clients may limit the maximum number of updates per second they
+    receive for each packet, or for specific packets, with a rate
+    message (a rate of null removes the limit):
+
+    .. sourcecode: json
+       {"rate": 4}
+       {"rate": 4, "rates": {"ExamplePacket1": 1}}
+
+    or with the query string ``rate=4&rates=ExamplePacket1:1``.  Updates
+    of rate limited packets are coalesced, so each message carries the
+    latest value of every field changed since the previous message.
+    """
+    with Sessions.current() as session:
+        # A null-byte pad ensures wsock is treated as binary.
+        pad = bytearray(1)
+        wsock = bottle.request.environ.get("wsgi.websocket")
+
+        if not wsock:
+            bottle.abort(400, "Expected WebSocket request.")
+
+        protocols = bottle.request.environ.get("HTTP_SEC_WEBSOCKET_PROTOCOL", "")
+        binary = bottle.request.query.get("format") == "binary" or (
+            TLM_BINARY_PROTOCOL in protocols
+        )
+
+        packets = bottle.request.query.get("packets")
+        if packets:
+            session.subscribe(packets.split(","))
+
+        set_rate_from_query(session)
+
+        receiver = gevent.spawn(receive_subscriptions, wsock, session)
+
+        try:
+            while not wsock.closed:
+                try:
+                    item = session.deltas.popleft(timeout=30)
+                    if item is None:
+                        # The Session's queue was replaced (see
+                        # Session.set_rate()).
+                        continue
+
+                    frame, counter = item
+
+                    if binary:
+                        wsock.send(frame.binary_message(counter), binary=True)
+                    else:
+                        wsock.send(frame.message(counter))
+
+                except IndexError:
+                    # If no telemetry has been received by the GUI
+                    # server after timeout seconds, "probe" the client
+                    # websocket connection to make sure it's still
+                    # active and if so, keep it alive.  This is
+                    # accomplished by sending a packet with an ID of
+                    # zero and no packet data.  Packet ID zero with no
+                    # data is ignored by AIT GUI client-side
+                    # Javascript code.
+
+                    if not wsock.closed:
+                        wsock.send(pad + struct.pack(">I", 0))
+        except geventwebsocket.WebSocketError:
+            pass
+        finally:
+            receiver.kill()
+
+
+@App.route("/tlm/latest", method="GET")
+def handle_tlm_latest():
+    """Return latest telemetry packet to client
+
+    Each response carries the current state ``version``.  Clients may
+    pass a previous version as ``since`` to receive only the packet
+    states changed since then, and limit the response to specific
+    packets with ``packets=ExamplePacket1,ExamplePacket2``.
+
+    **Example Response**:
+    .. sourcecode: json
+       {
+           "states": {
+               "ExamplePacket1": {
+                   "raw": {"Voltage_A": 12, "Voltage_B": 7},
+                   "dntoeu": {"Voltage_A": 1.2}
+               }
+           },
+           "counters": {"ExamplePacket1": 1024},
+           "version": 5120
+       }
+    """
+    try:
+        since = int(bottle.request.query.get("since") or 0)
+    except ValueError:
+        bottle.abort(400, "Invalid version: since must be an integer")
+
+    packets = bottle.request.query.get("packets")
+    packets = packets.split(",") if packets else None
+
+    with Sessions.current() as session:
+        version = packet_versions.version
+        states = [
+            "{}: {}".format(
+                json.dumps(name), packet_versions.encode(name, packet_states[name])
+            )
+            for name in packet_versions.changed(since, packets)
+            if name in packet_states
+        ]
+
+        __set_response_to_json()
+        return '{{"states": {{{}}}, "counters": {}, "version": {}}}'.format(
+            ", ".join(states), json.dumps(session.tlm_counters), version
+        )
+
+
+class PcapIndex(object):
+    """PcapIndex
+    A PcapIndex summarizes a pcap file so time range queries can skip it
+    entirely, or read only the part of it that may hold matching packets:
+    the first and last packet times, the sizes of packets present, and
+    sparse checkpoints of byte offsets every Interval packets.  Each
+    checkpoint records the latest time of any packet before it and the
+    earliest time of any packet from it on, so checkpoints are valid even
+    if packet times are not in order.
+
+    Indexes are kept in a sidecar ``<file>.idx`` JSON file (when the data
+    directory is writable) and rebuilt when the pcap file's size or
+    modification time changes.
+    """
+
+    Interval = 1000
+    Version = 1
+
+    def __init__(self, filename):
+        """Creates a new, empty PcapIndex for the given pcap file."""
+        self.filename = filename
+        self.size = None
+        self.mtime = None
+        self.first = None
+        self.last = None
+        self.sizes = []
+        self.data_offset = 0
+        self.checkpoints = []
+
+    @property
+    def path(self):
+        """The path of the sidecar index file."""
+        return self.filename + ".idx"
+
+    def current(self, stat):
+        """True if this index matches the given os.stat() of its file."""
+        return self.size == stat.st_size and self.mtime == stat.st_mtime
+
+    def load(self):
+        """Loads the sidecar index; returns False if it cannot be read."""
+        try:
+            with open(self.path, "r") as stream:
+                state = json.load(stream)
+        except (OSError, ValueError):
+            return False
+
+        if state.get("version") != self.Version:
+            return False
+
+        self.restore(state)
+        return True
+
+    def restore(self, state):
+        """Sets this index from a state() dictionary."""
+        for name in ("size", "mtime", "first", "last", "sizes", "data_offset"):
+            setattr(self, name, state[name])
+        self.checkpoints = [tuple(checkpoint) for checkpoint in state["checkpoints"]]
+
+    def state(self):
+        """Returns this index as a JSON-serializable dictionary."""
+        return {
+            "version": self.Version,
+            "size": self.size,
+            "mtime": self.mtime,
+            "first": self.first,
+            "last": self.last,
+            "sizes": self.sizes,
+            "data_offset": self.data_offset,
+            "checkpoints": self.checkpoints,
+        }
+
+    def save(self):
+        """Writes the sidecar index, if the data directory is writable."""
+        try:
+            with open(self.path + ".tmp", "w") as stream:
+                json.dump(self.state(), stream)
+            os.replace(self.path + ".tmp", self.path)
+        except OSError as e:
+            log.warn("Unable to save pcap index {}: {}".format(self.path, e))
+
+    def build(self):
+        """Reads the pcap file and rebuilds this index."""
+        stat = os.stat(self.filename)
+        sizes = set()
+        checkpoints, minima = [], []
+        latest = earliest = None
+
+        with open(self.filename, "rb") as file:
+            stream = pcap.PCapStream(file, "rb")
+            self.data_offset = offset = file.tell()
+
+            for count, (header, data) in enumerate(stream):
+                if count and count % self.Interval == 0:
+                    checkpoints.append([offset, latest])
+                    minima.append(None)
+
+                ts = header.ts
+                latest = ts if latest is None else max(latest, ts)
+                earliest = ts if earliest is None else min(earliest, ts)
+                if minima:
+                    minima[-1] = ts if minima[-1] is None else min(minima[-1], ts)
+
+                sizes.add(len(data))
+                offset = file.tell()
+
+        # The earliest time of any packet from each checkpoint on.
+        for index in reversed(range(len(minima) - 1)):
+            minima[index] = min(minima[index], minima[index + 1])
+
+        self.size, self.mtime = stat.st_size, stat.st_mtime
+        self.first, self.last = earliest, latest
+        self.sizes = sorted(sizes)
+        self.checkpoints = [
+            (offset, latest, earliest)
+            for (offset, latest), earliest in zip(checkpoints, minima)
+        ]
+
+    def overlaps(self, start, stop):
+        """True if the file may hold packets after start and before stop
+        (POSIX times).
+        """
+        return self.first is not None and self.last > start and self.first < stop
+
+    def span(self, start, stop):
+        """Returns the (start, stop) byte offsets of the part of the file
+        that may hold packets after start and before stop (POSIX times).
+        """
+        latest = [checkpoint[1] for checkpoint in self.checkpoints]
+        earliest = [checkpoint[2] for checkpoint in self.checkpoints]
+
+        lo = bisect.bisect_right(latest, start)
+        hi = bisect.bisect_left(earliest, stop)
+
+        begin = self.checkpoints[lo - 1][0] if lo > 0 else self.data_offset
+        end = self.checkpoints[hi][0] if hi < len(self.checkpoints) else self.size
+        return begin, end
+
+
+pcap_indexes: Dict[str, PcapIndex] = {}
+
+
+def get_pcap_index(filename):
+    """
+    Returns an up to date (cached) PcapIndex of the given pcap file,
+    loading or (re)building its sidecar index as needed.
+    """
+    stat = os.stat(filename)
+    index = pcap_indexes.get(filename)
+
+    if index is None or not index.current(stat):
+        index = PcapIndex(filename)
+        if not index.load() or not index.current(stat):
+            index.build()
+            index.save()
+        pcap_indexes[filename] = index
+
+    return index
+
+
+def _send_pcap_index(filename, writer):
+    """Sends the state() of the PcapIndex of the given pcap file over
+    writer.  Runs in a child process.
+    """
+    with writer:
+        try:
+            writer.put(get_pcap_index(filename).state())
+        except Exception as e:
+            writer.put(e)
+
+
+def _load_pcap_index(filename):
+    reader, writer = gipc.pipe(duplex=False)
+    with reader:
+        process = gipc.start_process(_send_pcap_index, args=(filename, writer))
+        try:
+            state = reader.get()
+        except EOFError:
+            state = EOFError("index process exited")
+    process.join()
+
+    if isinstance(state, Exception):
+        raise state
+
+    index = PcapIndex(filename)
+    index.restore(state)
+    pcap_indexes[filename] = index
+    return index
+
+
+def get_pcap_indexes(filenames, processes=0):
+    """
+    Returns up to date PcapIndexes of the given pcap files, as
+    get_pcap_index() does.  Indexes that must be loaded or (re)built are
+    loaded in up to processes child processes at a time (or in-process if
+    processes is 0), so reading pcap files does not block other greenlets.
+    """
+    stale = []
+    for filename in filenames:
+        index = pcap_indexes.get(filename)
+        if index is None or not index.current(os.stat(filename)):
+            stale.append(filename)
+
+    if processes <= 0:
+        for filename in stale:
+            get_pcap_index(filename)
+    elif stale:
+        gevent.pool.Pool(processes).map(_load_pcap_index, stale)
+
+    return [pcap_indexes[filename] for filename in filenames]
+
+
+def posix_time(value):
+    """Returns the POSIX time of the given (naive, UTC) datetime."""
+    return calendar.timegm(value.timetuple()) + value.microsecond / 1e6
+
+
+def row_time(row):
+    """Returns the POSIX time of the time (first) column of a query row."""
+    value = row[0]
+    return posix_time(value) if isinstance(value, datetime) else float(value)
+
+
+def spool_rows(rows, file, batch_rows=1000):
+    """Writes rows to the binary file in pickled batches (see
+    read_spool()).
+    """
+    while True:
+        batch = list(itertools.islice(rows, batch_rows))
+        if not batch:
+            return
+        pickle.dump(batch, file, pickle.HIGHEST_PROTOCOL)
+
+
+def read_spool(file):
+    """Yields the rows spooled to the binary file by spool_rows(), from its
+    start.  The greenlet yields to others between batches.
+    """
+    file.seek(0)
+    while True:
+        try:
+            batch = pickle.load(file)
+        except EOFError:
+            return
+        yield from batch
+        gevent.sleep(0)
+
+
+class TelemetryQuery(object):
+    """TelemetryQuery
+    A TelemetryQuery selects the values of fields of one packet type,
+    received (or timestamped by time_field) after start and before stop,
+    from pcap files.  Files are read with ait.core.pcap and packets are
+    filtered as they are read, so rows are produced as soon as they are
+    found.  Rows match those of the ``ait-tlm-csv`` command, and may also
+    be written as typed columns (see Formats and kinds).
+
+    Up to processes files are scanned (and indexed) at once, each in a
+    child process (see QueryShard), so queries use several cores and do
+    not block the GUI server's greenlets while decoding.  If processes is
+    0, files are scanned in-process.
+
+    Rows are merged into time order.  Packet times need not follow file
+    order, so when filtering by time_field each file's rows are sorted and
+    spooled to a temporary file before being merged.
+    """
+
+    processes = os.cpu_count() or 1
+
+    # Output formats: {name: (file extension, MIME type)}
+    Formats = {
+        "csv": (".csv", "text/csv"),
+        "npz": (".npz", "application/octet-stream"),
+        "arrow": (".arrow", "application/vnd.apache.arrow.file"),
+        "parquet": (".parquet", "application/vnd.apache.parquet"),
+    }
+
+    def __init__(self, pkt_defn, fields, time_field=None, start=None, stop=None):
+        """Creates a new TelemetryQuery of the given field names (prefixed
+        with ``raw.`` for raw values) of the given PacketDefinition, or
+        raises a ValueError if a field is not defined.
+        """
+        self.defn = pkt_defn
+        self.fields = list(fields)
+        self.time_field = time_field or None
+        self.start = start if start is not None else dmc.GPS_Epoch
+        self.stop = stop if stop is not None else datetime.utcnow()
+        self.count = 0
+
+        for name in self.fields + [self.time_field]:
+            if name is not None and self._field(name)[0] not in pkt_defn.fieldmap:
+                raise ValueError('No telemetry point named "{}"'.format(name))
+
+    @staticmethod
+    def _field(name):
+        """Returns the (field name, raw) of a query field name."""
+        names = name.split(".")
+        if len(names) == 2 and names[0] == "raw":
+            return names[1], True
+        return name, False
+
+    @property
+    def header(self):
+        """The column names of rows."""
+        return [self.time_field or "Ground Receipt Time"] + self.fields
+
+    @property
+    def kinds(self):
+        """The kinds of the values of each column of rows: "time", "float",
+        "int", "uint" or "str".
+        """
+        time_kind = "time" if self.time_field is None else self._kind(self.time_field)
+        return [time_kind] + [self._kind(name) for name in self.fields]
+
+    def _kind(self, name):
+        field, raw = self._field(name)
+        defn = self.defn.fieldmap[field]
+        type = defn.type
+
+        if not isinstance(type, dtype.PrimitiveType):
+            return "str"
+
+        if not raw:
+            if defn.enum:
+                return "str"
+            if defn.dntoeu is not None or defn.expr is not None:
+                return "float"
+            if isinstance(type, dtype.Time8Type):
+                return "float"
+            if type.name.startswith("TIME"):
+                return "time"
+            if isinstance(type, (dtype.CmdType, dtype.EVRType)):
+                return "str"
+        elif isinstance(type, (dtype.Time40Type, dtype.Time64Type)):
+            return "float"
+
+        if type.string:
+            return "str"
+        if type.float:
+            return "float"
+        return "int" if type.signed or type.nbits < 64 else "uint"
+
+    def _value(self, packet, name):
+        field, raw = self._field(name)
+
+        try:
+            value = packet._getattr(field, raw=raw)
+        except KeyError:
+            return None
+        except ValueError:
+            # Enumeration not found, so use the raw value.
+            return packet._getattr(field, raw=True)
+
+        return value.name if hasattr(value, "name") else value
+
+    def rows(self, filename, index=None):
+        """Yields the rows of the matching packets of the given pcap file,
+        in file order.  When filtering by ground receipt time, the file's
+        PcapIndex (index, if given) is used to skip the file, or the parts
+        of it, that cannot hold matching packets.
+        """
+        nbytes = self.defn.nbytes
+        begin, end = None, None
+
+        if self.time_field is None:
+            index = index or get_pcap_index(filename)
+            start, stop = posix_time(self.start), posix_time(self.stop)
+
+            if not index.overlaps(start, stop) or max(index.sizes) < nbytes:
+                return
+            begin, end = index.span(start, stop)
+
+        with open(filename, "rb") as file:
+            stream = pcap.PCapStream(file, "rb")
+            if begin is not None:
+                file.seek(begin)
+
+            for header, data in stream:
+                if end is not None and file.tell() > end:
+                    break
+
+                # Packets too short to be this packet are skipped.
+                if len(data) < nbytes:
+                    continue
+
+                packet = tlm.Packet(self.defn, data)
+                if self.time_field is None:
+                    timestamp = header.timestamp
+                else:
+                    timestamp = getattr(packet, self.time_field)
+
+                if self.start < timestamp < self.stop:
+                    if self.time_field is None:
+                        yield [timestamp] + [
+                            self._value(packet, f) for f in self.fields
+                        ]
+                    else:
+                        yield [self._value(packet, f) for f in self.header]
+
+    def sorted_rows(self, filename, index=None):
+        """Returns the rows of the matching packets of the given pcap file,
+        sorted by time.
+        """
+        return sorted(self.rows(filename, index), key=row_time)
+
+    def scan(self, filenames):
+        """Yields the rows of the matching packets of the given pcap files,
+        merged into time order.  count is the number of rows yielded so
+        far.
+        """
+        self.count = 0
+        for row in self._scan(filenames):
+            self.count += 1
+            yield row
+
+    def _scan(self, filenames):
+        if self.time_field is not None:
+            yield from self._scan_sorted(filenames)
+            return
+
+        if self.processes <= 0:
+            rows = [self.rows(filename) for filename in filenames]
+            yield from heapq.merge(*rows, key=row_time)
+            return
+
+        start, stop = posix_time(self.start), posix_time(self.stop)
+        shards = []
+        for index in get_pcap_indexes(filenames, self.processes):
+            if index.overlaps(start, stop):
+                shards.append(QueryShard(self, index.filename, index))
+        shards.sort(key=lambda shard: shard.first)
+
+        pending = collections.deque(shards)
+        started = collections.deque()
+
+        def start(force=False):
+            # Keep up to processes shards running, ahead of the merge.
+            running = sum(1 for shard in shards if shard.running)
+            while pending and (running < self.processes or force):
+                force = False
+                shard = pending.popleft()
+                shard.start()
+                started.append(shard)
+                running += 1
+
+        try:
+            # Merge shards' rows by time.  A shard joins the merge once no
+            # row before its first packet time remains, and is started even
+            # if processes are already running if it may hold the next row.
+            heap = []
+            order = itertools.count()
+
+            def push(shard, rows):
+                row = next(rows, None)
+                if row is None:
+                    shard.stop()
+                    start()
+                else:
+                    key = row_time(row)
+                    heapq.heappush(heap, (key, next(order), row, shard, rows))
+
+            start()
+            while pending or started or heap:
+                waiting = pending[0].first if pending and not started else None
+                if waiting is not None and (not heap or waiting <= heap[0][0]):
+                    start(force=True)
+
+                while started and (not heap or started[0].first <= heap[0][0]):
+                    shard = started.popleft()
+                    push(shard, shard.rows())
+
+                if heap:
+                    _, _, row, shard, rows = heapq.heappop(heap)
+                    yield row
+                    push(shard, rows)
+        finally:
+            for shard in shards:
+                shard.stop()
+
+    def _scan_sorted(self, filenames):
+        # Sort each file's rows into a spool, then merge the spools.
+        spools = [tempfile.NamedTemporaryFile() for _ in filenames]
+
+        try:
+            if self.processes <= 0:
+                for filename, spool in zip(filenames, spools):
+                    spool_rows(iter(self.sorted_rows(filename)), spool)
+            else:
+                shards = [
+                    QueryShard(self, filename, spool=spool)
+                    for filename, spool in zip(filenames, spools)
+                ]
+                gevent.pool.Pool(self.processes).map(QueryShard.wait, shards)
+
+            rows = [read_spool(spool) for spool in spools]
+            yield from heapq.merge(*rows, key=row_time)
+        finally:
+            for spool in spools:
+                spool.close()
+
+    def csv(self, filenames, chunk_rows=1000):
+        """Yields the header and rows of the matching packets of the given
+        pcap files as CSV text, chunk_rows rows at a time.  The greenlet
+        yields to others between chunks.
+        """
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(self.header)
+
+        for count, row in enumerate(self.scan(filenames), 1):
+            writer.writerow(row)
+
+            if count % chunk_rows == 0:
+                yield output.getvalue()
+                output.seek(0)
+                output.truncate()
+                gevent.sleep(0)
+
+        yield output.getvalue()
+
+    def groups(self, filenames, group_rows=65536):
+        """Yields the rows of the matching packets of the given pcap files
+        as row groups: lists of columns of up to group_rows values, with
+        the values of "str" columns (see kinds) as strings.  The greenlet
+        yields to others between groups.
+        """
+        strings = [kind == "str" for kind in self.kinds]
+        rows = self.scan(filenames)
 
+        while True:
+            group = list(itertools.islice(rows, group_rows))
+            if not group:
+                return
 
-def get_packet_delta(pkt_defn, packet):
-    """
-    Keeps track of last packets recieved of all types recieved
-    and returns only fields that have changed since last packet.
+            columns = [list(column) for column in zip(*group)]
+            for column, string in zip(columns, strings):
+                if string:
+                    column[:] = [None if v is None else str(v) for v in column]
 
-    Params:
-        pkt_defn:  Packet definition
-        packet:    Binary packet data
-    Returns:
-        delta:     JSON of packet fields that have changed
-    """
-    ait_pkt = ait.core.tlm.Packet(pkt_defn, data=packet)
+            yield columns
+            gevent.sleep(0)
 
-    # first packet of this type
-    if pkt_defn.name not in packet_states:
-        packet_states[pkt_defn.name] = {}
+    def npz(self, filenames, file, group_rows=65536):
+        """Writes the matching rows of the given pcap files to the binary
+        file as a NumPy ``.npz`` archive of one array per column, named by
+        header.  Row groups are spooled to temporary files, so memory use
+        is bounded by group_rows.  The archive is uncompressed so arrays
+        may be memory-mapped from it.  Requires NumPy.
+        """
+        kinds = self.kinds
+        dtypes = [column_to_array([], kind).dtype for kind in kinds]
+        spools = [tempfile.TemporaryFile() for _ in kinds]
+        count = 0
 
-        # get raw fields
-        raw_fields = {f.name: getattr(ait_pkt.raw, f.name) for f in pkt_defn.fields}
-        packet_states[pkt_defn.name]["raw"] = raw_fields
-        delta = raw_fields
+        try:
+            for group in self.groups(filenames, group_rows):
+                for n, column in enumerate(group):
+                    array = column_to_array(column, kinds[n])
+                    dtypes[n] = numpy.result_type(dtypes[n], array.dtype)
+                    numpy.save(spools[n], array, allow_pickle=False)
+                count += len(group[0])
+
+            with zipfile.ZipFile(file, "w", zipfile.ZIP_STORED) as archive:
+                for name, spool, kind in zip(self.header, spools, dtypes):
+                    header = {
+                        "descr": numpy.lib.format.dtype_to_descr(kind),
+                        "fortran_order": False,
+                        "shape": (count,),
+                    }
+                    size = spool.tell()
+                    spool.seek(0)
+
+                    with archive.open(name + ".npy", "w", force_zip64=True) as member:
+                        numpy.lib.format.write_array_header_1_0(member, header)
+                        while spool.tell() < size:
+                            array = numpy.load(spool, allow_pickle=False)
+                            member.write(array.astype(kind).tobytes())
+        finally:
+            for spool in spools:
+                spool.close()
+
+    def arrow(self, filenames, file, parquet=False, group_rows=65536):
+        """Writes the matching rows of the given pcap files to the binary
+        file as an Apache Arrow IPC file, or a Parquet file if parquet is
+        True, of one record batch (row group) per group_rows rows.  Missing
+        values are nulls.  Requires pyarrow.
+        """
+        types = {
+            "time": pyarrow.timestamp("us"),
+            "float": pyarrow.float64(),
+            "int": pyarrow.int64(),
+            "uint": pyarrow.uint64(),
+            "str": pyarrow.string(),
+        }
+        schema = pyarrow.schema(
+            [(name, types[kind]) for name, kind in zip(self.header, self.kinds)]
+        )
 
-        # get converted fields / complex fields
-        packet_states[pkt_defn.name]["dntoeu"] = {}
-        dntoeus = {}
-        for f in pkt_defn.fields:
-            if (
-                f.dntoeu is not None
-                or f.enum is not None  # noqa: W503
-                or f.type.name in dtype.ComplexTypeMap.keys()  # noqa: W503
-            ):
-                try:
-                    val = getattr(ait_pkt, f.name)
-                except ValueError:
-                    if isinstance(f.type, dtype.CmdType):
-                        val = "Unidentified Cmd"
-                    else:
-                        val = getattr(ait_pkt.raw, f.name)
+        if parquet:
+            writer = pyarrow.parquet.ParquetWriter(file, schema)
+        else:
+            writer = pyarrow.ipc.new_file(file, schema)
 
-                if isinstance(val, cmd.CmdDefn) or isinstance(val, evr.EVRDefn):
-                    val = val.name
+        with writer:
+            for group in self.groups(filenames, group_rows):
+                arrays = [
+                    pyarrow.array(column, type=field.type)
+                    for column, field in zip(group, schema)
+                ]
+                writer.write_table(pyarrow.Table.from_arrays(arrays, schema=schema))
+
+    @staticmethod
+    def supports(format):
+        """True if the given output format (see Formats) is available."""
+        if format == "npz":
+            return numpy is not None
+        if format in ("arrow", "parquet"):
+            return pyarrow is not None
+        return format in TelemetryQuery.Formats
+
+    def write(self, filenames, file, format="csv"):
+        """Writes the matching rows of the given pcap files to the binary
+        file in the given format (see Formats).
+        """
+        if format == "csv":
+            for chunk in self.csv(filenames):
+                file.write(chunk.encode("utf-8"))
+        elif format == "npz":
+            self.npz(filenames, file)
+        else:
+            self.arrow(filenames, file, parquet=(format == "parquet"))
 
-                dntoeus[f.name] = val
-                packet_states[pkt_defn.name]["dntoeu"][f.name] = val
 
-        # get derivations
-        packet_states[pkt_defn.name]["raw"].update(
-            {f.name: getattr(ait_pkt.raw, f.name) for f in pkt_defn.derivations}
-        )
-        delta.update(
-            {f.name: getattr(ait_pkt.raw, f.name) for f in pkt_defn.derivations}
+def column_to_array(values, kind):
+    """Returns a NumPy array of the given TelemetryQuery column of values of
+    the given kind (see TelemetryQuery.kinds).  Missing values (None) are
+    NaT, NaN (making integer columns floating point) or empty strings.
+    """
+    if kind == "time":
+        return numpy.array(values, dtype="datetime64[us]")
+    if kind == "str":
+        return numpy.array(["" if v is None else v for v in values], dtype=str)
+    if kind == "float" or None in values:
+        return numpy.array(
+            [numpy.nan if v is None else v for v in values], dtype=numpy.float64
         )
+    return numpy.array(values, dtype=numpy.int64 if kind == "int" else numpy.uint64)
 
-    # previous packets of this type received
-    else:
-        delta, dntoeus = {}, {}
-
-        for field in pkt_defn.fields:
-            new_raw = getattr(ait_pkt.raw, field.name)
-            last_raw = packet_states[pkt_defn.name]["raw"][field.name]
-
-            # A field update needs sent when the raw value has changed or if a
-            # DN to EU is defined on the field. DN to EUs can take multiple
-            # telemetry points as input or may rely on other means to determine
-            # a value. We can't be sure that they won't change so we should
-            # always calculate them.
-            if new_raw != last_raw or field.dntoeu is not None:
-                delta[field.name] = new_raw
-                packet_states[pkt_defn.name]["raw"][field.name] = new_raw
 
-                if (
-                    field.dntoeu is not None
-                    or field.enum is not None  # noqa: W503
-                    or field.type.name in dtype.ComplexTypeMap.keys()  # noqa: W503
-                ):
-                    try:
-                        dntoeu_val = getattr(ait_pkt, field.name)
-                    except ValueError:
-                        if isinstance(field.type, dtype.CmdType):
-                            dntoeu_val = "Unidentified Cmd"
-                        else:
-                            dntoeu_val = getattr(ait_pkt.raw, field.name)
+def _query_shard(query, filename, writer, index=None, spool=None):
+    """Sends the rows of a TelemetryQuery of the given pcap file over
+    writer, in batches, followed by None.  If a spool file name is given,
+    the rows are sorted by time and written to it instead.  Runs in a
+    child process.
+    """
+    with writer:
+        try:
+            if spool is not None:
+                with open(spool, "wb") as file:
+                    spool_rows(iter(query.sorted_rows(filename)), file)
+            else:
+                rows = query.rows(filename, index)
+                for batch in iter(lambda: list(itertools.islice(rows, 1000)), []):
+                    writer.put(batch)
+        except Exception as e:
+            writer.put(e)
+        writer.put(None)
+
+
+class QueryShard(object):
+    """QueryShard
+    A QueryShard runs a TelemetryQuery over a single pcap file in a child
+    process, and buffers (up to maxsize batches of) the rows it sends back
+    until they are read with rows().  Alternatively, the child sorts the
+    rows into a spool file, read by rows() once the shard is done (see
+    wait()).
+    """
 
-                    if isinstance(dntoeu_val, cmd.CmdDefn) or isinstance(
-                        dntoeu_val, evr.EVRDefn
-                    ):
-                        dntoeu_val = dntoeu_val.name
+    def __init__(self, query, filename, index=None, spool=None, maxsize=16):
+        """Creates a new QueryShard of the given pcap file, with its
+        PcapIndex, if known, and binary spool file, if sorting.
+        """
+        self.query = query
+        self.filename = filename
+        self.index = index
+        self.first = index.first if index is not None else None
+        self.spool = spool
+        self._batches = gevent.queue.Queue(maxsize)
+        self._process = None
+        self._reader = None
 
-                    dntoeus[field.name] = dntoeu_val
-                    packet_states[pkt_defn.name]["dntoeu"][field.name] = dntoeu_val
+    @property
+    def running(self):
+        """True if the shard has started and not stopped."""
+        return self._process is not None
+
+    def start(self):
+        """Starts the child process scanning the file."""
+        reader, writer = gipc.pipe(duplex=False)
+        spool = self.spool.name if self.spool is not None else None
+        self._process = gipc.start_process(
+            _query_shard,
+            args=(self.query, self.filename, writer, self.index, spool),
+        )
+        self._reader = gevent.spawn(self._read, reader)
 
-        for field in pkt_defn.derivations:
-            new_value = getattr(ait_pkt.raw, field.name)
-            last_value = packet_states[pkt_defn.name]["raw"][field.name]
+    def wait(self):
+        """Starts the shard and waits for the child process to finish."""
+        self.start()
+        for _ in self.rows():
+            pass
+        self.stop()
 
-            if new_value != last_value:
-                delta[field.name] = new_value
-                packet_states[pkt_defn.name]["raw"][field.name] = new_value
+    def _read(self, reader):
+        with reader:
+            while True:
+                try:
+                    batch = reader.get()
+                except EOFError:
+                    batch = EOFError("query process exited")
 
-    return delta, dntoeus
+                if isinstance(batch, Exception):
+                    log.error("Query of {} failed: {}".format(self.filename, batch))
+                    batch = None
 
+                self._batches.put(batch)
+                if batch is None:
+                    break
 
-def replace_datetimes(delta):
-    """Replace datetime objects with ISO formatted
-    strings for JSON serialization"""
-    for key, val in delta.items():
-        if type(val) is datetime:
-            delta[key] = val.isoformat()
+    def rows(self):
+        """Yields the rows sent by the child process (or, if spooling, none)."""
+        while True:
+            batch = self._batches.get()
+            if batch is None:
+                return
+            yield from batch
+
+    def stop(self):
+        """Stops the child process, if running."""
+        if self._process is None:
+            return
 
-    return delta
+        self._reader.kill()
+        if self._process.is_alive():
+            self._process.terminate()
+        self._process.join()
+        self._process = None
+
+
+def find_pcaps(data_dir):
+    """Returns the paths of the pcap files under data_dir, sorted by name."""
+    pcaps = []
+    for d, _dirs, files in os.walk(data_dir):
+        for f in files:
+            if f.endswith(".pcap"):
+                pcaps.append(os.path.join(d, f))
+    return sorted(pcaps)
+
+
+class QueryJob(object):
+    """QueryJob
+    A QueryJob is a TelemetryQuery of a set of pcap files run in the
+    background by QueryJobs, writing its rows to a file in the given format
+    (see TelemetryQuery.Formats).  Its state is
+    queued, running, done, failed or expired (done, but its result since
+    evicted from the cache).
+    """
 
+    def __init__(self, query, filenames, key, format="csv"):
+        """Creates a new, queued QueryJob."""
+        self.id = uuid.uuid4().hex
+        self.query = query
+        self.filenames = filenames
+        self.key = key
+        self.format = format
+        self.state = "queued"
+        self.path = None
+        self.error = None
 
-@App.route("/tlm/realtime")
-def handle_tlm_realtime():
-    """Return telemetry packets in realtime to client"""
-    with Sessions.current() as session:
-        # A null-byte pad ensures wsock is treated as binary.
-        pad = bytearray(1)
-        wsock = bottle.request.environ.get("wsgi.websocket")
+    @property
+    def rows(self):
+        """The number of rows found so far."""
+        return self.query.count
+
+    def json(self):
+        """Returns a JSON-serializable dictionary of the job's status."""
+        return {
+            "id": self.id,
+            "state": self.state,
+            "packet": self.query.defn.name,
+            "format": self.format,
+            "files": len(self.filenames),
+            "rows": self.rows,
+            "error": self.error,
+        }
+
+
+class QueryJobs(object):
+    """QueryJobs
+    QueryJobs runs up to concurrency QueryJobs at a time, in submission
+    order, and keeps the results of the last cache_size finished jobs.
+
+    Jobs are keyed by their query parameters and the size and modification
+    time of the pcap files they read, so submitting a query identical to a
+    queued, running or cached job returns that job instead.  Progress is
+    published as ``tlm:query`` events (see SessionStore.add_event), at most
+    once per progress_interval seconds while running.
+    """
 
-        if not wsock:
-            bottle.abort(400, "Expected WebSocket request.")
+    def __init__(self, concurrency=2, cache_size=16, history=100):
+        """Creates a new QueryJobs with no jobs."""
+        self.concurrency = concurrency
+        self.cache_size = cache_size
+        self.history = history
+        self.progress_interval = 1.0
+        self.hits = 0
+        self.misses = 0
+        self._jobs = collections.OrderedDict()
+        self._results = collections.OrderedDict()
+        self._queue = collections.deque()
+        self._running = 0
+        self._dir = None
+
+    def __getitem__(self, id):
+        return self._jobs[id]
+
+    @staticmethod
+    def key(params, filenames):
+        """Returns the cache key of a query with the given (hashable)
+        parameters of the given pcap files.
+        """
+        fingerprints = []
+        for filename in filenames:
+            stat = os.stat(filename)
+            fingerprints.append((filename, stat.st_size, stat.st_mtime_ns))
+        return (params, tuple(fingerprints))
+
+    def submit(self, query, filenames, key, format="csv"):
+        """Queues a QueryJob of query over the given pcap files, written in
+        the given format, or returns the unexpired job with the same key.
+        """
+        job = self._results.get(key)
+        if job is not None:
+            self.hits += 1
+            self._results.move_to_end(key)
+            return job
+
+        self.misses += 1
+        job = QueryJob(query, filenames, key, format)
+        self._jobs[job.id] = job
+        self._results[key] = job
+        self._queue.append(job)
+        self._trim()
+        self._publish(job)
+        self._dispatch()
+        return job
+
+    def _dispatch(self):
+        while self._queue and self._running < self.concurrency:
+            self._running += 1
+            gevent.spawn(self._run, self._queue.popleft())
+
+    def _run(self, job):
+        if self._dir is None:
+            self._dir = tempfile.mkdtemp(prefix="ait-gui-query-")
+
+        extension, _ = TelemetryQuery.Formats[job.format]
+        fd, job.path = tempfile.mkstemp(suffix=extension, dir=self._dir)
+        job.state = "running"
+        self._publish(job)
+        progress = gevent.spawn(self._progress, job)
 
         try:
-            while not wsock.closed:
-                try:
-                    name, delta, dntoeus, counter = session.deltas.popleft(timeout=30)
-
-                    wsock.send(
-                        json.dumps(
-                            {
-                                "packet": name,
-                                "data": delta,
-                                "dntoeus": dntoeus,
-                                "counter": counter,
-                            }
-                        )
-                    )
+            with open(fd, "wb") as output:
+                job.query.write(job.filenames, output, job.format)
+            job.state = "done"
+        except Exception as e:
+            log.error("Telemetry query {} failed: {}".format(job.id, e))
+            job.state = "failed"
+            job.error = str(e)
+            self._results.pop(job.key, None)
+            self._remove(job)
+        finally:
+            progress.kill()
+            self._running -= 1
+
+        self._evict()
+        self._publish(job)
+        self._dispatch()
+
+    def _evict(self):
+        # Expire the least recently used results beyond cache_size.
+        done = [job for job in self._results.values() if job.state == "done"]
+        for job in done[: max(len(done) - self.cache_size, 0)]:
+            del self._results[job.key]
+            job.state = "expired"
+            self._remove(job)
+        self._trim()
+
+    def _trim(self):
+        # Forget the oldest failed or expired jobs beyond history.
+        for job in list(self._jobs.values()):
+            if len(self._jobs) <= self.history:
+                break
+            if job.state in ("failed", "expired"):
+                del self._jobs[job.id]
 
-                except IndexError:
-                    # If no telemetry has been received by the GUI
-                    # server after timeout seconds, "probe" the client
-                    # websocket connection to make sure it's still
-                    # active and if so, keep it alive.  This is
-                    # accomplished by sending a packet with an ID of
-                    # zero and no packet data.  Packet ID zero with no
-                    # data is ignored by AIT GUI client-side
-                    # Javascript code.
+    def _remove(self, job):
+        if job.path is not None:
+            try:
+                os.remove(job.path)
+            except OSError:
+                pass
+            job.path = None
 
-                    if not wsock.closed:
-                        wsock.send(pad + struct.pack(">I", 0))
-        except geventwebsocket.WebSocketError:
-            pass
+    def _progress(self, job):
+        while True:
+            gevent.sleep(self.progress_interval)
+            self._publish(job)
 
+    def _publish(self, job):
+        Sessions.add_event("tlm:query", job.json())
 
-@App.route("/tlm/latest", method="GET")
-def handle_tlm_latest():
-    """Return latest telemetry packet to client"""
-    for pkt_type, state in packet_states.items():
-        packet_states[pkt_type]["dntoeu"] = replace_datetimes(state["dntoeu"])
+    def stats(self):
+        """Returns a dictionary of QueryJobs statistics."""
+        states = collections.Counter(job.state for job in self._jobs.values())
+        return {
+            "queued": states["queued"],
+            "running": states["running"],
+            "results": states["done"],
+            "hits": self.hits,
+            "misses": self.misses,
+        }
 
-    with Sessions.current() as session:
-        counters = session.tlm_counters
-        return json.dumps({"states": packet_states, "counters": counters})
 
+query_jobs = QueryJobs()
 
-@App.route("/tlm/query", method="POST")
-def handle_tlm_query_post():
-    """"""
-    _fields_file_path = None
 
+def __parse_tlm_query():
+    """Returns the TelemetryQuery, pcap files, output format and cache key
+    of the query in the current request's form, or aborts with an HTTP 400
+    error.
+    """
     data_dir = bottle.request.forms.get("dataDir")
     time_field = bottle.request.forms.get("timeField")
     packet = bottle.request.forms.get("packet")
     fields_raw = bottle.request.forms.get("fields")
     start_time = bottle.request.forms.get("startTime")
     end_time = bottle.request.forms.get("endTime")
+    format = bottle.request.forms.get("format") or "csv"
 
-    if not (time_field and packet and fields_raw and start_time):
+    if not (packet and fields_raw and start_time):
         bottle.abort(400, "Malformed parameters")
 
+    if not TelemetryQuery.supports(format):
+        bottle.abort(
+            400,
+            "Unsupported format {}: must be one of {} (npz requires NumPy; "
+            "arrow and parquet require pyarrow).".format(
+                format, ", ".join(TelemetryQuery.Formats)
+            ),
+        )
+
     try:
-        with tempfile.NamedTemporaryFile(
-            mode="w",
-            prefix="ait-gui-fields-",
-            suffix=".txt",
-            delete=False,
-        ) as fields_file:
-            _fields_file_path = fields_file.name
-            for f in fields_raw.split(","):
-                fields_file.write(f + "\n")
-
-        pcaps = []
-        for d, _dirs, files in os.walk(data_dir):
-            for f in files:
-                if f.endswith(".pcap"):
-                    pcaps.append(os.path.join(d, f))
-
-        if len(pcaps) == 0:
-            msg = "Unable to locate PCAP files for query given data directory {}".format(  # noqa: B950
-                data_dir
-            )
-            log.error(msg)
-            bottle.abort(400, msg)
+        start = datetime.strptime(start_time, dmc.ISO_8601_Format)
+        stop = datetime.strptime(end_time, dmc.ISO_8601_Format) if end_time else None
+        query = TelemetryQuery(
+            tlm.getDefaultDict()[packet],
+            fields_raw.split(","),
+            time_field,
+            start,
+            stop,
+        )
+    except KeyError:
+        bottle.abort(
+            400, 'Packet "{}" not defined in telemetry dictionary.'.format(packet)
+        )
+    except ValueError as e:
+        bottle.abort(400, str(e))
 
-        tlm_query_proc = gevent.subprocess.call(  # noqa: F841
-            [
-                "ait-tlm-csv",
-                "--time_field",
-                time_field,
-                "--fields",
-                _fields_file_path,
-                "--stime",
-                start_time,
-                "--etime",
-                end_time,
-                "--packet",
-                packet,
-                "--csv",
-                os.path.join(HTMLRoot.static_dir, "query_out.csv"),
-            ]
-            + ["{}".format(p) for p in pcaps]  # noqa: W503
+    pcaps = find_pcaps(data_dir) if data_dir else []
+    if len(pcaps) == 0:
+        msg = "Unable to locate PCAP files for query given data directory {}".format(
+            data_dir
         )
-    finally:
-        if _fields_file_path and os.path.exists(_fields_file_path):
-            os.remove(_fields_file_path)
+        log.error(msg)
+        bottle.abort(400, msg)
+
+    params = (data_dir, packet, fields_raw, time_field, start_time, end_time, format)
+    return query, pcaps, format, QueryJobs.key(params, pcaps)
+
+
+@App.route("/tlm/query", method="POST")
+def handle_tlm_query_post():
+    """Query telemetry from the pcap files of a data directory as CSV
+
+    CSV rows are streamed (chunked) as packets are read; each request gets
+    its own output.  Columnar formats are written to a temporary file in
+    row groups, then sent.  See **/tlm/query/jobs** to run queries in the
+    background.
+
+    :formparam dataDir: The directory to search for ``.pcap`` files
+    :formparam packet: The packet name
+    :formparam fields: Comma separated field names (``raw.`` for raw values)
+    :formparam timeField: A field to filter times by (default: ground
+        receipt time)
+    :formparam startTime: Start time, e.g. 2019-07-15T18:10:00Z
+    :formparam endTime: End time (default: now)
+    :formparam format: Output format: csv (default), npz (NumPy arrays),
+        arrow (Arrow IPC file) or parquet.  Columnar formats have a typed
+        column per field and a datetime64 time column.
+    """
+    query, pcaps, format, _ = __parse_tlm_query()
+    extension, mimetype = TelemetryQuery.Formats[format]
+
+    bottle.response.content_type = mimetype
+    bottle.response.set_header(
+        "Content-Disposition",
+        'attachment; filename="query_output{}"'.format(extension),
+    )
+
+    if format == "csv":
+        return query.csv(pcaps)
+
+    output = tempfile.TemporaryFile()
+    query.write(pcaps, output, format)
+    output.seek(0)
+    return output
+
+
+@App.route("/tlm/query/jobs", method="POST")
+def handle_tlm_query_jobs_post():
+    """Submit a telemetry query to run in the background
+
+    Takes the same parameters as **/tlm/query**.  Progress is pushed to
+    **/events** as ``tlm:query`` events with the job's status.  If an
+    identical query of unchanged files is queued, running or was recently
+    run, that job is returned instead.
+
+    **Example Response**:
+    .. sourcecode: json
+       {
+           "id": "9f1c0e6c2d8a4b71a3e5f0d2c4b6a8e1",
+           "state": "queued",
+           "packet": "1553_HS_Packet",
+           "format": "csv",
+           "files": 3,
+           "rows": 0,
+           "error": null
+       }
+    """
+    query, pcaps, format, key = __parse_tlm_query()
+    job = query_jobs.submit(query, pcaps, key, format)
+
+    bottle.response.status = 202 if job.state != "done" else 200
+    __set_response_to_json()
+    return json.dumps(job.json())
+
+
+def __get_query_job(id):
+    try:
+        return query_jobs[id]
+    except KeyError:
+        bottle.abort(404, 'No telemetry query job "{}"'.format(id))
+
+
+@App.route("/tlm/query/jobs/<id>", method="GET")
+def handle_tlm_query_job_get(id):
+    """Return the status of a telemetry query job (see
+    **/tlm/query/jobs**)
+    """
+    job = __get_query_job(id)
+    __set_response_to_json()
+    return json.dumps(job.json())
+
 
+@App.route("/tlm/query/jobs/<id>/result", method="GET")
+def handle_tlm_query_job_result_get(id):
+    """Return the output of a finished telemetry query job
+
+    Responds 409 Conflict if the job has not finished, 500 if it failed and
+    410 Gone if its result has been evicted from the cache.
+    """
+    job = __get_query_job(id)
+
+    if job.state == "failed":
+        bottle.abort(500, job.error)
+    if job.state == "expired":
+        bottle.abort(410, "Result of job {} expired".format(id))
+    if job.state != "done":
+        bottle.abort(409, "Job {} is {}".format(id, job.state))
+
+    extension, mimetype = TelemetryQuery.Formats[job.format]
     return bottle.static_file(
-        "query_out.csv", root=HTMLRoot.static_dir, mimetype="application/octet-stream"
+        os.path.basename(job.path),
+        root=os.path.dirname(job.path),
+        mimetype=mimetype,
+        download="query_output" + extension,
     )
 
 
@@ -1036,6 +4619,69 @@ def handle_data_get():
     return json.dumps(ait.config._datapaths)
 
 
+@App.route("/stats", method="GET")
+def handle_stats_get():
+    """Return GUI server statistics
+    **Example Response**:
+    .. sourcecode: json
+       {
+           "sessions": {
+               "count": 2,
+               "active": 1,
+               "queued": 42,
+               "reaped": 10,
+               "evicted": 0,
+               "unknown": 3,
+               "sessions": [
+                   {
+                       "id": "140245433470256",
+                       "active": true,
+                       "queued": 42,
+                       "coalesced": 1250,
+                       "dropped": 0,
+                       "rate": null,
+                       "rates": {}
+                   }
+               ]
+           },
+           "packets": {
+               "definitions": 12,
+               "rebuilds": 1,
+               "unknown": {"4095": 3}
+           },
+           "playback": {
+               "entries": 2,
+               "bytes": 1048576,
+               "budget": 67108864,
+               "hits": 3,
+               "misses": 2,
+               "partial": 1
+           },
+           "queries": {
+               "queued": 0,
+               "running": 1,
+               "results": 4,
+               "hits": 2,
+               "misses": 5
+           },
+           "commands": {
+               "queued": 0,
+               "written": 120,
+               "batches": 7
+           }
+       }
+    """
+    __set_response_to_json()
+    stats = {
+        "sessions": Sessions.stats(),
+        "packets": packet_defns.stats(),
+        "playback": playback.cache.stats(),
+        "queries": query_jobs.stats(),
+        "commands": command_writer.stats(),
+    }
+    return json.dumps(stats)
+
+
 @App.route("/leapseconds", method="GET")
 def handle_leapseconds_get():
     """Return UTC-GPS Leapsecond data
@@ -1047,7 +4693,7 @@ def handle_leapseconds_get():
            ["1983-07-01 00:00:00", 3]
        ]
     """
-    return json.dumps(dmc.LeapSeconds.leapseconds, default=str)
+    return Dictionaries["leapseconds"].respond()
 
 
 @App.route("/seq", method="GET")
@@ -1279,7 +4925,8 @@ class AitDB(bdb.Bdb):
 
 @App.route("/limits/dict")
 def handle_limits_get():
-    return json.dumps(limits.getDefaultDict().toJSON())
+    """Return JSON Limits dictionary"""
+    return Dictionaries["limits"].respond()
 
 
 PromptResponse = None
@@ -1331,7 +4978,8 @@ def handle_prompt_response_post():
 @App.route("/playback/range", method="GET")
 def handle_playback_range_get():
     """Return a JSON array of [packet_name, start_time, end_time] to
-    represent the time range of each packet in the database
+    represent the time range of each packet in the database.  Ranges are
+    cached for the plugin's playback_range_ttl seconds (default: 60).
         **Example Response**:
         .. sourcecode: json
             [
@@ -1342,54 +4990,22 @@ def handle_playback_range_get():
             ]
     """
     global playback
-    ranges = []
 
     if not playback.enabled:
         return json.dumps([])
 
-    # Loop through each packet from database
-    packets = list(playback.dbconn.query("SHOW MEASUREMENTS").get_points())
-    for i in range(len(packets)):
-
-        # Add packet name
-        packet_name = packets[i]["name"]
-        ranges.append([packet_name])
-
-        # Add start time and end time
-        point_query = 'SELECT * FROM "{}"'.format(packet_name)
-        points = list(playback.dbconn.query(point_query).get_points())
-
-        # Round start time down to nearest second
-        start_time_str = points[0]["time"].split(".")[0]
-
-        if start_time_str[-1] != "Z":
-            start_time = start_time_str + "Z"
-        else:
-            start_time = start_time_str
-
-        ranges[i].append(start_time)
-
-        # Round end time up to nearest second
-        end_time_str = points[-1]["time"].split(".")[0]
-
-        if end_time_str[-1] == "Z":
-            end_time = datetime.strptime(
-                end_time_str, "%Y-%m-%dT%H:%M:%SZ"
-            ) + timedelta(seconds=1)
-        else:
-            end_time = (
-                datetime.strptime(end_time_str, "%Y-%m-%dT%H:%M:%S")
-                + timedelta(seconds=1)  # noqa: W503
-            )
-
-        ranges[i].append(end_time.strftime("%Y-%m-%dT%H:%M:%SZ"))
-
-    return json.dumps(ranges)
+    return json.dumps(playback.ranges())
 
 
 @App.route("/playback/query", method="POST")
 def handle_playback_query_post():
-    """Set playback query with packet name, start time, and end time from form"""
+    """Set playback query with packet names, start time, and end time from form
+
+    :formparam packet: A packet name; repeat it (or separate names with
+        commas) to play back several packets merged in time order.
+    :formparam startTime: The start time, e.g. 2019-07-15T18:10:00.0Z
+    :formparam endTime: The end time (inclusive)
+    """
     global playback
 
     if not playback.enabled:
@@ -1398,38 +5014,31 @@ def handle_playback_query_post():
     tlm_dict = tlm.getDefaultDict()
 
     # Get values from form
-    packet = bottle.request.forms.get("packet")
+    packets = [
+        name
+        for value in bottle.request.forms.getall("packet")
+        for name in value.split(",")
+        if name
+    ]
     start_time = bottle.request.forms.get("startTime")
     end_time = bottle.request.forms.get("endTime")
-    uid = tlm_dict[packet].uid
 
-    # Query packet and time range from database
-    point_query = "SELECT * FROM \"{}\" WHERE time >= '{}' AND time <= '{}'".format(
-        packet, start_time, end_time
-    )
-    points = list(playback.dbconn.query(point_query).get_points())
-
-    pkt = tlm_dict[packet]
-    fields = pkt.fields
-    # Build field names list from tlm dictionary for sorting data query
-    field_names = []
-    # Build field types list from tlm dictionary for packing data
-    field_formats = []
-    for i in range(len(fields)):
-        field_names.append(fields[i].name)
-        field_type = str(fields[i].type).split("'")[1]
-        field_formats.append(dtype.get(field_type).format)
-    # Put query into a map of {timestamp: list of (uid, data)}
-    for i in range(len(points)):
-        # Round time down to nearest 0.1 second
-        timestamp = str(points[i]["time"][:21] + "Z")
-        data = b""
-        for j in range(len(field_names)):
-            data += struct.pack(field_formats[j], points[i][field_names[j]])
-        if timestamp in playback.query:
-            playback.query[timestamp].append((uid, data))
-        else:
-            playback.query[timestamp] = [(uid, data)]
+    unknown = [packet for packet in packets if packet not in tlm_dict]
+    if not packets or unknown:
+        bottle.abort(400, "Unknown packets: {}".format(", ".join(unknown)))
+
+    try:
+        start, end = playback_time(start_time), playback_time(end_time)
+    except (TypeError, ValueError):
+        bottle.abort(400, "Invalid time: startTime and endTime must be ISO 8601.")
+
+    for packet in playback.merge(packets, start, end):
+        playback.query.append(*packet)
+
+    # Replay the updated query from its start.
+    if playback.clock is not None:
+        playback.clock.stop()
+        playback.clock = None
 
 
 @App.route("/playback/on", method="PUT")
@@ -1441,14 +5050,86 @@ def handle_playback_on_put():
 
 @App.route("/playback/send", method="POST")
 def handle_playback_send_post():
-    """Send timestamp to be put into playback queue if in database"""
+    """Send the packets received in the 0.1 second interval starting at
+    timestamp to be put into playback queue if in database"""
     global playback
     timestamp = bottle.request.forms.get("timestamp")
 
-    if timestamp in playback.query:
-        query_list = playback.query[timestamp]
-        for i in range(len(query_list)):
-            Sessions.add_telemetry(query_list[i][0], query_list[i][1])
+    try:
+        start = playback_time(timestamp)
+    except (TypeError, ValueError):
+        bottle.abort(400, "Invalid timestamp: {}".format(timestamp))
+
+    for index in playback.query.between(start, start + 0.1):
+        Sessions.add_telemetry(*playback.query.packet(index))
+
+
+@App.route("/playback/control", method=["GET", "PUT"])
+def handle_playback_control():
+    """Control and return the state of the server-side playback clock
+
+    Packets of the current playback query are sent to clients, in time
+    order, as they become due on a playback timeline running at ``speed``
+    times real time.  Playing turns playback on (see **/playback/on**).
+
+    :formparam state: ``play`` or ``pause`` (optional)
+    :formparam speed: The playback speed, from 0.1 to 100 (optional)
+    :formparam time: Seek to the packet nearest this POSIX time and send
+        the latest packet of each type up to it (optional)
+
+    **Example Response**:
+    .. sourcecode: json
+       {
+           "state": "playing",
+           "speed": 2.0,
+           "time": 1563214200.5,
+           "position": 5,
+           "count": 1200
+       }
+
+    ``state`` is one of ``playing``, ``paused`` or ``finished`` and
+    ``time`` is the POSIX time of the playback timeline.
+    """
+    global playback
+
+    if not playback.enabled:
+        bottle.abort(404, "Historic data playback is disabled")
+
+    if playback.clock is None:
+        if not playback.query:
+            bottle.abort(404, "No playback query")
+        playback.clock = PlaybackClock(playback.query)
+
+    clock = playback.clock
+
+    if bottle.request.method == "PUT":
+        state = bottle.request.forms.get("state")
+        speed = bottle.request.forms.get("speed")
+
+        if state not in (None, "play", "pause"):
+            bottle.abort(400, "Invalid state: must be play or pause.")
+
+        try:
+            if speed is not None:
+                clock.set_speed(speed)
+        except ValueError as e:
+            bottle.abort(400, "Invalid speed: {}".format(e))
+
+        try:
+            seek = bottle.request.forms.get("time")
+            if seek is not None:
+                clock.seek(float(seek))
+        except ValueError:
+            bottle.abort(400, "Invalid time: must be a POSIX time.")
+
+        if state == "play":
+            playback.on = True
+            clock.play()
+        elif state == "pause":
+            clock.pause()
+
+    __set_response_to_json()
+    return json.dumps(clock.stats())
 
 
 @App.route("/playback/abort", method="PUT")
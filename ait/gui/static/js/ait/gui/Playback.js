@@ -6,6 +6,11 @@ import {TelemetryDictionary, TelemetryStream} from '../tlm'
  * Playback historical telemetry data by inputting packet name and time range
  * Provides a timeline slider for jumping to specific timestamp location
  *
+ * Packets are replayed by the GUI server's playback clock (see
+ * /playback/control) at a selectable speed.  The timeline follows the
+ * clock's state, which is polled while playing, and moving the slider
+ * seeks the clock.
+ *
  * @example
  * <ait-playback></ait-playback>
  */
@@ -19,6 +24,7 @@ const Playback = {
     _current_time: null,
     _timer: null,
     _first_click: true,
+    _speeds: [0.1, 0.5, 1, 2, 5, 10, 100],
 
     oninit(vnode) {
         // Get time ranges for each packet from database
@@ -38,6 +44,12 @@ const Playback = {
                 let current_value = vnode.dom.getElementsByClassName('slider')[0].value
                 let formatted_time = new Date(current_value * 100).toISOString().substring(0, 21) + 'Z'
                 this._current_time = m('div', {class: 'timeline-current'}, 'Current time: ' + formatted_time)
+            },
+            onchange: (e) => {
+                // Seek the playback clock to the slider's time
+                if (!this._first_click) {
+                    this.control({time: e.target.value / 10})
+                }
             }
         })
     },
@@ -81,13 +93,11 @@ const Playback = {
 
         // Packet select drop down menu
         let packets = m('div', {class: 'form-group col-xs-3'}, [
-            m('label', 'Telemetry packet:'),
-            m('select', {class: 'form-control', name: 'packet'}, [
-                m('option', {disabled: 'disabled', selected: 'selected'}, 'Select an option')].concat(
-                    map(this._range, (i) => {
-                        return m('option', {value: i[0]}, i[0])
-                    })
-                )
+            m('label', 'Telemetry packets:'),
+            m('select', {class: 'form-control', name: 'packet', multiple: 'multiple'},
+                map(this._range, (i) => {
+                    return m('option', {value: i[0]}, i[0])
+                })
             )
         ])
         if (this._validation_errors['packet']) {
@@ -130,11 +140,11 @@ const Playback = {
                     return false
                 }
 
-                // Get packet, start time, and end time from form and append to data
-                this._packet = form.elements['packet'].value
+                // Get packets, start time, and end time from form and append to data
+                this._packet = map(form.elements['packet'].selectedOptions, (o) => o.value)
                 this._start_time = form.elements['startTime'].value.substr(0, 19) + '.0' + 'Z'
                 this._end_time = form.elements['endTime'].value.substr(0, 19) + '.0' + 'Z'
-                data.append('packet', this._packet)
+                this._packet.forEach((packet) => data.append('packet', packet))
                 data.append('startTime', this._start_time)
                 data.append('endTime', this._end_time)
 
@@ -181,14 +191,10 @@ const Playback = {
                     if (this._first_click) {
                         // Emit event that playback is on
                         ait.events.emit('ait:playback:on')
-                        m.request({
-                            url: '/playback/on',
-                            method: 'PUT'
-                        })
-
                         this._first_click = false
                     }
 
+                    this.control({state: 'play'})
                     this.start_slider(vnode, this._end_time)
                     vnode.dom.getElementsByClassName('play')[0].style.display = 'none'
                     vnode.dom.getElementsByClassName('pause')[0].style.display = 'inline-block'
@@ -200,12 +206,22 @@ const Playback = {
             m('button', {
                 class: 'btn btn-success pause', style: 'display: none',
                 onclick: (e) => {
+                    this.control({state: 'pause'})
                     this.stop_slider()
                     vnode.dom.getElementsByClassName('pause')[0].style.display = 'none'
                     vnode.dom.getElementsByClassName('play')[0].style.display = 'inline-block'
                 },
             }, 'Pause')
 
+        // Playback speed, as a multiple of real time
+        let speedSelect =
+            m('select', {
+                class: 'form-control speed', style: 'display: inline-block; width: auto',
+                onchange: (e) => { this.control({speed: e.target.value}) },
+            }, this._speeds.map((speed) => {
+                return m('option', {value: speed, selected: speed === 1}, speed + '\u00d7')
+            }))
+
         // Button to abort playback and return to realtime
         let abortBtn =
             m('button', {
@@ -234,40 +250,52 @@ const Playback = {
             }, 'Abort')
 
         // Button controls
-        let controls = m('div', {class: 'controls', style: 'display: none'}, [playBtn, pauseBtn, abortBtn])
+        let controls = m('div', {class: 'controls', style: 'display: none'}, [playBtn, pauseBtn, speedSelect, abortBtn])
 
         return m('ait-playback', vnode.attrs, [
             range, form, timeline, controls
         ])
     },
 
+    control(data) {
+        // Send a state or speed change to the playback clock
+        let form = new FormData()
+        for (let key in data) {
+            form.append(key, data[key])
+        }
+
+        return m.request({
+            url: '/playback/control',
+            method: 'PUT',
+            data: form
+        })
+    },
+
     start_slider(vnode, end_time) {
-        // Move the slider to the right every 0.1 seconds
+        // Follow the playback clock with the slider every 0.25 seconds
         if (this._timer) return
-        let start = Date.now()
-        let difference = 0
-
-        // Timer that updates every 0.01 seconds
-         this._timer = setInterval(function() {
-            let delta = Math.floor((Date.now() - start) / 100)
-            if (delta > difference) {
-                difference = delta
-                let current_value = ++vnode.dom.getElementsByClassName('slider')[0].value
-                let formatted_time = new Date(current_value * 100).toISOString().substring(0, 21) + 'Z'
 
-                if (formatted_time <= end_time) {
-                    vnode.dom.getElementsByClassName('timeline-current')[0].innerHTML = 'Current time: ' + formatted_time
-                    // Send timestamp to be evaluated by backend
-                    let data = new FormData()
-                    data.append('timestamp', formatted_time)
-                    m.request({
-                        url: '/playback/send',
-                        method: 'POST',
-                        data: data
-                    })
+        this._timer = setInterval(() => {
+            m.request({
+                url: '/playback/control',
+                method: 'GET',
+                background: true
+            }).then((status) => {
+                if (status.time === null) return
+
+                let formatted_time = new Date(status.time * 1000).toISOString().substring(0, 21) + 'Z'
+                if (formatted_time > end_time) {
+                    formatted_time = end_time
                 }
-            }
-        },10)
+
+                vnode.dom.getElementsByClassName('slider')[0].value = Math.floor(Date.parse(formatted_time) / 100)
+                vnode.dom.getElementsByClassName('timeline-current')[0].innerHTML = 'Current time: ' + formatted_time
+
+                if (status.state === 'finished') {
+                    this.stop_slider()
+                }
+            })
+        }, 250)
     },
 
     stop_slider() {
@@ -280,7 +308,7 @@ const Playback = {
         // Check form for errors
         this._validation_errors = {}
 
-        if (form.elements['packet'].selectedIndex === 0) {
+        if (form.elements['packet'].selectedOptions.length === 0) {
             this._validation_errors['packet'] = true
         }
         let datetimeRegex = /^\d{4}-(0[1-9]|1[012])-(0[1-9]|[12]\d|3[01])T([01]\d|2[0-3]):[0-5]\d:[0-5]\dZ$/
@@ -116,6 +116,29 @@ class DygraphsBackend
     redraw() {
         this._plot._chart.updateOptions( { 'file': this._plot._data })
     }
+
+    backfill (pname, history, raw) {
+        const rows  = history.time.map( (t, i) => {
+            let row = [ new Date(t * 1000) ]
+            this._series.forEach((id) => {
+                const values = id.startsWith(pname) ?
+                    historyValues(history, id.split('.')[1], raw) : null
+                row.push(values ? values[i] : null)
+            })
+            return row
+        })
+
+        // Keep only history older than the first live point.
+        const data  = this._plot._data
+        const first = data.length > 0 ? data[0][0] : null
+        const older = rows.filter((row) => first === null || row[0] < first)
+
+        this._plot._data = older.concat(data)
+            .sort((a, b) => a[0] - b[0])
+            .slice(-this._plotrange)
+
+        this.redraw()
+    }
 }
 
 
@@ -244,6 +267,38 @@ class HighchartsBackend
     redraw() {
         this._plot._chart.redraw()
     }
+
+    backfill (pname, history, raw) {
+        this._plot._packets[pname].forEach( (name) => {
+            const series = this._plot._chart.get(pname + '.' + name)
+            const values = historyValues(history, name, raw)
+
+            if (series && values) {
+                // Keep only history older than the first live point.
+                const first  = series.xData.length > 0 ? series.xData[0] : Infinity
+                const points = history.time
+                    .map((t, i) => [t * 1000, values[i]])
+                    .filter((point) => point[0] < first)
+                const live   = series.xData.map((x, i) => [x, series.yData[i]])
+
+                series.setData(points.concat(live), false)
+            }
+        })
+
+        this.redraw()
+    }
+}
+
+
+/**
+ * Returns the raw or DN to EU (falling back to raw) values of the given
+ * field from a /tlm/history response, or undefined if there are none.
+ */
+function historyValues (history, name, raw) {
+    if (raw || !(name in history.dntoeu)) {
+        return history.raw[name]
+    }
+    return history.dntoeu[name]
 }
 
 
@@ -368,6 +423,27 @@ const Plot =
     },
 
 
+    /**
+     * Backfills the plot with the GUI server's recent history of each
+     * plotted packet (see /tlm/history).  Plots timed by a packet field
+     * (`<ait-plot-time>`) are not backfilled, as history is timed by
+     * packet arrival.  History is decimated on the server to about one
+     * sample per pixel of the given plot width.
+     */
+    backfill (width) {
+        if (this._time._pname !== null) return
+
+        for (let pname in this._packets) {
+            const data = { packet: pname, fields: this._packets[pname].join(',') }
+            if (width > 1) data.points = width
+
+            m.request({ url: '/tlm/history', data: data })
+            .then((history) => this._backend.backfill(pname, history, this._raw))
+            .catch(() => { })
+        }
+    },
+
+
     /**
      * Processes a `<ait-plot-xxx>` tag by dispatching to the
      * appropriate `processTagXXX()` method.
@@ -471,6 +547,7 @@ const Plot =
 
     oncreate (vnode) {
         this._chart = this._backend.createChart(vnode, this._options)
+        this.backfill(vnode.dom.clientWidth)
     },
 
 
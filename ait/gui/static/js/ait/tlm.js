@@ -270,14 +270,146 @@ class TelemetryDictionary
 }
 
 
+/**
+ * Binary realtime telemetry framing, requested via the BINARY_PROTOCOL
+ * WebSocket subprotocol.  See ait.gui.TLM_BINARY_PROTOCOL for the
+ * server-side description of the frame layout.
+ */
+const BINARY_PROTOCOL = 'ait.tlm.binary.v1'
+const BINARY_DELTA    = 1
+
+const BINARY_NULL    = 0
+const BINARY_FALSE   = 1
+const BINARY_TRUE    = 2
+const BINARY_INT32   = 3
+const BINARY_FLOAT64 = 4
+const BINARY_STRING  = 5
+const BINARY_ARRAY   = 6
+
+
+class BinaryTelemetryDecoder
+{
+    /**
+     * Creates a new BinaryTelemetryDecoder from the /tlm/schema
+     * response, a mapping of packet names to their uid and field list.
+     */
+    constructor (schema) {
+        this._schema = { }
+        this._utf8   = new TextDecoder('utf-8')
+
+        for (let name in schema) {
+            const uid         = schema[name].uid
+            this._schema[uid] = { name: name, fields: schema[name].fields }
+        }
+    }
+
+    /**
+     * Decodes the given ArrayBuffer into an object with the same
+     * packet, data, dntoeus, and counter properties as a JSON message.
+     * Returns null for keep-alive probes and unknown packets.
+     */
+    decode (buffer) {
+        const view = new DataView(buffer)
+
+        if (view.byteLength < 9 || view.getUint8(0) !== BINARY_DELTA) {
+            return null
+        }
+
+        const schema = this._schema[view.getUint32(1)]
+        if (schema === undefined) {
+            return null
+        }
+
+        const state   = { view: view, offset: 9 }
+        const data    = this._decodeValues(state, schema.fields)
+        const dntoeus = this._decodeValues(state, schema.fields)
+
+        return {
+            packet:  schema.name,
+            data:    data,
+            dntoeus: dntoeus,
+            counter: view.getUint32(5)
+        }
+    }
+
+    _decodeValues (state, fields) {
+        const count  = state.view.getUint16(state.offset)
+        const values = { }
+        state.offset += 2
+
+        for (let n = 0; n < count; n++) {
+            const index   = state.view.getUint16(state.offset)
+            state.offset += 2
+            values[fields[index]] = this._decodeValue(state)
+        }
+
+        return values
+    }
+
+    _decodeValue (state) {
+        const view = state.view
+        const tag  = view.getUint8(state.offset)
+        let value  = null
+
+        state.offset += 1
+
+        switch (tag) {
+            case BINARY_FALSE:
+                value = false
+                break
+            case BINARY_TRUE:
+                value = true
+                break
+            case BINARY_INT32:
+                value         = view.getInt32(state.offset)
+                state.offset += 4
+                break
+            case BINARY_FLOAT64:
+                value         = view.getFloat64(state.offset)
+                state.offset += 8
+                break
+            case BINARY_STRING: {
+                const length  = view.getUint32(state.offset)
+                const start   = view.byteOffset + state.offset + 4
+                value         = this._utf8.decode(new Uint8Array(view.buffer, start, length))
+                state.offset += 4 + length
+                break
+            }
+            case BINARY_ARRAY: {
+                const length  = view.getUint16(state.offset)
+                state.offset += 2
+                value         = new Array(length)
+                for (let n = 0; n < length; n++) {
+                    value[n] = this._decodeValue(state)
+                }
+                break
+            }
+        }
+
+        return value
+    }
+}
+
+
 class TelemetryStream
 {
-    constructor (url, dict) {
+    /**
+     * Creates a new TelemetryStream connected to the realtime telemetry
+     * WebSocket url.  If options.binary is true, the compact binary
+     * framing is negotiated after fetching the /tlm/schema field index
+     * schema.  JSON messages are used otherwise.
+     */
+    constructor (url, dict, options = {}) {
         this._dict     = { }
         this._interval = 0
-        this._socket   = new WebSocket(url)
+        this._socket   = null
         this._stale    = 0
         this._url      = url
+        this._decoder  = null
+        this._subscription = undefined
+        this._pkt_states = { }
+        this._counters   = { }
+        this._version    = 0
         this.getFullPacketStates()
 
         // Re-map telemetry dictionary to be keyed by a PacketDefinition
@@ -287,6 +419,21 @@ class TelemetryStream
             this._dict[defn.uid] = defn
         }
 
+        if (options.binary) {
+            m.request({ url: '/tlm/schema' }).then( (schema) => {
+                this._decoder = new BinaryTelemetryDecoder(schema)
+                this._connect(BINARY_PROTOCOL)
+            })
+        }
+        else {
+            this._connect()
+        }
+    }
+
+    _connect (protocol) {
+        this._socket = protocol ? new WebSocket(this._url, protocol)
+                                : new WebSocket(this._url)
+
         this._socket.binaryType = 'arraybuffer'
         this._socket.onclose    = event => this.onClose  (event)
         this._socket.onmessage  = event => this.onMessage(event)
@@ -302,10 +449,17 @@ class TelemetryStream
         this._emit('close', this)
     }
 
+    /**
+     * Fetches the packet states changed since the last snapshot (all
+     * packet states, initially) and merges them into this stream's state.
+     */
     getFullPacketStates () {
-        m.request({ url: '/tlm/latest' }).then( (latest) => {
-            this._pkt_states = latest['states']
-            this._counters = latest['counters']
+        const since = this._version
+
+        m.request({ url: '/tlm/latest', data: { since: since } }).then( (latest) => {
+            Object.assign(this._pkt_states, latest['states'])
+            Object.assign(this._counters, latest['counters'])
+            this._version = latest['version']
         })
     }
 
@@ -322,10 +476,16 @@ class TelemetryStream
     }
 
     onMessage (event) {
-        if ( !(typeof event.data == "string") ) return
+        let data = null
+
+        if ( typeof event.data == "string" ) {
+            data = JSON.parse(event.data)
+        } else if ( this._decoder !== null ) {
+            data = this._decoder.decode(event.data)
+        }
+
+        if ( data === null ) return
 
-        let now = Date.now()
-        let data = JSON.parse(event.data)
         let packet_name = data['packet']
         let delta = data['data']
         let dntoeus = data['dntoeus']
@@ -377,7 +537,11 @@ class TelemetryStream
         this._stale    = 0
         this._interval = setInterval(this.onStale.bind(this), 5000)
 
-        let current_pkt = JSON.parse(JSON.stringify(this._pkt_states[packet_name]))
+        // Field values are replaced, never mutated in place, so a copy
+        // of the field maps is sufficient to snapshot the packet state.
+        let state = this._pkt_states[packet_name]
+        let current_pkt = {'raw': Object.assign({}, state['raw']),
+                           'dntoeu': Object.assign({}, state['dntoeu'])}
         ait.packets.insert(packet_name, current_pkt)
         this._emit('packet', {'packet': packet_name,
                               'data': this._pkt_states[packet_name]})
@@ -388,6 +552,10 @@ class TelemetryStream
         this._interval = setInterval(this.onStale.bind(this), 5000)
         this._stale    = 0
 
+        if (this._subscription !== undefined) {
+            this._sendSubscription()
+        }
+
         //ait.packets.create(this._defn.name)
         this._emit('open', this)
     }
@@ -397,10 +565,31 @@ class TelemetryStream
         this._stale++
         this._emit('stale', this)
     }
+
+
+    /**
+     * Limits the telemetry sent by the server to the given packets.
+     * Packets may be an Array of packet names, an Object mapping packet
+     * names to an Array of field names (or null for all fields), or null
+     * to receive all packets.  The subscription may be changed at any
+     * time and is re-sent whenever the stream (re)connects.
+     */
+    subscribe (packets) {
+        this._subscription = packets
+        this._sendSubscription()
+    }
+
+
+    _sendSubscription () {
+        if (this._socket && this._socket.readyState === WebSocket.OPEN) {
+            this._socket.send(JSON.stringify({ subscribe: this._subscription }))
+        }
+    }
 }
 
 
 export {
+    BinaryTelemetryDecoder,
     FieldDefinition,
     PacketDefinition,
     PacketScope,
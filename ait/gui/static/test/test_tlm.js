@@ -0,0 +1,77 @@
+/*
+ * Advanced Multi-Mission Operations System (AMMOS) Instrument Toolkit (AIT)
+ * Bespoke Link to Instruments and Small Satellites (BLISS)
+ *
+ * Copyright 2016, by the California Institute of Technology. ALL RIGHTS
+ * RESERVED. United States Government Sponsorship acknowledged. Any
+ * commercial use must be negotiated with the Office of Technology Transfer
+ * at the California Institute of Technology.
+ *
+ * This software may be subject to U.S. export control laws. By accepting
+ * this software, the user agrees to comply with all applicable U.S. export
+ * laws and regulations. User has the responsibility to obtain export licenses,
+ * or other export authority as may be required before exporting such
+ * information to foreign countries or providing access to foreign persons.
+ */
+
+import 'babel-polyfill'
+
+let chai = require('chai')
+let assert = chai.assert
+chai.should()
+
+import { BinaryTelemetryDecoder } from 'ait/tlm'
+
+
+// Hex encoding of TelemetryDelta(7, 'ExamplePacket1', ...).binary_message(42)
+// as produced by the ait.gui server for the schema below.
+const FRAME = '01000000070000002a0005000004402900000000000000010300000003' +
+              '000205000000024f4b0003060003030000000103fffffffe000004020002' +
+              '000105000000024f4e0005044270000000000000'
+
+function toArrayBuffer (hex) {
+    const bytes = new Uint8Array(hex.length / 2)
+    for (let n = 0; n < bytes.length; n++) {
+        bytes[n] = parseInt(hex.substr(n * 2, 2), 16)
+    }
+    return bytes.buffer
+}
+
+
+describe('BinaryTelemetryDecoder', () => {
+    const schema = {
+        ExamplePacket1: {
+            uid: 7,
+            fields: ['Voltage_A', 'Status', 'Label', 'Samples', 'Flag', 'Power']
+        }
+    }
+
+    it('should decode a server encoded delta frame', () => {
+        const decoder = new BinaryTelemetryDecoder(schema)
+        const message = decoder.decode(toArrayBuffer(FRAME))
+
+        assert.deepEqual(message, {
+            packet: 'ExamplePacket1',
+            data: {
+                Voltage_A: 12.5,
+                Status: 3,
+                Label: 'OK',
+                Samples: [1, -2, null],
+                Flag: true
+            },
+            dntoeus: {
+                Status: 'ON',
+                Power: Math.pow(2, 40)
+            },
+            counter: 42
+        })
+    })
+
+    it('should ignore keep-alive probes and unknown packets', () => {
+        const decoder = new BinaryTelemetryDecoder(schema)
+        const unknown = '01' + '00000008' + FRAME.substr(10)
+
+        assert.isNull(decoder.decode(toArrayBuffer('0000000000')))
+        assert.isNull(decoder.decode(toArrayBuffer(unknown)))
+    })
+})
@@ -0,0 +1,70 @@
+"""Benchmark for ``ait.gui.get_packet_delta``.
+
+Compares the generic ``ait.core.tlm.Packet`` decoding path against the
+precompiled ``PacketDecoder`` path on a wide, high-rate style packet and
+prints packets/sec for each.  Requires a working ait-core installation
+and an AIT configuration.  Run it from the repository root::
+
+    $ AIT_CONFIG=/path/to/config.yaml python tests/bench_packet_delta.py
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+# Allow running this script directly from a source checkout.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ait.gui as gui  # noqa: E402
+from ait.core import tlm  # noqa: E402
+
+
+def make_defn(name, nfields):
+    types = ["MSB_U16", "LSB_I32", "MSB_F32", "U8", "MSB_D64", "LSB_U16[4]"]
+    fields = []
+    for n in range(nfields):
+        kwargs = {"name": "f{}".format(n), "type": types[n % len(types)]}
+        if kwargs["type"] == "U8" and n % 2:
+            kwargs["mask"] = 0x3C
+        fields.append(tlm.FieldDefinition(**kwargs))
+    return tlm.PacketDefinition(name=name, fields=fields)
+
+
+def run(defn, packets, compile):
+    gui.packet_states.pop(defn.name, None)
+    gui.packet_decoders[defn] = gui.PacketDecoder(defn, compile=compile)
+
+    start = time.perf_counter()
+    for packet in packets:
+        gui.get_packet_delta(defn, packet)
+    elapsed = time.perf_counter() - start
+
+    return len(packets) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fields", type=int, default=120)
+    parser.add_argument("--packets", type=int, default=5000)
+    args = parser.parse_args()
+
+    defn = make_defn("BenchPacket", args.fields)
+    rng = random.Random(0)
+    packets = [
+        bytes(rng.getrandbits(8) for _ in range(defn.nbytes))
+        for _ in range(args.packets)
+    ]
+
+    before = run(defn, packets, compile=False)
+    after = run(defn, packets, compile=True)
+
+    print("fields: {}, packet bytes: {}".format(args.fields, defn.nbytes))
+    print("generic Packet path:  {:10.0f} packets/sec".format(before))
+    print("compiled decoder:     {:10.0f} packets/sec".format(after))
+    print("speedup:              {:10.1f}x".format(after / before))
+
+
+if __name__ == "__main__":
+    main()
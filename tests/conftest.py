@@ -26,7 +26,9 @@ def _install_ait_core_stubs():
     # Prefer the real package whenever it is importable.
     try:
         import ait.core  # noqa: F401
-        import ait.config  # noqa: F401
+
+        # ait.config is an attribute installed by ait.core, not a module.
+        ait.config  # noqa: B018
         return
     except Exception:
         pass
@@ -115,6 +117,7 @@ def _install_ait_core_stubs():
         leapseconds = {}
 
     dmc.LeapSeconds = _LeapSeconds
+    dmc.ISO_8601_Format = "%Y-%m-%dT%H:%M:%SZ"
     core.dmc = dmc
 
     for _sub in ("cmd", "dtype", "evr", "limits", "pcap", "gds"):
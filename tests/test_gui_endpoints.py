@@ -0,0 +1,554 @@
+"""Tests for the AIT-GUI HTTP endpoints.
+
+Endpoints are exercised through the real Bottle app as a WSGI application,
+with the ait-core data sources they read stubbed via monkeypatch.
+"""
+
+import gzip
+import io
+import json
+import re
+import types
+from datetime import datetime
+
+import pytest
+
+import ait.gui as gui
+from test_gui_telemetry import requires_ait_core, write_pcap
+
+
+def call(method, path, query="", headers=None, body=b"", cookies=None):
+    """Invokes ait.gui.App; returns (status, lowercase headers dict, body)."""
+    if isinstance(body, str):
+        body = body.encode()
+    environ = {
+        "REQUEST_METHOD": method,
+        "PATH_INFO": path,
+        "QUERY_STRING": query,
+        "SERVER_NAME": "127.0.0.1",
+        "SERVER_PORT": "8080",
+        "HTTP_HOST": "127.0.0.1:8080",
+        "SERVER_PROTOCOL": "HTTP/1.1",
+        "CONTENT_TYPE": "application/x-www-form-urlencoded",
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": "http",
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": io.StringIO(),
+        "wsgi.multithread": False,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for name, value in (headers or {}).items():
+        environ["HTTP_" + name.upper().replace("-", "_")] = value
+    if cookies:
+        environ["HTTP_COOKIE"] = "; ".join("%s=%s" % kv for kv in cookies.items())
+
+    captured = {}
+
+    def start_response(status, response_headers, exc_info=None):
+        captured["status"] = status
+        captured["headers"] = {k.lower(): v for k, v in response_headers}
+
+    payload = b"".join(gui.App(environ, start_response))
+    return int(captured["status"].split()[0]), captured["headers"], payload
+
+
+class FakeDict(dict):
+    def toJSON(self):
+        return dict(self)
+
+
+@pytest.fixture
+def tlm_dict(monkeypatch):
+    current = {"dict": FakeDict(Pkt1={"uid": 1})}
+    monkeypatch.setattr(
+        gui,
+        "Dictionaries",
+        dict(gui.Dictionaries, tlm=gui.CachedResponse(lambda: current["dict"])),
+    )
+    return current
+
+
+def test_dictionary_response_is_encoded_once(tlm_dict, monkeypatch):
+    calls = []
+    dumps = gui.json.dumps
+    monkeypatch.setattr(
+        gui.json, "dumps", lambda *a, **k: calls.append(1) or dumps(*a, **k)
+    )
+
+    for _ in range(3):
+        status, headers, body = call("GET", "/tlm/dict")
+        assert status == 200
+        assert json.loads(body) == {"Pkt1": {"uid": 1}}
+
+    assert len(calls) == 1
+    assert headers["content-type"] == "application/json"
+    assert headers["etag"].startswith('"')
+
+
+def test_dictionary_response_etag_and_gzip(tlm_dict):
+    _, headers, body = call("GET", "/tlm/dict")
+    etag = headers["etag"]
+
+    status, headers, payload = call("GET", "/tlm/dict", headers={"If-None-Match": etag})
+    assert (status, payload) == (304, b"")
+
+    status, headers, payload = call(
+        "GET", "/tlm/dict", headers={"Accept-Encoding": "gzip, deflate"}
+    )
+    assert status == 200 and headers["content-encoding"] == "gzip"
+    assert gzip.decompress(payload) == body
+
+
+def test_dictionary_response_invalidated_on_reload(tlm_dict):
+    _, headers, _ = call("GET", "/tlm/dict")
+    tlm_dict["dict"] = FakeDict(Pkt2={"uid": 2})
+
+    status, reloaded, body = call(
+        "GET", "/tlm/dict", headers={"If-None-Match": headers["etag"]}
+    )
+    assert status == 200 and reloaded["etag"] != headers["etag"]
+    assert json.loads(body) == {"Pkt2": {"uid": 2}}
+
+
+@pytest.fixture
+def session_cookie():
+    session = gui.Session(gui.Sessions)
+    gui.Sessions[session.id] = session
+    yield {"sid": session.id}
+    gui.Sessions.pop(session.id, None)
+
+
+@pytest.fixture
+def packet_states(monkeypatch):
+    states = {}
+    versions = gui.PacketVersions()
+    monkeypatch.setattr(gui, "packet_states", states)
+    monkeypatch.setattr(gui, "packet_versions", versions)
+
+    def update(name, raw, dntoeu=None):
+        states[name] = {"raw": raw, "dntoeu": dntoeu or {}}
+        versions.update(name)
+
+    return states, update
+
+
+def test_tlm_latest_returns_changes_since_version(packet_states, session_cookie):
+    states, update = packet_states
+    when = datetime(2020, 1, 2, 3, 4, 5)
+    update("Pkt1", {"a": 1}, {"t": when})
+    update("Pkt2", {"b": 2})
+
+    status, _, body = call("GET", "/tlm/latest", cookies=session_cookie)
+    latest = json.loads(body)
+    assert status == 200 and latest["version"] == 2
+    assert latest["states"]["Pkt1"]["dntoeu"] == {"t": "2020-01-02T03:04:05"}
+    assert states["Pkt1"]["dntoeu"]["t"] is when
+
+    update("Pkt2", {"b": 3})
+    _, _, body = call("GET", "/tlm/latest", "since=2", cookies=session_cookie)
+    latest = json.loads(body)
+    assert latest["states"] == {"Pkt2": {"raw": {"b": 3}, "dntoeu": {}}}
+    assert latest["version"] == 3
+
+    _, _, body = call("GET", "/tlm/latest", "packets=Pkt1", cookies=session_cookie)
+    assert list(json.loads(body)["states"]) == ["Pkt1"]
+
+    _, _, body = call("GET", "/tlm/latest", "since=3", cookies=session_cookie)
+    assert json.loads(body)["states"] == {}
+
+
+def test_tlm_latest_reuses_unchanged_encodings(packet_states, session_cookie):
+    _, update = packet_states
+    update("Pkt1", {"a": 1})
+    versions = gui.packet_versions
+
+    first = versions.encode("Pkt1", gui.packet_states["Pkt1"])
+    assert versions.encode("Pkt1", gui.packet_states["Pkt1"]) is first
+    update("Pkt1", {"a": 2})
+    assert versions.encode("Pkt1", gui.packet_states["Pkt1"]) is not first
+
+    status, _, _ = call("GET", "/tlm/latest", "since=x", cookies=session_cookie)
+    assert status == 400
+
+
+def test_tlm_history_returns_column_slices(monkeypatch):
+    numpy = pytest.importorskip("numpy")
+    history = gui.PacketHistory(size=10)
+    history.buffers["Pkt1"] = gui.HistoryBuffer(10, {"a": numpy.dtype("i")}, [])
+    for n in range(3):
+        history.buffers["Pkt1"].append(10.0 + n, {"a": n}, {})
+    monkeypatch.setattr(gui, "packet_history", history)
+
+    status, _, body = call("GET", "/tlm/history", "packet=Pkt1&fields=a&since=10")
+    assert status == 200
+    assert json.loads(body) == {
+        "packet": "Pkt1",
+        "time": [11.0, 12.0],
+        "raw": {"a": [1, 2]},
+        "dntoeu": {},
+    }
+
+    assert call("GET", "/tlm/history", "packet=Pkt2")[0] == 404
+    assert call("GET", "/tlm/history", "packet=Pkt1&since=soon")[0] == 400
+
+
+def test_tlm_history_downsamples_to_points(monkeypatch):
+    numpy = pytest.importorskip("numpy")
+    history = gui.PacketHistory(size=1000)
+    history.buffers["Pkt1"] = gui.HistoryBuffer(1000, {"a": numpy.dtype("d")}, [])
+    for n in range(1000):
+        history.buffers["Pkt1"].append(float(n), {"a": 50.0 if n == 500 else 0}, {})
+    monkeypatch.setattr(gui, "packet_history", history)
+
+    for method in ("minmax", "lttb"):
+        query = "packet=Pkt1&points=20&method=" + method
+        status, _, body = call("GET", "/tlm/history", query)
+        result = json.loads(body)
+        assert status == 200 and len(result["time"]) <= 20
+        assert 500.0 in result["time"] and max(result["raw"]["a"]) == 50.0
+
+    assert call("GET", "/tlm/history", "packet=Pkt1&points=1")[0] == 400
+    assert call("GET", "/tlm/history", "packet=Pkt1&points=x")[0] == 400
+    assert call("GET", "/tlm/history", "packet=Pkt1&points=9&method=avg")[0] == 400
+
+
+class FakeResult(list):
+    def get_points(self):
+        return iter(self)
+
+
+class FakeArchive(object):
+    """A datastore holding {measurement: [point, ...]} in time order."""
+
+    def __init__(self, measurements):
+        self.measurements = measurements
+        self.queries = []
+
+    def query(self, query):
+        self.queries.append(query)
+        if query == "SHOW MEASUREMENTS":
+            return FakeResult({"name": name} for name in self.measurements)
+
+        points = self.measurements[query.split('"')[1]]
+        where = re.search(
+            r"time >= '(.*)' AND time <= '(.*)' .* LIMIT (\d+) OFFSET (\d+)", query
+        )
+        if where:
+            start, end = map(gui.playback_time, where.groups()[:2])
+            limit, offset = map(int, where.groups()[2:])
+            points = [p for p in points if start <= gui.playback_time(p["time"]) <= end]
+            return FakeResult(points[offset : offset + limit])
+        if "LIMIT 1" not in query:
+            return FakeResult(points)
+        return FakeResult(points[-1:] if "DESC" in query else points[:1])
+
+
+@pytest.fixture
+def archive(monkeypatch):
+    archive = FakeArchive(
+        {
+            "Pkt1": [
+                {"time": "2019-07-15T18:10:00.5Z"},
+                {"time": "2019-07-15T18:11:00Z"},
+                {"time": "2019-07-15T18:12:00.25Z"},
+            ],
+            "Pkt2": [],
+        }
+    )
+    playback = gui.Playback()
+    playback.dbconn, playback.enabled = archive, True
+    monkeypatch.setattr(gui, "playback", playback)
+    return archive
+
+
+def test_playback_range_fetches_first_and_last_points(archive):
+    status, _, body = call("GET", "/playback/range")
+    assert status == 200
+    assert json.loads(body) == [
+        ["Pkt1", "2019-07-15T18:10:00Z", "2019-07-15T18:12:01Z"]
+    ]
+    assert all(
+        "LIMIT 1" in query for query in archive.queries if query.startswith("SELECT")
+    )
+
+
+def test_playback_range_is_cached_for_ttl(archive):
+    call("GET", "/playback/range")
+    count = len(archive.queries)
+    call("GET", "/playback/range")
+    assert len(archive.queries) == count
+
+    gui.playback.range_ttl = 0
+    archive.measurements["Pkt2"].append({"time": "2019-07-15T19:00:00Z"})
+    _, _, body = call("GET", "/playback/range")
+    assert len(archive.queries) > count
+    assert ["Pkt2", "2019-07-15T19:00:00Z", "2019-07-15T19:00:01Z"] in json.loads(body)
+
+
+def test_playback_chunks_fetch_a_bounded_number_of_points(archive):
+    gui.playback.chunk_size = 2
+    start, end = "2019-07-15T18:09:00Z", "2019-07-15T18:13:00Z"
+
+    chunks = list(gui.playback.chunks("Pkt1", start, end))
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+    assert [p["time"] for chunk in chunks for p in chunk] == [
+        p["time"] for p in archive.measurements["Pkt1"]
+    ]
+    assert all("LIMIT 2" in q for q in archive.queries)
+
+    gui.playback.chunk_size = 3
+    assert len(list(gui.playback.chunks("Pkt1", start, end))) == 1
+    assert list(gui.playback.chunks("Pkt2", start, end)) == []
+
+
+def test_playback_chunks_keep_points_sharing_a_time_across_chunks(archive):
+    archive.measurements["Pkt2"] = [
+        {"time": "2019-07-15T18:10:0%dZ" % t, "v": v}
+        for v, t in enumerate((0, 1, 1, 1, 1, 2))
+    ]
+    gui.playback.chunk_size = 2
+    start, end = "2019-07-15T18:09:00Z", "2019-07-15T18:13:00Z"
+
+    chunks = list(gui.playback.chunks("Pkt2", start, end))
+    assert [p["v"] for chunk in chunks for p in chunk] == list(range(6))
+    assert all(len(chunk) <= 2 for chunk in chunks)
+
+
+def test_playback_control_plays_the_query(monkeypatch):
+    sent = []
+    monkeypatch.setattr(gui.Sessions, "add_telemetry", lambda *item: sent.append(item))
+    playback = gui.Playback()
+    playback.enabled = True
+    monkeypatch.setattr(gui, "playback", playback)
+
+    assert call("GET", "/playback/control")[0] == 404
+
+    playback.query.append(1563214200.0, 1, b"a")
+    status, _, body = call("PUT", "/playback/control", body="state=play&speed=100")
+    assert status == 200 and playback.on
+    assert json.loads(body)["speed"] == 100.0
+
+    gui.gevent.sleep(0.01)
+    assert sent == [(1, b"a")]
+    assert json.loads(call("GET", "/playback/control")[2])["state"] == "finished"
+
+    assert call("PUT", "/playback/control", body="speed=1000")[0] == 400
+    assert call("PUT", "/playback/control", body="state=rewind")[0] == 400
+    assert call("PUT", "/playback/control", body="time=later")[0] == 400
+
+    del sent[:]
+    call("POST", "/playback/send", body="timestamp=2019-07-15T18:10:00.0Z")
+    assert sent == [(1, b"a")]
+
+    call("PUT", "/playback/abort")
+    assert playback.clock is None and not playback.query
+
+
+class FakeField(object):
+    def __init__(self, name, format):
+        self.name = name
+        self.type = types.SimpleNamespace(format=format)
+
+
+class FakeDefn(object):
+    def __init__(self, name, uid, fields):
+        self.name, self.uid, self.fields = name, uid, fields
+
+
+def test_playback_query_is_cached_and_reused(archive, monkeypatch):
+    defn = FakeDefn("Pkt3", 3, [FakeField("v", ">H")])
+    monkeypatch.setattr(gui.tlm, "getDefaultDict", lambda: {"Pkt3": defn})
+    archive.measurements["Pkt3"] = [
+        {"time": "2019-07-15T18:10:0%dZ" % n, "v": n} for n in range(6)
+    ]
+
+    def query(start, end):
+        del archive.queries[:]
+        body = "packet=Pkt3&startTime=2019-07-15T18:10:0%d.0Z" % start
+        body += "&endTime=2019-07-15T18:10:0%d.0Z" % end
+        assert call("POST", "/playback/query", body=body)[0] == 200
+        buffer, gui.playback.query = gui.playback.query, gui.PlaybackBuffer()
+        return [buffer.packet(n) for n in range(len(buffer))]
+
+    def chunks():
+        return [query for query in archive.queries if "OFFSET" in query]
+
+    assert query(0, 2) == [(3, bytes([0, n])) for n in range(3)]
+    assert len(chunks()) == 1
+
+    assert len(query(0, 2)) == 3 and archive.queries == []
+    assert query(1, 4) == [(3, bytes([0, n])) for n in range(1, 5)]
+    assert len(chunks()) == 1 and "18:10:02.0" in chunks()[0]
+
+    stats = json.loads(call("GET", "/stats")[2])["playback"]
+    assert (stats["hits"], stats["misses"], stats["partial"]) == (1, 2, 1)
+    assert stats["entries"] == 2 and stats["bytes"] > 0
+
+    gui.playback.cache.budget = stats["bytes"] - 1
+    query(3, 4)
+    assert gui.playback.cache.nbytes <= gui.playback.cache.budget
+    assert len(gui.playback.cache) < 3
+
+    status, _, _ = call("POST", "/playback/query", body="packet=Pkt3&startTime=x")
+    assert status == 400
+
+
+def test_playback_query_does_not_cache_data_still_being_written(archive, monkeypatch):
+    defn = FakeDefn("Pkt3", 3, [FakeField("v", "B")])
+    monkeypatch.setattr(gui.tlm, "getDefaultDict", lambda: {"Pkt3": defn})
+    archive.measurements["Pkt3"] = [
+        {"time": "2019-07-15T18:10:0%dZ" % n, "v": n} for n in range(3)
+    ]
+
+    def query(end):
+        body = "packet=Pkt3&startTime=2019-07-15T18:10:00.0Z"
+        body += "&endTime=2019-07-15T18:10:0%d.0Z" % end
+        assert call("POST", "/playback/query", body=body)[0] == 200
+        buffer, gui.playback.query = gui.playback.query, gui.PlaybackBuffer()
+        return b"".join(buffer.packet(n)[1] for n in range(len(buffer)))
+
+    assert query(1) == b"\x00\x01"
+    assert len(gui.playback.cache) == 1
+
+    assert query(5) == b"\x00\x01\x02"
+    archive.measurements["Pkt3"].append({"time": "2019-07-15T18:10:04Z", "v": 4})
+    assert query(5) == b"\x00\x01\x02\x04"
+    assert len(gui.playback.cache) == 1
+
+
+def test_playback_query_merges_packets_in_time_order(archive, monkeypatch):
+    defns = {
+        name: FakeDefn(name, uid, [FakeField("v", "B")])
+        for name, uid in (("Pkt3", 3), ("Pkt4", 4))
+    }
+    monkeypatch.setattr(gui.tlm, "getDefaultDict", lambda: defns)
+    archive.measurements["Pkt3"] = [
+        {"time": "2019-07-15T18:10:0%dZ" % n, "v": n} for n in (0, 2, 4)
+    ]
+    archive.measurements["Pkt4"] = [
+        {"time": "2019-07-15T18:10:0%dZ" % n, "v": n} for n in (1, 2, 3)
+    ]
+
+    body = "packet=Pkt4&packet=Pkt3&startTime=2019-07-15T18:10:00.0Z"
+    body += "&endTime=2019-07-15T18:10:09.0Z"
+    assert call("POST", "/playback/query", body=body)[0] == 200
+
+    query = gui.playback.query
+    assert [query.packet(n) for n in range(len(query))] == [
+        (3, b"\x00"),
+        (4, b"\x01"),
+        (4, b"\x02"),
+        (3, b"\x02"),
+        (4, b"\x03"),
+        (3, b"\x04"),
+    ]
+    assert gui.playback.cache.misses == 2
+
+    gui.playback.cache.clear()
+    gui.playback.chunk_size = 1
+    start = gui.playback_time("2019-07-15T18:10:00Z")
+    end = gui.playback_time("2019-07-15T18:10:09Z")
+    count = len(archive.queries)
+    merged = gui.playback.merge(["Pkt3", "Pkt4"], start, end)
+    assert next(merged)[1] == 3
+    assert len(archive.queries) - count <= 4
+    assert [uid for _, uid, _ in merged] == [4, 3, 4, 4, 3]
+
+    body = body.replace("packet=Pkt4&packet=Pkt3", "packet=Pkt3,Pkt5")
+    assert call("POST", "/playback/query", body=body)[0] == 400
+
+
+def test_tlm_query_validates_before_streaming(monkeypatch, tmp_path):
+    monkeypatch.setattr(gui.tlm, "getDefaultDict", lambda: {})
+    body = "dataDir={}&timeField=&packet=Pkt1&fields=&startTime=2019-07-15T18:10:00Z"
+
+    status, _, payload = call("POST", "/tlm/query", body=body.format(tmp_path))
+    assert status == 400 and b"Malformed" in payload
+
+    # An empty timeField filters by ground receipt time.
+    body = body.replace("fields=", "fields=a")
+    status, _, payload = call("POST", "/tlm/query", body=body.format(tmp_path))
+    assert status == 400 and b"not defined" in payload
+    body = body.replace("timeField=", "timeField=t")
+    status, _, payload = call("POST", "/tlm/query", body=body.format(tmp_path))
+    assert status == 400 and b"not defined" in payload
+
+    body = body.replace("startTime=", "format=xml&startTime=")
+    status, _, payload = call("POST", "/tlm/query", body=body.format(tmp_path))
+    assert status == 400 and b"Unsupported format" in payload
+
+
+@requires_ait_core
+def test_tlm_query_skips_pcaps_outside_the_time_range(monkeypatch, tmp_path):
+    tlm = gui.tlm
+    defn = tlm.PacketDefinition(
+        name="Pkt1", fields=[tlm.FieldDefinition(name="a", type="MSB_U16")]
+    )
+    monkeypatch.setattr(tlm, "getDefaultDict", lambda: {"Pkt1": defn})
+    monkeypatch.setattr(gui.TelemetryQuery, "processes", 0)
+    monkeypatch.setattr(gui, "pcap_indexes", {})
+
+    epoch = gui.posix_time(datetime(2019, 7, 15))
+    write_pcap(tmp_path / "old.pcap", [(epoch + n, bytes([0, n])) for n in range(3)])
+    write_pcap(tmp_path / "new.pcap", [(epoch + 3600, b"\x00\x07")])
+    for path in gui.find_pcaps(str(tmp_path)):
+        gui.get_pcap_index(path)
+
+    streamed = []
+
+    class PCapStream(gui.pcap.PCapStream):
+        def __init__(self, stream, mode="rb"):
+            streamed.append(stream.name)
+            super().__init__(stream, mode)
+
+    monkeypatch.setattr(gui.pcap, "PCapStream", PCapStream)
+
+    body = "dataDir={}&packet=Pkt1&fields=a&startTime=2019-07-15T00:30:00Z"
+    status, _, payload = call("POST", "/tlm/query", body=body.format(tmp_path))
+
+    assert status == 200
+    assert payload.decode().splitlines() == [
+        "Ground Receipt Time,a",
+        "2019-07-15 01:00:00,7",
+    ]
+    assert streamed == [str(tmp_path / "new.pcap")]
+
+
+def test_tlm_query_jobs_validate_and_report_unknown_jobs(monkeypatch, tmp_path):
+    monkeypatch.setattr(gui.tlm, "getDefaultDict", lambda: {})
+    body = "dataDir={}&timeField=t&packet=Pkt1&fields=a&startTime=2019-07-15T18:10:00Z"
+
+    status, _, payload = call("POST", "/tlm/query/jobs", body=body.format(tmp_path))
+    assert status == 400 and b"not defined" in payload
+    assert call("GET", "/tlm/query/jobs/nope")[0] == 404
+    assert call("GET", "/tlm/query/jobs/nope/result")[0] == 404
+    assert json.loads(call("GET", "/stats")[2])["queries"]["misses"] == 0
+
+
+def test_cmd_hist_is_paginated(monkeypatch):
+    history = gui.CommandHistory()
+    for n in range(5):
+        history.add(datetime(2019, 7, 15, 18, 10, n), "CMD_%d" % (n % 2))
+    monkeypatch.setattr(gui, "command_history", history)
+    monkeypatch.setattr(history, "refresh", lambda filename: True)
+    monkeypatch.setattr(gui.CMD_API, "CMD_HIST_FILE", "cmdhist.pcap", raising=False)
+
+    status, _, payload = call("GET", "/cmd/hist.json")
+    assert status == 200 and json.loads(payload) == ["CMD_0", "CMD_1"]
+
+    page = json.loads(call("GET", "/cmd/hist.json", "detailed=true&limit=2")[2])
+    assert page == [
+        {"id": 4, "timestamp": "2019-07-15 18:10:04", "command": "CMD_0"},
+        {"id": 3, "timestamp": "2019-07-15 18:10:03", "command": "CMD_1"},
+    ]
+    query = "detailed=true&limit=2&before=%d" % page[-1]["id"]
+    page = json.loads(call("GET", "/cmd/hist.json", query)[2])
+    assert [cmd["id"] for cmd in page] == [2, 1]
+
+    # Without a limit, all commands are returned.
+    page = json.loads(call("GET", "/cmd/hist.json", "detailed=true")[2])
+    assert [cmd["id"] for cmd in page] == [4, 3, 2, 1, 0]
+
+    assert call("GET", "/cmd/hist.json", "detailed=true&limit=0")[0] == 400
@@ -0,0 +1,1119 @@
+"""Tests for the AIT-GUI realtime telemetry processing path.
+
+Tests that need real packet definitions are skipped when ``ait-core`` cannot
+be imported and the stand-ins from ``conftest.py`` are in use.  ait-core
+only imports with an AIT configuration, so run the full set (including the
+PacketDecoder tests) with, e.g.::
+
+    $ AIT_CONFIG=/path/to/config.yaml python -m pytest tests
+"""
+
+import datetime
+import io
+import os
+import random
+import struct
+import time
+
+import gevent
+import pytest
+
+import ait.gui as gui
+
+requires_ait_core = pytest.mark.skipif(
+    not hasattr(gui.tlm, "FieldDefinition"),
+    reason="requires an importable ait-core (set AIT_CONFIG)",
+)
+
+
+def make_defn(name="TestPacket", derivations=None):
+    tlm = gui.tlm
+    fields = [
+        tlm.FieldDefinition(name="a", type="MSB_U16"),
+        tlm.FieldDefinition(name="b", type="U8", mask=0xF0),
+        tlm.FieldDefinition(
+            name="c", type="U8", bytes="@prev", mask=0x0F, enum={1: "ONE", 2: "TWO"}
+        ),
+        tlm.FieldDefinition(
+            name="d", type="MSB_F32", dntoeu={"equation": "raw.d * 2", "units": "V"}
+        ),
+        tlm.FieldDefinition(name="e", type="LSB_U16[3]"),
+        tlm.FieldDefinition(name="f", type="LSB_I32"),
+        tlm.FieldDefinition(name="g", type="S4"),
+        tlm.FieldDefinition(name="t", type="TIME64"),
+    ]
+    return tlm.PacketDefinition(name=name, fields=fields, derivations=derivations)
+
+
+def random_packets(defn, count, seed=0):
+    rng = random.Random(seed)
+    packets = []
+    for _ in range(count):
+        data = bytearray(rng.getrandbits(8) for _ in range(defn.nbytes))
+        # Keep some packets identical so that empty deltas are exercised.
+        packets.append(bytes(data))
+        if rng.random() < 0.2:
+            packets.append(bytes(data))
+    return packets
+
+
+@pytest.fixture
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(gui, "packet_states", {})
+    monkeypatch.setattr(gui, "packet_versions", gui.PacketVersions())
+    monkeypatch.setattr(gui, "packet_decoders", {})
+
+
+@requires_ait_core
+def test_decoder_compiles_masks_arrays_and_strings():
+    decoder = gui.PacketDecoder(make_defn())
+    assert decoder.compiled
+
+    data = bytes(range(decoder.defn.nbytes))
+    generic = gui.PacketDecoder(decoder.defn, compile=False)
+    assert not generic.compiled
+    assert decoder.decode(data) == generic.decode(data)
+
+    raw = decoder.decode(data)
+    assert raw["e"] == [0x0807, 0x0A09, 0x0C0B]
+    assert isinstance(raw["e"], list)
+
+
+@requires_ait_core
+def test_decoder_falls_back_for_conditional_fields():
+    tlm = gui.tlm
+    defn = tlm.PacketDefinition(
+        name="WhenPacket",
+        fields=[
+            tlm.FieldDefinition(name="a", type="U8"),
+            tlm.FieldDefinition(name="b", type="U8", when="a > 1"),
+        ],
+    )
+    decoder = gui.PacketDecoder(defn)
+    assert not decoder.compiled
+    assert decoder.decode(b"\x00\x05") == {"a": 0, "b": None}
+
+
+@requires_ait_core
+def test_decoder_falls_back_on_short_packets():
+    decoder = gui.PacketDecoder(make_defn())
+    with pytest.raises(Exception):
+        decoder.decode(b"\x00")
+
+
+@requires_ait_core
+def test_get_packet_delta_matches_generic_path(fresh_state, monkeypatch):
+    tlm = gui.tlm
+    derivations = [
+        tlm.DerivationDefinition(name="sum", equation="raw.a + raw.f", type="LSB_I32")
+    ]
+    compiled_defn = make_defn("Compiled", derivations=derivations)
+    generic_defn = make_defn("Generic", derivations=derivations)
+    gui.packet_decoders[generic_defn] = gui.PacketDecoder(generic_defn, compile=False)
+
+    for packet in random_packets(compiled_defn, 50):
+        expected = gui.get_packet_delta(generic_defn, packet)
+        actual = gui.get_packet_delta(compiled_defn, packet)
+        assert actual == expected
+
+    assert gui.get_packet_decoder(compiled_defn).compiled
+    assert gui.packet_states["Compiled"] == gui.packet_states["Generic"]
+
+
+class FakeDefn:
+    def __init__(self, name, uid):
+        self.name = name
+        self.uid = uid
+
+
+@pytest.fixture
+def store(monkeypatch):
+    """A SessionStore fed by a stubbed packet definition / delta source."""
+    defns = {1: FakeDefn("Pkt1", 1), 2: FakeDefn("Pkt2", 2)}
+    monkeypatch.setattr(gui, "get_packet_defn", lambda uid: defns.get(uid))
+    monkeypatch.setattr(
+        gui,
+        "get_packet_delta",
+        lambda defn, packet: ({"value": packet[0]}, {"eu": packet[0] * 2}),
+    )
+    return gui.SessionStore()
+
+
+def add_sessions(store, count):
+    sessions = [gui.Session(store) for _ in range(count)]
+    for session in sessions:
+        store[session.id] = session
+    return sessions
+
+
+def test_delta_is_encoded_once_for_all_sessions(store, monkeypatch):
+    sessions = add_sessions(store, 5)
+    calls = []
+    dumps = gui.json.dumps
+    monkeypatch.setattr(
+        gui.json, "dumps", lambda *a, **k: calls.append(1) or dumps(*a, **k)
+    )
+
+    store.add_telemetry(1, b"\x07")
+    messages = []
+    for session in sessions:
+        frame, counter = session.deltas.popleft()
+        messages.append(gui.json.loads(frame.message(counter)))
+
+    assert len(calls) == 1
+    assert messages[0] == {
+        "packet": "Pkt1",
+        "data": {"value": 7},
+        "dntoeus": {"eu": 14},
+        "counter": 0,
+    }
+    assert all(m == messages[0] for m in messages)
+
+
+def test_delta_message_carries_session_counter(store):
+    (early,) = add_sessions(store, 1)
+    store.add_telemetry(1, b"\x01")
+    (late,) = add_sessions(store, 1)
+    store.add_telemetry(1, b"\x02")
+
+    early.deltas.popleft()
+    frame, counter = early.deltas.popleft()
+    assert gui.json.loads(frame.message(counter))["counter"] == 1
+
+    frame, counter = late.deltas.popleft()
+    assert gui.json.loads(frame.message(counter))["counter"] == 0
+
+
+class FakeField:
+    def __init__(self, name):
+        self.name = name
+
+
+class FakeSchemaDefn(FakeDefn):
+    def __init__(self, name, uid, fields, derivations=()):
+        super().__init__(name, uid)
+        self.fields = [FakeField(f) for f in fields]
+        self.derivations = [FakeField(f) for f in derivations]
+
+
+def unpack_binary_value(buf, offset):
+    (tag,) = gui.struct.unpack_from(">B", buf, offset)
+    offset += 1
+    if tag == gui.TLM_BINARY_NULL:
+        return None, offset
+    if tag in (gui.TLM_BINARY_FALSE, gui.TLM_BINARY_TRUE):
+        return tag == gui.TLM_BINARY_TRUE, offset
+    if tag == gui.TLM_BINARY_INT32:
+        return gui.struct.unpack_from(">i", buf, offset)[0], offset + 4
+    if tag == gui.TLM_BINARY_FLOAT64:
+        return gui.struct.unpack_from(">d", buf, offset)[0], offset + 8
+    if tag == gui.TLM_BINARY_STRING:
+        (length,) = gui.struct.unpack_from(">I", buf, offset)
+        offset += 4
+        return buf[offset : offset + length].decode("utf-8"), offset + length
+    (length,) = gui.struct.unpack_from(">H", buf, offset)
+    offset += 2
+    items = []
+    for _ in range(length):
+        item, offset = unpack_binary_value(buf, offset)
+        items.append(item)
+    return items, offset
+
+
+def unpack_binary_message(buf, names):
+    kind, uid, counter = gui.TLM_BINARY_HEADER.unpack_from(buf)
+    offset = gui.TLM_BINARY_HEADER.size
+    maps = []
+    for _ in range(2):
+        (count,) = gui.struct.unpack_from(">H", buf, offset)
+        offset += 2
+        values = {}
+        for _ in range(count):
+            (index,) = gui.struct.unpack_from(">H", buf, offset)
+            values[names[index]], offset = unpack_binary_value(buf, offset + 2)
+        maps.append(values)
+    assert offset == len(buf)
+    return kind, uid, counter, maps[0], maps[1]
+
+
+def test_binary_message_round_trip(monkeypatch):
+    defn = FakeSchemaDefn("Pkt9", 9, ["a", "b", "c", "d"], derivations=["e"])
+    monkeypatch.setattr(gui, "get_packet_defn", lambda uid: defn)
+    monkeypatch.setattr(gui, "packet_schemas", {})
+
+    delta = {"a": 5, "b": [1, 2.5, -3], "c": "café", "e": 2**40}
+    dntoeus = {"a": None, "d": True}
+    frame = gui.TelemetryDelta(9, "Pkt9", delta, dntoeus)
+
+    names, _ = gui.get_packet_schema(defn)
+    message = frame.binary_message(12)
+    assert unpack_binary_message(message, names) == (
+        gui.TLM_BINARY_DELTA,
+        9,
+        12,
+        delta,
+        dntoeus,
+    )
+    assert len(message) < len(frame.message(12))
+    # The shared body is encoded once; only the header differs per session.
+    assert frame.binary_message(13)[gui.TLM_BINARY_HEADER.size :] == frame.body
+
+
+def test_tlm_schema_lists_fields_then_derivations(monkeypatch):
+    defn = FakeSchemaDefn("Pkt9", 9, ["a", "b"], derivations=["c"])
+    monkeypatch.setattr(gui.tlm, "getDefaultDict", lambda: {"Pkt9": defn})
+    monkeypatch.setattr(gui, "packet_schemas", {})
+
+    assert gui.json.loads(gui.handle_tlm_schema_get()) == {
+        "Pkt9": {"uid": 9, "fields": ["a", "b", "c"]}
+    }
+    assert gui._app_protocol("/tlm/realtime") == gui.TLM_BINARY_PROTOCOL
+    assert gui._app_protocol("/tlm/realtime/openmct") is None
+
+
+def test_reap_removes_only_idle_sessions(store):
+    idle, active, fresh = add_sessions(store, 3)
+    store.idle_timeout = 60
+    now = gui.time.monotonic()
+    idle._lastActive = now - 120
+    active._lastActive = now - 120
+    fresh._lastActive = now - 10
+
+    with active:
+        assert store.reap(now) == 1
+
+    assert set(store) == {active.id, fresh.id}
+    assert store.stats()["reaped"] == 1
+
+
+def test_reap_enforces_queue_budget(store):
+    oldest, older, connected = add_sessions(store, 3)
+    store.idle_timeout = None
+    store.max_queued = 4
+    now = gui.time.monotonic()
+    oldest._lastActive = now - 30
+    older._lastActive = now - 20
+
+    for n in range(2):
+        store.add_telemetry(1, bytes([n]))
+    assert store.stats()["queued"] == 12
+
+    with connected:
+        assert store.reap(now) == 2
+
+    assert list(store) == [connected.id]
+    stats = store.stats()
+    assert stats["count"] == 1
+    assert stats["queued"] == 4
+    assert (stats["reaped"], stats["evicted"]) == (0, 2)
+
+
+def test_coalescing_session_merges_pending_deltas(store, monkeypatch):
+    session = gui.Session(store, coalesce=True)
+    store[session.id] = session
+    deltas = iter(
+        [
+            ({"a": 1, "b": 1}, {}),
+            ({"a": 2}, {"eu": "x"}),
+            ({"b": 3}, {}),
+            ({"c": 9}, {"eu": "y"}),
+        ]
+    )
+    monkeypatch.setattr(gui, "get_packet_delta", lambda defn, packet: next(deltas))
+    for uid in (1, 2, 1, 1):
+        store.add_telemetry(uid, b"\x00")
+
+    assert len(session.deltas) == 2
+    frame, counter = session.deltas.popleft(timeout=0)
+    assert (frame.packet, counter) == ("Pkt1", 0)
+    assert frame.delta == {"a": 1, "b": 3, "c": 9}
+    assert frame.dntoeus == {"eu": "y"}
+    frame, counter = session.deltas.popleft(timeout=0)
+    assert (frame.packet, frame.delta, counter) == ("Pkt2", {"a": 2}, 0)
+    assert session.stats()["coalesced"] == 2
+
+    # A delta queued after the pending one was sent gets the next counter.
+    monkeypatch.setattr(gui, "get_packet_delta", lambda defn, packet: ({"d": 5}, {}))
+    store.add_telemetry(1, b"\x00")
+    frame, counter = session.deltas.popleft(timeout=0)
+    assert (frame.delta, counter) == ({"d": 5}, 1)
+
+    with pytest.raises(IndexError):
+        session.deltas.popleft(timeout=0.01)
+
+
+def test_non_coalescing_session_counts_dropped_deltas(store):
+    session = gui.Session(store, maxlen=3)
+    store[session.id] = session
+    for n in range(5):
+        store.add_telemetry(1, bytes([n]))
+
+    assert len(session.deltas) == 3
+    assert session.stats()["dropped"] == 2
+    assert session.stats()["coalesced"] == 0
+
+
+def test_unsubscribed_sessions_are_skipped(store, monkeypatch):
+    everything, only_pkt2 = add_sessions(store, 2)
+    only_pkt2.subscribe(["Pkt2"])
+
+    store.add_telemetry(1, b"\x01")
+    store.add_telemetry(2, b"\x02")
+
+    assert [f.packet for f, _ in everything.deltas] == ["Pkt1", "Pkt2"]
+    assert [f.packet for f, _ in only_pkt2.deltas] == ["Pkt2"]
+    assert "Pkt1" not in only_pkt2.tlm_counters
+    assert len(only_pkt2.telemetry) == 1
+
+    only_pkt2.subscribe(None)
+    store.add_telemetry(1, b"\x03")
+    assert only_pkt2.tlm_counters["Pkt1"] == 0
+
+
+def test_field_subscriptions_share_filtered_frames(store, monkeypatch):
+    monkeypatch.setattr(
+        gui,
+        "get_packet_delta",
+        lambda defn, packet: ({"a": packet[0], "b": 1}, {"b": "ONE"}),
+    )
+    first, second, other = add_sessions(store, 3)
+    first.subscribe({"Pkt1": ["a"], "Pkt2": None})
+    second.subscribe({"Pkt1": ["a"]})
+    other.subscribe({"Pkt1": ["b"]})
+
+    store.add_telemetry(1, b"\x07")
+    (frame1, _), (frame2, _) = first.deltas.popleft(), second.deltas.popleft()
+    assert frame1 is frame2
+    assert gui.json.loads(frame1.message(0))["data"] == {"a": 7}
+    frame, _ = other.deltas.popleft()
+    assert (frame.delta, frame.dntoeus) == ({"b": 1}, {"b": "ONE"})
+
+    # Nothing is queued (and no counter consumed) when no subscribed
+    # field changed.
+    monkeypatch.setattr(gui, "get_packet_delta", lambda defn, packet: ({"b": 2}, {}))
+    store.add_telemetry(1, b"\x00")
+    assert len(first.deltas) == 0
+    assert first.tlm_counters["Pkt1"] == 0
+    assert len(other.deltas) == 1
+
+
+def test_receive_subscriptions_applies_messages():
+    class FakeSocket:
+        closed = False
+
+        def __init__(self, messages):
+            self.messages = list(messages)
+
+        def receive(self):
+            return self.messages.pop(0) if self.messages else None
+
+    session = gui.Session()
+    gui.receive_subscriptions(
+        FakeSocket(['{"subscribe": {"Pkt1": ["a"]}}', "not json"]), session
+    )
+    assert session.subscriptions == {"Pkt1": frozenset(["a"])}
+
+    malformed = [
+        '{"subscribe": "Pkt1"}',
+        '{"subscribe": {"Pkt1": "ab"}}',
+        '{"subscribe": {"Pkt1": []}}',
+        '{"subscribe": [1, 2]}',
+        '{"subscribe": {"Pkt1": [null]}}',
+    ]
+    gui.receive_subscriptions(FakeSocket(malformed), session)
+    assert session.subscriptions == {"Pkt1": frozenset(["a"])}
+
+    gui.receive_subscriptions(FakeSocket(['{"subscribe": null}']), session)
+    assert session.subscriptions is None
+
+    gui.receive_subscriptions(
+        FakeSocket(['{"rate": 4, "rates": {"Pkt1": 1}}', '{"rate": -1}']), session
+    )
+    assert session.subscriptions is None
+    assert session.interval("Pkt1") == 1.0 and session.interval("Pkt2") == 0.25
+
+
+def test_subscribe_rejects_malformed_subscriptions():
+    session = gui.Session()
+    for packets in ["Pkt1", {"Pkt1": "ab"}, {"Pkt1": []}, [1], {1: None}]:
+        with pytest.raises(ValueError):
+            session.subscribe(packets)
+    assert session.subscriptions is None
+
+    session.subscribe({"Pkt1": None, "Pkt2": ["a", "b"]})
+    assert session.subscriptions == {"Pkt1": None, "Pkt2": frozenset(["a", "b"])}
+
+
+def test_current_recreates_reaped_session(store, monkeypatch):
+    (session,) = add_sessions(store, 1)
+    store.idle_timeout = 10
+    store.reap(now=time.monotonic() + 11)
+    assert session.id not in store
+
+    cookies = {"sid": session.id}
+    request = type("FakeRequest", (), {"get_cookie": staticmethod(cookies.get)})
+    monkeypatch.setattr(gui.bottle, "request", request)
+    recreated = store.current()
+    assert recreated is not session and recreated.id == session.id
+    assert store[session.id] is recreated
+
+    # Only Session Ids the store issued (and expired) are re-created.
+    for sid in (None, "forged"):
+        cookies["sid"] = sid
+        with pytest.raises(gui.bottle.HTTPError):
+            store.current()
+    assert "forged" not in store and len(store) == 1
+
+    store.remove(recreated)
+    cookies["sid"] = recreated.id
+    with pytest.raises(gui.bottle.HTTPError):
+        store.current()
+
+
+def test_rate_limited_session_holds_and_coalesces_deltas(store, monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(gui.time, "monotonic", lambda: now[0])
+    (session,) = add_sessions(store, 1)
+    session.set_rate(2, {"Pkt2": None})
+
+    store.add_telemetry(1, b"\x01")
+    assert session.deltas.popleft(block=False)[0].delta == {"value": 1}
+
+    store.add_telemetry(1, b"\x02")
+    store.add_telemetry(2, b"\x05")
+    store.add_telemetry(1, b"\x03")
+    frame, _ = session.deltas.popleft(block=False)
+    assert frame.packet == "Pkt2"
+    with pytest.raises(IndexError):
+        session.deltas.popleft(block=False)
+
+    now[0] += 0.5
+    frame, counter = session.deltas.popleft(block=False)
+    assert (frame.packet, frame.delta, counter) == ("Pkt1", {"value": 3}, 1)
+    assert session.stats()["rate"] == 2
+
+
+def test_rate_limited_session_keeps_latest_raw_packet(store, monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(gui.time, "monotonic", lambda: now[0])
+    (session,) = add_sessions(store, 1)
+    store.add_telemetry(1, b"\x01")
+    session.set_rate(None, {"Pkt1": 10})
+
+    assert session.telemetry.popleft(block=False)[:2] == (1, b"\x01")
+    store.add_telemetry(1, b"\x02")
+    store.add_telemetry(1, b"\x03")
+    with pytest.raises(IndexError):
+        session.telemetry.popleft(block=False)
+
+    now[0] += 0.1
+    assert session.telemetry.popleft(block=False)[:2] == (1, b"\x03")
+
+    session.set_rate(None)
+    store.add_telemetry(1, b"\x04")
+    assert session.telemetry.popleft(block=False)[:2] == (1, b"\x04")
+
+
+@requires_ait_core
+def test_set_rate_wakes_connection_blocked_on_replaced_queue(store):
+    (session,) = add_sessions(store, 1)
+    waiter = gui.gevent.spawn(session.deltas.popleft, timeout=5)
+    gui.gevent.sleep(0)
+
+    session.set_rate(100)
+    assert waiter.get(timeout=1) is None
+    assert isinstance(session.deltas, gui.CoalescingQueue)
+
+
+def test_set_rate_rejects_invalid_rates():
+    session = gui.Session()
+    for rate, rates in [(-1, None), ("fast", None), (None, {"Pkt1": True})]:
+        with pytest.raises(ValueError):
+            session.set_rate(rate, rates)
+    assert session.rate is None and session.interval("Pkt1") is None
+
+
+def test_packet_index_caches_unknown_uids_and_rate_limits_warnings(monkeypatch):
+    now = [100.0]
+    warnings = []
+    tlmdict = {"Pkt1": FakeDefn("Pkt1", 1)}
+    monkeypatch.setattr(gui.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(gui.tlm, "getDefaultDict", lambda: tlmdict, raising=False)
+    monkeypatch.setattr(gui.log, "warn", warnings.append)
+
+    index = gui.PacketIndex(check_interval=1, warn_interval=60)
+    assert index.get(1) is tlmdict["Pkt1"]
+    for _ in range(100):
+        assert index.get(99) is None
+    assert index.unknown[99] == 100 and len(warnings) == 1
+
+    now[0] += 60
+    index.get(99)
+    assert len(warnings) == 2
+    assert index.stats() == {"definitions": 1, "rebuilds": 1, "unknown": {"99": 101}}
+
+
+def test_packet_index_rebuilds_when_dictionary_changes(monkeypatch):
+    now = [100.0]
+    current = {"dict": {"Pkt1": FakeDefn("Pkt1", 1)}}
+    monkeypatch.setattr(gui.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(
+        gui.tlm, "getDefaultDict", lambda: current["dict"], raising=False
+    )
+    monkeypatch.setattr(gui.log, "warn", lambda msg: None)
+
+    index = gui.PacketIndex(check_interval=1)
+    assert index.get(1).name == "Pkt1"
+
+    current["dict"] = {"Pkt2": FakeDefn("Pkt2", 1)}
+    assert index.get(1).name == "Pkt1"
+    now[0] += 1
+    assert index.get(1).name == "Pkt2"
+    assert index.rebuilds == 2
+
+
+def test_add_telemetry_counts_unknown_packets(store):
+    (session,) = add_sessions(store, 1)
+    store.add_telemetry(42, b"\x01")
+    store.add_telemetry(1, b"\x01")
+    assert store.unknown == 1
+    assert len(session.deltas) == 1
+
+
+@requires_ait_core
+def test_get_packet_delta_versions_states_without_aliasing(fresh_state):
+    defn = make_defn()
+    first, second = random_packets(defn, 2, seed=3)[:2]
+
+    delta, _ = gui.get_packet_delta(defn, first)
+    assert delta is not gui.packet_states[defn.name]["raw"]
+    assert gui.packet_versions[defn.name] == 1
+
+    gui.get_packet_delta(defn, second)
+    assert gui.packet_versions[defn.name] == 2
+    assert gui.packet_versions.changed(1) == [defn.name]
+
+
+def test_history_buffer_wraps_and_slices_by_time():
+    numpy = pytest.importorskip("numpy")
+    buffer = gui.HistoryBuffer(4, {"a": numpy.dtype("H")}, ["b"])
+
+    for n in range(6):
+        buffer.append(100.0 + n, {"a": n}, {"b": None if n == 4 else n / 2})
+
+    times, raw, dntoeu = buffer.slice()
+    assert times.tolist() == [102.0, 103.0, 104.0, 105.0]
+    assert raw["a"].dtype == numpy.dtype("H") and raw["a"].tolist() == [2, 3, 4, 5]
+    assert gui.column_to_list(dntoeu["b"]) == [1.0, 1.5, None, 2.5]
+
+    times, raw, _ = buffer.slice(since=103.0, until=104.5, fields={"a"})
+    assert times.tolist() == [104.0] and raw["a"].tolist() == [4]
+    assert buffer.slice(since=105.0)[0].tolist() == []
+
+
+@requires_ait_core
+def test_packet_history_records_numeric_fields(fresh_state, monkeypatch):
+    monkeypatch.setattr(gui, "packet_history", gui.PacketHistory(size=8))
+    defn = make_defn()
+
+    for n, packet in enumerate(random_packets(defn, 5, seed=1)[:5]):
+        gui.get_packet_delta(defn, packet)
+        gui.packet_history.add(defn, gui.packet_states[defn.name], 100.0 + n)
+
+    history = gui.packet_history.get(defn.name, fields={"a", "d"}, since=101.0)
+    state = gui.packet_states[defn.name]
+    assert history["time"] == [102.0, 103.0, 104.0]
+    assert set(history["raw"]) == {"a", "d"} and set(history["dntoeu"]) == {"d"}
+    assert history["raw"]["a"][-1] == state["raw"]["a"]
+    assert history["dntoeu"]["d"][-1] == pytest.approx(state["dntoeu"]["d"])
+
+
+def test_downsampling_keeps_peaks_and_endpoints():
+    numpy = pytest.importorskip("numpy")
+    times = numpy.arange(10000.0)
+    values = numpy.sin(times / 100.0)
+    values[5000], values[10] = 100.0, numpy.nan
+
+    for method in ("minmax", "lttb"):
+        index = gui.Downsamplers[method](times, values, 100)
+        assert len(index) <= 100 and 5000 in index and 10 not in index
+        assert (numpy.diff(index) > 0).all()
+
+    index = gui.downsample_lttb(times, values, 100)
+    assert index[0] == 0 and index[-1] == 9999
+
+    ints = numpy.arange(10, dtype="i")
+    assert gui.downsample_minmax(times[:10], ints, 4).tolist() == [0, 4, 5, 9]
+    assert gui.downsample_minmax(times[:10], ints, 20).tolist() == list(range(10))
+
+
+@requires_ait_core
+def test_packet_packer_matches_per_field_packing():
+    tlm = gui.tlm
+    types = ["MSB_U16", "U8", "LSB_I32", "MSB_F32", "I8", "LSB_U16", "S4"]
+    fields = [
+        tlm.FieldDefinition(name="f%d" % n, type=kind) for n, kind in enumerate(types)
+    ]
+    defn = tlm.PacketDefinition(name="Playback", fields=fields)
+    rows = [
+        {"f0": n, "f1": 7, "f2": -n, "f3": n / 2, "f4": -1, "f5": 513, "f6": b"ab"}
+        for n in range(5)
+    ]
+
+    packer = gui.get_packet_packer(defn)
+    expected = [
+        b"".join(struct.pack(f.type.format, row[f.name]) for f in fields)
+        for row in rows
+    ]
+    assert packer.pack(rows) == expected
+    assert packer.pack(rows[:1]) == expected[:1]
+    assert len(packer._runs) == 4 and packer.size == defn.nbytes
+
+
+def make_buffer(packets, keyframe_interval=1000):
+    buffer = gui.PlaybackBuffer(keyframe_interval)
+    for timestamp, uid, data in packets:
+        buffer.append(gui.playback_time(timestamp), uid, data)
+    return buffer
+
+
+def test_playback_buffer_seeks_and_snapshots():
+    packets = [(1563214200.0 + n / 10, n % 3, bytes([n])) for n in range(25)]
+    buffer = gui.PlaybackBuffer(keyframe_interval=4)
+    for packet in reversed(packets):
+        buffer.append(*packet)
+
+    assert buffer.nearest(0) == 0 and buffer.nearest(2e9) == 24
+    assert buffer.nearest(1563214200.54) == 5
+    assert buffer.nearest(1563214200.56) == 6
+    assert list(buffer.between(1563214200.1, 1563214200.3)) == [1, 2]
+    assert buffer.packet(7) == (1, bytes([7])) and len(buffer.keyframes) == 7
+
+    for index in range(25):
+        expected = sorted(
+            {uid: n for n, (_, uid, _) in enumerate(packets[: index + 1])}.values()
+        )
+        assert buffer.snapshot(index) == expected
+
+
+def test_playback_clock_replays_query_in_time_order(monkeypatch):
+    sent = []
+    monkeypatch.setattr(gui.Sessions, "add_telemetry", lambda *item: sent.append(item))
+    buffer = make_buffer(
+        [
+            ("2019-07-15T18:10:00.0Z", 1, b"a"),
+            ("2019-07-15T18:10:00.0Z", 2, b"b"),
+            ("2019-07-15T18:10:00.2Z", 1, b"c"),
+            ("2019-07-15T18:10:00.1Z", 2, b"x"),
+        ]
+    )
+
+    clock = gui.PlaybackClock(buffer, speed=100)
+    assert clock.stats() == {
+        "state": "paused",
+        "speed": 100.0,
+        "time": 1563214200.0,
+        "position": 0,
+        "count": 4,
+    }
+
+    clock.play()
+    gevent.sleep(0.1)
+    assert sent == [(1, b"a"), (2, b"b"), (2, b"x"), (1, b"c")]
+    assert clock.stats()["state"] == "finished"
+
+
+def test_playback_clock_pauses_and_changes_speed(monkeypatch):
+    sent = []
+    monkeypatch.setattr(gui.Sessions, "add_telemetry", lambda *item: sent.append(item))
+    buffer = make_buffer(
+        [("2019-07-15T18:10:00.0Z", 1, b"a"), ("2019-07-15T18:20:00.0Z", 1, b"b")]
+    )
+
+    clock = gui.PlaybackClock(buffer)
+    clock.play()
+    gevent.sleep(0.01)
+    assert sent == [(1, b"a")] and clock.stats()["state"] == "playing"
+
+    clock.pause()
+    paused_at = clock.time
+    gevent.sleep(0.01)
+    assert clock.time == paused_at and clock.stats()["state"] == "paused"
+
+    clock.set_speed(100)
+    clock.play()
+    gevent.sleep(0.01)
+    assert clock.time > paused_at + 0.5 and sent == [(1, b"a")]
+    clock.stop()
+
+    for speed in (0, 0.05, 101, "fast"):
+        with pytest.raises(ValueError):
+            clock.set_speed(speed)
+
+
+def test_playback_clock_seeks_to_full_state(monkeypatch):
+    sent = []
+    monkeypatch.setattr(gui.Sessions, "add_telemetry", lambda *item: sent.append(item))
+    buffer = make_buffer(
+        [
+            ("2019-07-15T18:10:00Z", 1, b"a"),
+            ("2019-07-15T18:10:01Z", 2, b"b"),
+            ("2019-07-15T18:10:02Z", 1, b"c"),
+            ("2019-07-15T18:20:00Z", 2, b"d"),
+        ],
+        keyframe_interval=2,
+    )
+
+    clock = gui.PlaybackClock(buffer)
+    clock.seek(gui.playback_time("2019-07-15T18:10:02.2Z"))
+    assert sent == [(2, b"b"), (1, b"c")]
+    assert clock.time == 1563214202.0 and clock.position == 3
+
+    del sent[:]
+    clock.seek(0)
+    assert sent == [(1, b"a")] and clock.position == 1
+
+
+def write_pcap(path, packets):
+    with gui.pcap.open(str(path), "w") as stream:
+        for timestamp, data in packets:
+            header = gui.pcap.PCapPacketHeader(orig_len=len(data))
+            header.ts_sec, header.ts_usec = int(timestamp), 0
+            stream.write(data, header)
+
+
+@requires_ait_core
+def test_telemetry_query_streams_matching_rows(tmp_path):
+    tlm = gui.tlm
+    defn = tlm.PacketDefinition(
+        name="QueryPacket",
+        fields=[
+            tlm.FieldDefinition(name="a", type="MSB_U16"),
+            tlm.FieldDefinition(name="b", type="U8", enum={1: "ONE"}),
+        ],
+    )
+    write_pcap(
+        tmp_path / "one.pcap",
+        [(100, b"\x00\x01\x01"), (200, b"\x00\x02\x01"), (250, b"\x00")],
+    )
+    write_pcap(tmp_path / "two.pcap", [(300, b"\x00\x03\x02")])
+
+    start = datetime.datetime(1970, 1, 1, 0, 2)
+    query = gui.TelemetryQuery(defn, ["a", "b", "raw.b"], start=start)
+    pcaps = gui.find_pcaps(str(tmp_path))
+    chunks = list(query.csv(pcaps, chunk_rows=1))
+
+    assert len(chunks) == 3
+    assert "".join(chunks).splitlines() == [
+        "Ground Receipt Time,a,b,raw.b",
+        "1970-01-01 00:03:20,2,ONE,1",
+        "1970-01-01 00:05:00,3,2,2",
+    ]
+
+    with pytest.raises(ValueError):
+        gui.TelemetryQuery(defn, ["a", "c"])
+
+
+@requires_ait_core
+def test_pcap_index_prunes_files_and_byte_ranges(tmp_path, monkeypatch):
+    monkeypatch.setattr(gui.PcapIndex, "Interval", 10)
+    monkeypatch.setattr(gui, "pcap_indexes", {})
+    path = tmp_path / "one.pcap"
+    write_pcap(path, [(1000 + n, bytes([0, n, 1])) for n in range(100)])
+
+    index = gui.get_pcap_index(str(path))
+    assert (index.first, index.last, index.sizes) == (1000.0, 1099.0, [3])
+    assert len(index.checkpoints) == 9 and (tmp_path / "one.pcap.idx").exists()
+    assert not index.overlaps(1099.0, 2000.0) and index.overlaps(1050.0, 1060.0)
+
+    begin, end = index.span(1050.0, 1060.0)
+    assert begin == index.checkpoints[4][0] and end == index.checkpoints[5][0]
+    assert end - begin < (index.size - index.data_offset) / 5
+
+    # The sidecar is reused, and rebuilt once the file changes.
+    monkeypatch.setattr(gui, "pcap_indexes", {})
+    monkeypatch.setattr(gui.PcapIndex, "build", lambda self: pytest.fail("rebuilt"))
+    assert gui.get_pcap_index(str(path)).checkpoints == index.checkpoints
+    monkeypatch.undo()
+
+    monkeypatch.setattr(gui, "pcap_indexes", {})
+    write_pcap(path, [(5000, b"\x00\x01\x01")])
+    assert gui.get_pcap_index(str(path)).first == 5000.0
+
+    tlm = gui.tlm
+    defn = tlm.PacketDefinition(
+        name="IndexedPacket", fields=[tlm.FieldDefinition(name="a", type="MSB_U16")]
+    )
+    write_pcap(path, [(1000 + n, bytes([0, n, 1])) for n in range(100)])
+    start = datetime.datetime.utcfromtimestamp(1050)
+    stop = datetime.datetime.utcfromtimestamp(1054)
+    query = gui.TelemetryQuery(defn, ["a"], start=start, stop=stop)
+    assert [row[1] for row in query.rows(str(path))] == [51, 52, 53]
+
+
+@requires_ait_core
+def test_telemetry_query_merges_process_shards_by_time(tmp_path, monkeypatch):
+    monkeypatch.setattr(gui, "pcap_indexes", {})
+    tlm = gui.tlm
+    defn = tlm.PacketDefinition(
+        name="ShardPacket", fields=[tlm.FieldDefinition(name="a", type="MSB_U16")]
+    )
+    write_pcap(tmp_path / "a.pcap", [(t, bytes([0, t])) for t in (10, 30, 50)])
+    write_pcap(tmp_path / "b.pcap", [(t, bytes([0, t])) for t in (20, 40, 60)])
+    write_pcap(tmp_path / "c.pcap", [(t, bytes([0, t])) for t in (70, 80)])
+    write_pcap(tmp_path / "d.pcap", [(500, b"\x00\x01")])
+
+    pcaps = gui.find_pcaps(str(tmp_path))
+    start, stop = datetime.datetime(1970, 1, 1), datetime.datetime(1970, 1, 1, 0, 5)
+
+    # Indexes are built in the child processes, not the server's.
+    built = []
+    build = gui.PcapIndex.build
+    monkeypatch.setattr(
+        gui.PcapIndex, "build", lambda self: built.append(self) or build(self)
+    )
+
+    for processes in (2, 1, 4, 0):
+        query = gui.TelemetryQuery(defn, ["a"], start=start, stop=stop)
+        query.processes = processes
+        rows = list(query.scan(pcaps))
+        assert [row[1] for row in rows] == list(range(10, 90, 10))
+        assert built == [] and len(gui.pcap_indexes) == 4
+
+
+@requires_ait_core
+def test_telemetry_query_merges_packet_times_across_files(tmp_path):
+    tlm = gui.tlm
+    defn = tlm.PacketDefinition(
+        name="TimedPacket",
+        fields=[
+            tlm.FieldDefinition(name="t", type="TIME32"),
+            tlm.FieldDefinition(name="a", type="U8"),
+        ],
+    )
+
+    def packets(times):
+        return [(0, struct.pack(">IB", t, t)) for t in times]
+
+    # Packet times are out of order within and across files.
+    write_pcap(tmp_path / "a.pcap", packets([30, 10, 50]))
+    write_pcap(tmp_path / "b.pcap", packets([20, 60, 40]))
+    write_pcap(tmp_path / "c.pcap", packets([5, 70]))
+    pcaps = gui.find_pcaps(str(tmp_path))
+
+    start = gui.dmc.GPS_Epoch
+    stop = start + datetime.timedelta(seconds=65)
+
+    for processes in (0, 2):
+        query = gui.TelemetryQuery(defn, ["a"], "t", start, stop)
+        query.processes = processes
+        rows = list(query.scan(pcaps))
+        assert [row[1] for row in rows] == [5, 10, 20, 30, 40, 50, 60]
+        assert rows[0][0] == start + datetime.timedelta(seconds=5)
+
+
+@requires_ait_core
+def test_query_jobs_run_in_background_and_reuse_results(tmp_path, monkeypatch):
+    monkeypatch.setattr(gui, "pcap_indexes", {})
+    monkeypatch.setattr(gui.TelemetryQuery, "processes", 0)
+    events = []
+    monkeypatch.setattr(gui.Sessions, "add_event", lambda *args: events.append(args))
+
+    tlm = gui.tlm
+    defn = tlm.PacketDefinition(
+        name="JobPacket", fields=[tlm.FieldDefinition(name="a", type="MSB_U16")]
+    )
+    path = tmp_path / "one.pcap"
+    write_pcap(path, [(t, bytes([0, t])) for t in (10, 20, 30)])
+    pcaps = gui.find_pcaps(str(tmp_path))
+    start = datetime.datetime(1970, 1, 1)
+
+    jobs = gui.QueryJobs(concurrency=1, cache_size=1)
+
+    def submit(fields):
+        query = gui.TelemetryQuery(defn, fields, start=start)
+        return jobs.submit(query, pcaps, jobs.key(tuple(fields), pcaps))
+
+    first, second = submit(["a"]), submit(["raw.a"])
+    assert (first.state, second.state) == ("queued", "queued")
+    while second.state != "done":
+        gevent.sleep(0.01)
+
+    # Jobs run one at a time, in submission order.
+    assert [(data["id"], data["state"]) for _, data in events] == [
+        (first.id, "queued"),
+        (second.id, "queued"),
+        (first.id, "running"),
+        (first.id, "done"),
+        (second.id, "running"),
+        (second.id, "done"),
+    ]
+    assert events[-1] == ("tlm:query", second.json()) and second.rows == 3
+    with open(second.path) as output:
+        assert output.read().splitlines()[1:] == [
+            "1970-01-01 00:00:10,10",
+            "1970-01-01 00:00:20,20",
+            "1970-01-01 00:00:30,30",
+        ]
+
+    # Only cache_size results are kept; identical queries reuse them.
+    assert first.state == "expired" and first.path is None
+    assert submit(["raw.a"]) is second and jobs.stats()["hits"] == 1
+
+    write_pcap(path, [(40, b"\x00\x28")])
+    assert submit(["raw.a"]) is not second
+
+
+@requires_ait_core
+def test_telemetry_query_writes_typed_columns(tmp_path, monkeypatch):
+    numpy = pytest.importorskip("numpy")
+    monkeypatch.setattr(gui.TelemetryQuery, "processes", 0)
+    monkeypatch.setattr(gui, "pcap_indexes", {})
+
+    tlm = gui.tlm
+    defn = tlm.PacketDefinition(
+        name="TypedPacket",
+        fields=[
+            tlm.FieldDefinition(name="a", type="MSB_I16"),
+            tlm.FieldDefinition(name="b", type="U8", enum={1: "ONE", 2: "TWO"}),
+            tlm.FieldDefinition(name="c", type="MSB_F32"),
+        ],
+    )
+    packets = [(t, struct.pack(">hBf", -t, t % 3, t / 4)) for t in range(10, 15)]
+    write_pcap(tmp_path / "one.pcap", packets)
+    pcaps = gui.find_pcaps(str(tmp_path))
+
+    query = gui.TelemetryQuery(
+        defn, ["a", "b", "raw.b", "c"], start=datetime.datetime(1970, 1, 1)
+    )
+    assert query.kinds == ["time", "int", "str", "int", "float"]
+
+    path = tmp_path / "out.npz"
+    with open(path, "wb") as output:
+        query.npz(pcaps, output, group_rows=2)
+
+    with numpy.load(path) as arrays:
+        assert list(arrays.keys()) == query.header
+        times = arrays["Ground Receipt Time"]
+        assert times.dtype == numpy.dtype("datetime64[us]")
+        seconds = times.astype("datetime64[s]").astype(int)
+        assert seconds.tolist() == list(range(10, 15))
+        assert arrays["a"].dtype == numpy.int64
+        assert arrays["a"].tolist() == [-10, -11, -12, -13, -14]
+        assert arrays["b"].tolist() == ["ONE", "TWO", "0", "ONE", "TWO"]
+        assert arrays["raw.b"].tolist() == [1, 2, 0, 1, 2]
+        assert arrays["c"].tolist() == [2.5, 2.75, 3.0, 3.25, 3.5]
+        assert query.count == 5
+
+    # CSV output is unchanged by typed rows.
+    output = io.BytesIO()
+    query.write(pcaps, output, "csv")
+    assert output.getvalue().decode().splitlines()[1] == (
+        "1970-01-01 00:00:10,-10,ONE,1,2.5"
+    )
+
+
+def test_column_to_array_marks_missing_values():
+    numpy = pytest.importorskip("numpy")
+
+    assert gui.column_to_array([1, 2], "int").dtype == numpy.int64
+    assert numpy.isnan(gui.column_to_array([1, None], "int")).tolist() == [
+        False,
+        True,
+    ]
+    assert gui.column_to_array(["x", None], "str").tolist() == ["x", ""]
+    times = gui.column_to_array([datetime.datetime(2020, 1, 1), None], "time")
+    assert numpy.isnat(times).tolist() == [False, True]
+
+
+@requires_ait_core
+def test_command_history_reads_only_appended_records(tmp_path):
+    path = str(tmp_path / "cmdhist.pcap")
+    history = gui.CommandHistory()
+    assert not history.refresh(path)
+
+    with gui.pcap.open(path, "w") as stream:
+        for n in range(5):
+            stream.write("CMD_%d" % (n % 2))
+    assert history.refresh(path) and len(history) == 5
+    assert list(history.distinct) == ["CMD_0", "CMD_1"]
+
+    # A partially written record is left for the next refresh.
+    with open(path, "ab") as file:
+        data = b"NO_OP"
+        header = gui.pcap.PCapPacketHeader(orig_len=len(data))
+        file.write(header.pack() + data[:2])
+    history.refresh(path)
+    assert len(history) == 5
+
+    with open(path, "ab") as file:
+        file.write(data[2:])
+    history.refresh(path)
+    assert history.commands == ["CMD_0", "CMD_1"] * 2 + ["CMD_0", "NO_OP"]
+    assert history.commands[0] is history.commands[2]
+
+    assert [(n, cmd) for n, _, cmd in history.page(2)] == [(5, "NO_OP"), (4, "CMD_0")]
+    assert [n for n, _, _ in history.page(10, before=2)] == [1, 0]
+    assert history.page(10, before=0) == []
+
+    # A truncated (rewritten) file is read again.
+    with gui.pcap.open(path, "w") as stream:
+        stream.write("PING")
+    history.refresh(path)
+    assert history.commands == ["PING"] and list(history.distinct) == ["PING"]
+
+
+@requires_ait_core
+def test_command_history_writer_batches_and_updates_index(tmp_path, monkeypatch):
+    path = str(tmp_path / "cmdhist.pcap")
+    history = gui.CommandHistory()
+    monkeypatch.setattr(gui.CMD_API, "CMD_HIST_FILE", path)
+    monkeypatch.setattr(gui, "command_history", history)
+    syncs = []
+    monkeypatch.setattr(gui.os, "fsync", syncs.append)
+
+    writer = gui.CommandHistoryWriter()
+
+    def flushed(batches):
+        while writer.batches < batches:
+            gevent.sleep(0.01)
+
+    for n in range(3):
+        writer.write("CMD_%d" % n)
+
+    # Commands are in the index before they are written.
+    assert history.commands == ["CMD_0", "CMD_1", "CMD_2"]
+    assert writer.stats() == {"queued": 3, "written": 0, "batches": 0}
+
+    flushed(1)
+    assert writer.stats() == {"queued": 0, "written": 3, "batches": 1}
+    assert len(syncs) == 1 and history.offset == os.path.getsize(path)
+    assert history.refresh(path) and len(history) == 3
+
+    # Records appended by others while commands are queued are read, and
+    # the queued commands kept, without duplicating any.
+    writer.policy = "always"
+    writer.write("CMD_3")
+    writer.write("CMD_4")
+    with gui.pcap.open(path, "a") as stream:
+        stream.write("OTHER")
+    assert history.commands[3:] == ["CMD_3", "CMD_4"]
+
+    flushed(2)
+    assert len(syncs) == 3
+    assert history.commands[3:] == ["OTHER", "CMD_3", "CMD_4"]
+    assert history.refresh(path) and len(history) == 6
+
+    # Commands that cannot be written stay queued and are retried.
+    writer.retry = 0.01
+    monkeypatch.setattr(gui.CMD_API, "CMD_HIST_FILE", str(tmp_path))
+    writer.write("CMD_5")
+    gevent.sleep(0.05)
+    assert writer.stats()["queued"] == 1
+
+    monkeypatch.setattr(gui.CMD_API, "CMD_HIST_FILE", path)
+    flushed(3)
+    writer.write("CMD_6")
+    writer.stop()
+    with gui.pcap.open(path, "r") as stream:
+        assert [data for _, data in stream][-2:] == [b"CMD_5", b"CMD_6"]